@@ -0,0 +1,317 @@
+"""
+Shared helpers for the benchmark scripts.
+
+- Local RS256 keypair + JWKS file, so auth runs without Entra (ENTRA_JWKS_URL).
+- Token minting with the same claims shape Entra issues.
+- A raw ASGI driver that timestamps time-to-first-byte and completion.
+- A throwaway fakeredis TCP server (subprocess) for runs without a real Redis.
+- Percentile summary and process CPU / peak memory helpers.
+- Run metadata and baseline comparison for --json / --compare.
+
+Import this BEFORE prynai_mcp so configure_local_auth() can set env vars
+that Settings() reads at import time.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+TENANT = "00000000-0000-0000-0000-000000000000"
+AUDIENCE = "api://prynai-mcp-bench"
+ISSUER = f"https://login.microsoftonline.com/{TENANT}/v2.0"
+KID = "bench-key"
+
+
+def make_keypair() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def write_jwks(private_key: rsa.RSAPrivateKey, kid: str = KID) -> str:
+    """Write a JWKS file with the public half of private_key; return its path."""
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, use="sig", alg="RS256")
+    fd, path = tempfile.mkstemp(prefix="prynai-jwks-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"keys": [jwk]}, f)
+    return path
+
+
+def configure_local_auth(
+    private_key: rsa.RSAPrivateKey,
+    scopes: Optional[str] = None,
+    roles: Optional[str] = None,
+) -> str:
+    """Point Settings at a local JWKS file and enable auth. Returns the JWKS path."""
+    path = write_jwks(private_key)
+    os.environ.update(
+        AUTH_REQUIRED="true",
+        ENTRA_TENANT_ID=TENANT,
+        ENTRA_AUDIENCES=AUDIENCE,
+        ENTRA_JWKS_URL=path,
+    )
+    for name, value in (("ENTRA_REQUIRED_SCOPES", scopes), ("ENTRA_REQUIRED_APP_ROLES", roles)):
+        if value:
+            os.environ[name] = value
+        else:
+            os.environ.pop(name, None)
+    return path
+
+
+def mint_token(
+    private_key: rsa.RSAPrivateKey,
+    lifetime: int = 3600,
+    kid: str = KID,
+    **extra: Any,
+) -> str:
+    now = int(time.time())
+    claims: Dict[str, Any] = {
+        "iss": ISSUER,
+        "aud": AUDIENCE,
+        "iat": now,
+        "nbf": now,
+        "exp": now + lifetime,
+        "azp": "bench-client",
+        "oid": "bench-oid",
+        "roles": ["Mcp.Invoke"],
+    }
+    claims.update(extra)
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+# ---- raw ASGI driver -------------------------------------------------
+
+
+async def asgi_call(
+    app: Any,
+    path: str,
+    headers: Optional[List[Tuple[bytes, bytes]]] = None,
+    method: str = "GET",
+    body: bytes = b"",
+) -> Tuple[int, float, float, int]:
+    """
+    Drive one HTTP request through an ASGI app without a server.
+    Returns (status, ttfb_seconds, total_seconds, body_bytes).
+    """
+    import asyncio
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")] + list(headers or []),
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    done = asyncio.Event()
+    sent_body = False
+    status = 0
+    ttfb = 0.0
+    nbytes = 0
+    t0 = time.perf_counter()
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status, ttfb, nbytes
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk and not ttfb:
+                ttfb = time.perf_counter() - t0
+            nbytes += len(chunk)
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    total = time.perf_counter() - t0
+    return status, ttfb or total, total, nbytes
+
+
+# ---- local services --------------------------------------------------
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def start_fake_redis() -> Tuple[subprocess.Popen, str]:
+    """fakeredis behind a real socket, in its own process (so its CPU is not counted)."""
+    port = free_port()
+    # TCP_NODELAY like real Redis: without it multi-reply pipelines stall ~40ms (Nagle + delayed ACK)
+    code = """
+import socket, sys
+from fakeredis import TcpFakeServer
+
+class Server(TcpFakeServer):
+    def get_request(self):
+        conn, addr = super().get_request()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, addr
+
+Server(("127.0.0.1", int(sys.argv[1])), server_type="redis").serve_forever()
+"""
+    proc = subprocess.Popen([sys.executable, "-c", code, str(port)])
+    wait_for_port(port)
+    return proc, f"redis://127.0.0.1:{port}/0"
+
+
+# ---- stats -----------------------------------------------------------
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    idx = min(len(s) - 1, max(0, int(round(q / 100.0 * (len(s) - 1)))))
+    return s[idx]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1e3 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1e3,
+        "p95_ms": percentile(samples, 95) * 1e3,
+        "p99_ms": percentile(samples, 99) * 1e3,
+    }
+
+
+def _proc_tree(pid: int) -> List[int]:
+    """pid and its descendants (Linux /proc)."""
+    parents: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii", errors="replace") as f:
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+    tree = {pid}
+    grew = True
+    while grew:
+        grew = False
+        for child, parent in parents.items():
+            if parent in tree and child not in tree:
+                tree.add(child)
+                grew = True
+    return sorted(tree)
+
+
+def proc_tree_cpu(pid: int) -> Optional[float]:
+    """User+system CPU seconds of pid and its descendants (Linux /proc; None elsewhere)."""
+    if not os.path.isdir("/proc"):
+        return None
+    tick = os.sysconf("SC_CLK_TCK")
+    total = 0.0
+    for p in _proc_tree(pid):
+        try:
+            with open(f"/proc/{p}/stat", encoding="ascii", errors="replace") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        total += (int(fields[11]) + int(fields[12])) / tick
+    return total
+
+
+def proc_tree_peak_rss_mb(pid: int) -> Optional[float]:
+    """Sum of the peak resident set sizes (VmHWM) of pid and its descendants, in MiB."""
+    if not os.path.isdir("/proc"):
+        return None
+    total_kb = 0
+    for p in _proc_tree(pid):
+        try:
+            with open(f"/proc/{p}/status", encoding="ascii", errors="replace") as f:
+                total_kb += next((int(line.split()[1]) for line in f if line.startswith("VmHWM:")), 0)
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+# ---- baselines -------------------------------------------------------
+
+
+def git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_meta(args: Any) -> Dict[str, Any]:
+    """Where and how a result file was produced (only compare like with like)."""
+    return {
+        "git_rev": git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+    }
+
+
+def regressions(
+    baseline: Dict[str, Dict[str, Any]],
+    current: Dict[str, Dict[str, Any]],
+    metrics: Dict[str, bool],
+    tolerance: float,
+) -> List[str]:
+    """
+    Compare {case: {metric: value}} tables. metrics maps metric name -> higher_is_better.
+    Returns one line per metric that got worse by more than tolerance (relative).
+    """
+    problems: List[str] = []
+    for case, cur in current.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        for name, higher_is_better in metrics.items():
+            b, c = base.get(name), cur.get(name)
+            if not b or c is None:
+                continue
+            change = (c - b) / b
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                problems.append(f"{case} {name}: {b:.3f} -> {c:.3f} ({change:+.0%})")
+    return problems
@@ -0,0 +1,272 @@
+# benchmarks/bench_artifacts.py
+"""
+Large-payload resources (artifact://): throughput, server CPU and server memory vs size.
+
+- Starts `python -m prynai_mcp.server` (one worker) with ARTIFACTS_DIR pointing at a
+  temp dir of random files, one per --sizes entry (MiB). The same bytes are published
+  to Redis (a throwaway fakeredis unless --redis-url is given).
+- Each case reads one whole artifact with --readers concurrent clients (own sessions):
+  range:  resources/read of artifact://{name}/{etag}/{offset}/{length}, one chunk at a time;
+  stream: one read_artifact tools/call opted into streaming (progressToken plus the
+          "prynai/stream" _meta flag; chunks arrive as progress notifications on the
+          call's SSE stream).
+- --accept-encoding (default "identity") turns on response compression. Base64 of
+  random bytes compresses back to about its raw size (wire 1.33x -> 1.00x of the
+  payload), at the CPU cost shown per MiB.
+- Reports MiB/s, server CPU ms per MiB, wire bytes per payload byte and the server's
+  peak RSS (VmHWM, whole process tree) after the case. Cases run smallest first, so
+  memory that stays flat per request shows up as a peak that does not grow with the
+  artifact size.
+
+--json writes the results; --compare BASELINE.json flags throughput, CPU or peak-memory
+regressions beyond --tolerance and exits 1 if there are any.
+
+Run:  PYTHONPATH=src python benchmarks/bench_artifacts.py [--sizes 1,16,64]
+          [--readers 4] [--modes range,stream] [--backends file,redis]
+          [--accept-encoding identity]
+          [--json out.json] [--compare baseline.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from _common import (
+    configure_local_auth,
+    free_port,
+    make_keypair,
+    mint_token,
+    proc_tree_cpu,
+    proc_tree_peak_rss_mb,
+    regressions,
+    run_meta,
+    start_fake_redis,
+    wait_for_port,
+)
+from bench_load import SRC, ByteCounter, CountingTransport, RawClient, _last_message
+
+import httpx  # noqa: E402
+
+MIB = 1024 * 1024
+METRICS = {"mib_per_sec": True, "server_cpu_ms_per_mib": False, "peak_rss_mb": False, "wire_ratio": False}
+
+
+# ---- fixtures --------------------------------------------------------
+
+
+def make_files(root: str, sizes: List[int]) -> Dict[int, str]:
+    """Random files of each size (MiB); returns size -> sha256 prefix (the expected etag)."""
+    etags = {}
+    for size in sizes:
+        h = hashlib.sha256()
+        with open(os.path.join(root, f"f{size}.bin"), "wb") as f:
+            for _ in range(size):
+                block = os.urandom(MIB)
+                h.update(block)
+                f.write(block)
+        etags[size] = h.hexdigest()[:32]
+    return etags
+
+
+async def publish_to_redis(root: str, sizes: List[int]) -> None:
+    from prynai_mcp.artifacts import artifacts
+    from prynai_mcp.redis_client import close_redis
+
+    def blocks(path: str):
+        with open(path, "rb") as f:
+            while block := f.read(MIB):
+                yield block
+
+    for size in sizes:
+        await artifacts.redis.publish(f"r{size}.bin", blocks(os.path.join(root, f"f{size}.bin")))
+    await close_redis()
+
+
+# ---- readers ---------------------------------------------------------
+
+
+class ArtifactClient(RawClient):
+    async def info(self, session: str, name: str) -> Dict[str, Any]:
+        _, r = await self._rpc("resources/read", {"uri": f"artifact://{name}"}, session)
+        return json.loads(_last_message(r)["result"]["contents"][0]["text"])
+
+    async def read_ranges(self, session: str, name: str) -> Tuple[int, str]:
+        info = await self.info(session, name)
+        h = hashlib.sha256()
+        for pos in range(0, info["size"], info["chunk_bytes"]):
+            uri = f"artifact://{name}/{info['etag']}/{pos}/{info['chunk_bytes']}"
+            outcome, r = await self._rpc("resources/read", {"uri": uri}, session)
+            if outcome != "ok":
+                raise RuntimeError(f"{uri}: {r.status_code} {r.text[:200]}")
+            h.update(base64.b64decode(_last_message(r)["result"]["contents"][0]["blob"]))
+        return info["size"], h.hexdigest()[:32]
+
+    async def read_stream(self, session: str, name: str) -> Tuple[int, str]:
+        self._ids += 1
+        body = {
+            "jsonrpc": "2.0", "id": self._ids, "method": "tools/call",
+            "params": {"name": "read_artifact", "arguments": {"name": name}, "_meta": {"progressToken": self._ids, "prynai/stream": True}},
+        }
+        h = hashlib.sha256()
+        size = 0
+        done = False
+        # Consume the SSE stream incrementally (chunks are progress messages of NDJSON lines)
+        async with self.http.stream("POST", "/mcp", json=body, headers=self._session_headers(session)) as r:
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                msg = json.loads(line[5:])
+                if msg.get("method") == "notifications/progress":
+                    for row in msg["params"]["message"].splitlines():
+                        chunk = json.loads(row)
+                        if "data" in chunk:
+                            data = base64.b64decode(chunk["data"])
+                            h.update(data)
+                            size += len(data)
+                elif "result" in msg:
+                    done = not msg["result"].get("isError")
+        if not done:
+            raise RuntimeError(f"read_artifact {name} failed")
+        return size, h.hexdigest()[:32]
+
+
+async def run_case(
+    client: ArtifactClient, server_pid: int, name: str, mode: str, readers: int, expected: str
+) -> Dict[str, Any]:
+    sessions = [await client.open() for _ in range(readers)]
+    read = client.read_ranges if mode == "range" else client.read_stream
+    wire0 = client.counter.wire
+    cpu0, t0 = proc_tree_cpu(server_pid), time.perf_counter()
+    try:
+        results = await asyncio.gather(*(read(s, name) for s in sessions))
+    finally:
+        elapsed = time.perf_counter() - t0
+        cpu1 = proc_tree_cpu(server_pid)
+        for s in sessions:
+            await client.close(s)
+    if any(etag != expected for _, etag in results):
+        raise RuntimeError(f"{name}: content hash mismatch")
+    mib = sum(size for size, _ in results) / MIB
+    return {
+        "mib_per_sec": mib / elapsed,
+        "server_cpu_ms_per_mib": (cpu1 - cpu0) * 1e3 / mib if cpu0 is not None and mib else None,
+        "wire_ratio": (client.counter.wire - wire0) / (mib * MIB) if mib else None,
+        "peak_rss_mb": proc_tree_peak_rss_mb(server_pid),
+    }
+
+
+# ---- main ------------------------------------------------------------
+
+
+async def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1,16,64", help="artifact sizes in MiB, comma-separated")
+    ap.add_argument("--readers", type=int, default=4, help="concurrent full reads per case")
+    ap.add_argument("--modes", default="range,stream")
+    ap.add_argument("--backends", default="file,redis")
+    ap.add_argument("--accept-encoding", default="identity", help='response codings to accept, e.g. "zstd, gzip"')
+    ap.add_argument("--redis-url", default=None, help="use this Redis instead of a throwaway fakeredis")
+    ap.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="extra Settings env")
+    ap.add_argument("--json", help="write machine-readable results here (a baseline)")
+    ap.add_argument("--compare", help="baseline JSON to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = ap.parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+
+    key = make_keypair()
+    configure_local_auth(key)
+    redis_proc = None
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        redis_proc, os.environ["REDIS_URL"] = start_fake_redis()
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    for item in args.set:
+        name, _, value = item.partition("=")
+        os.environ[name] = value
+    token = mint_token(key, lifetime=24 * 3600)
+
+    results: Dict[str, Any] = {}
+    server = None
+    with tempfile.TemporaryDirectory(prefix="prynai-artifacts-") as root:
+        try:
+            etags = make_files(root, sizes)
+            if "redis" in backends:
+                await publish_to_redis(root, sizes)
+            port = free_port()
+            env = {
+                **os.environ,
+                "PYTHONPATH": os.pathsep.join(p for p in (SRC, os.environ.get("PYTHONPATH")) if p),
+                "SERVER_HOST": "127.0.0.1",
+                "SERVER_PORT": str(port),
+                "SERVER_WORKERS": "1",
+                "ARTIFACTS_DIR": root,
+            }
+            server = subprocess.Popen([sys.executable, "-m", "prynai_mcp.server"], env=env)
+            wait_for_port(port)
+            counter = ByteCounter()
+            transport = CountingTransport(httpx.AsyncHTTPTransport(), counter)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, transport=transport) as http:
+                client = ArtifactClient(http, token, args.accept_encoding, counter)
+                # Warm up (imports, first session, etag hashing) before the first peak reading
+                for backend in backends:
+                    prefix = "f" if backend == "file" else "r"
+                    for size in sizes:
+                        s = await client.open()
+                        await client.info(s, f"{prefix}{size}.bin")
+                        await client.close(s)
+                await run_case(client, server.pid, f"f{sizes[0]}.bin", "range", 1, etags[sizes[0]])
+                print(f"server peak RSS after warm-up: {proc_tree_peak_rss_mb(server.pid):.1f} MiB")
+                for backend in backends:
+                    prefix = "f" if backend == "file" else "r"
+                    for mode in modes:
+                        for size in sizes:
+                            case = f"{backend}/{mode}/{size}MiB"
+                            r = results[case] = await run_case(
+                                client, server.pid, f"{prefix}{size}.bin", mode, args.readers, etags[size]
+                            )
+                            cpu = r["server_cpu_ms_per_mib"]
+                            print(f"{case:<22} {r['mib_per_sec']:8.1f} MiB/s  "
+                                  f"server cpu={cpu if cpu is not None else float('nan'):.1f}ms/MiB  "
+                                  f"wire={r['wire_ratio']:.2f}x  peak rss={r['peak_rss_mb']:.1f} MiB")
+        finally:
+            if server is not None:
+                server.send_signal(signal.SIGTERM)
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            if redis_proc is not None:
+                redis_proc.terminate()
+                redis_proc.wait()
+
+    out = {"meta": run_meta(args), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = regressions(json.load(f)["results"], results, METRICS, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            return 1
+        print(f"no regressions vs {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,286 @@
+# benchmarks/bench_auth.py
+"""
+Auth hot path: validate_bearer_header and BearerAuthMiddleware, case by case.
+
+validate_bearer_header (validations/sec, p50/p95/p99, CPU per validation):
+- valid token: token-cache hit; cache miss with warm JWKS (full RS256 check);
+  cold JWKS (key store started and keys fetched first).
+- scope + role enforcement on (cache-miss path) and a token that lacks the role.
+- rejected tokens: expired, bad signature (same kid, other key), unknown kid,
+  malformed. Rejections are never cached, so each one costs its full path.
+
+BearerAuthMiddleware on a trivial /mcp JSON endpoint (raw ASGI, no server):
+- no middleware vs auth off, cache hit, cache miss and 401, reported as the p50
+  overhead over the bare endpoint.
+
+Each case runs --repeat times and keeps its fastest run (cold JWKS runs once).
+Tokens are minted RS256 with a local keypair; the JWKS is served by a local stub HTTP
+server (--jwks-latency-ms simulates the Entra round trip on cold fetches).
+--json writes the results; --compare BASELINE.json exits 1 on regressions beyond
+--tolerance, so auth changes can be justified (or caught) across commits.
+
+Run:  PYTHONPATH=src python benchmarks/bench_auth.py [--iterations 2000]
+          [--cold-iterations 200] [--jwks-latency-ms 0] [--json out.json]
+          [--compare baseline.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from _common import (
+    KID,
+    asgi_call,
+    configure_local_auth,
+    make_keypair,
+    mint_token,
+    regressions,
+    run_meta,
+    summarize,
+)
+from jwt.algorithms import RSAAlgorithm
+
+KEY = make_keypair()
+OTHER_KEY = make_keypair()
+configure_local_auth(KEY)  # file JWKS for now; main() points it at the stub server
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse, Response  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from prynai_mcp.auth.azure_oauth import AuthError, token_cache, validate_bearer_header  # noqa: E402
+from prynai_mcp.auth.jwks import close_jwks, ensure_jwks  # noqa: E402
+from prynai_mcp.auth.middleware import BearerAuthMiddleware  # noqa: E402
+from prynai_mcp.auth.policy import reload_policy  # noqa: E402
+
+
+# ---- stub JWKS endpoint ----------------------------------------------
+
+
+def start_jwks_server(latency: float) -> Tuple[http.server.HTTPServer, str]:
+    jwk = json.loads(RSAAlgorithm.to_jwk(KEY.public_key()))
+    jwk.update(kid=KID, use="sig", alg="RS256")
+    body = json.dumps({"keys": [jwk]}).encode()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body are separate writes
+
+        def do_GET(self) -> None:
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("cache-control", "public, max-age=3600")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/discovery/v2.0/keys"
+
+
+async def set_policy(scopes: Optional[str] = None, roles: Optional[str] = None, required: bool = True) -> None:
+    os.environ["AUTH_REQUIRED"] = "true" if required else "false"
+    for name, value in (("ENTRA_REQUIRED_SCOPES", scopes), ("ENTRA_REQUIRED_APP_ROLES", roles)):
+        if value:
+            os.environ[name] = value
+        else:
+            os.environ.pop(name, None)
+    await reload_policy()
+    token_cache.clear()
+
+
+async def best_of(repeat: int, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Dict[str, Any]:
+    """Run a case `repeat` times and keep the fastest run (like timeit: the rest is noise)."""
+    runs = [await fn(*args, **kwargs) for _ in range(max(1, repeat))]
+    return max(runs, key=lambda r: r["ops_per_sec"])
+
+
+# ---- validate_bearer_header ------------------------------------------
+
+
+def _tokens(n: int, key: Any = KEY, **claims: Any) -> List[str]:
+    # jti makes every token distinct, so each one misses the verified-token cache
+    return [mint_token(key, jti=f"bench-{i}", **claims) for i in range(n)]
+
+
+async def bench_validate(
+    headers: Callable[[int], str], n: int, expect: str, cold_jwks: bool = False
+) -> Dict[str, Any]:
+    token_cache.clear()  # repeats must miss like the first run did
+    lat: List[float] = []
+    outcomes: Dict[str, int] = {}
+    cpu = 0.0
+    for i in range(n):
+        header = headers(i)
+        if cold_jwks:
+            await close_jwks()
+            token_cache.clear()
+        c0 = time.process_time()
+        t0 = time.perf_counter()
+        try:
+            await validate_bearer_header(header)
+            outcome = "ok"
+        except AuthError as e:
+            outcome = e.error
+        lat.append(time.perf_counter() - t0)
+        cpu += time.process_time() - c0
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    if set(outcomes) != {expect}:
+        raise AssertionError(f"expected only {expect!r}, got {outcomes}")
+    return {
+        "outcome": expect,
+        "ops_per_sec": n / sum(lat),
+        "cpu_us_per_op": cpu * 1e6 / n,
+        **summarize(lat),
+    }
+
+
+async def validation_cases(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    n, cold = args.iterations, args.cold_iterations
+    run = functools.partial(best_of, args.repeat, bench_validate)
+    bearer = "Bearer {}".format
+    one = mint_token(KEY)
+    unique = _tokens(n)
+    scoped = _tokens(n, scp="Mcp.Read Mcp.Write")
+    results: Dict[str, Dict[str, Any]] = {}
+
+    await set_policy()
+    await ensure_jwks()
+    results["valid/cache_hit"] = await run(lambda i: bearer(one), n, "ok")
+    results["valid/cache_miss"] = await run(lambda i: bearer(unique[i]), n, "ok")
+    results["valid/cold_jwks"] = await bench_validate(lambda i: bearer(unique[i]), cold, "ok", cold_jwks=True)
+
+    await set_policy(scopes="Mcp.Read", roles="Mcp.Invoke")
+    await ensure_jwks()
+    results["enforced/cache_miss"] = await run(lambda i: bearer(scoped[i]), n, "ok")
+    results["enforced/cache_hit"] = await run(lambda i: bearer(scoped[0]), n, "ok")
+    no_role = _tokens(n, scp="Mcp.Read", roles=["Other"])
+    results["enforced/insufficient_role"] = await run(lambda i: bearer(no_role[i]), n, "insufficient_role")
+
+    await set_policy()
+    await ensure_jwks()
+    expired = _tokens(n, lifetime=-600)
+    bad_sig = _tokens(n, key=OTHER_KEY)
+    unknown_kid = [mint_token(KEY, kid="not-a-key", jti=f"u-{i}") for i in range(n)]
+    results["rejected/expired"] = await run(lambda i: bearer(expired[i]), n, "invalid_token")
+    results["rejected/bad_signature"] = await run(lambda i: bearer(bad_sig[i]), n, "invalid_token")
+    results["rejected/unknown_kid"] = await run(lambda i: bearer(unknown_kid[i]), n, "invalid_signature")
+    results["rejected/malformed"] = await run(lambda i: "Bearer not.a.jwt", n, "invalid_token")
+    return results
+
+
+# ---- middleware overhead ---------------------------------------------
+
+
+async def _ping(request: Request) -> Response:
+    return JSONResponse({"ok": True})
+
+
+async def bench_middleware(
+    app: Any, headers: Callable[[int], List[Tuple[bytes, bytes]]], n: int, status: int
+) -> Dict[str, Any]:
+    token_cache.clear()
+    for i in range(n, n + 50):  # warm-up (imports, first JWKS use); indexes after the measured ones
+        await asgi_call(app, "/mcp/ping", headers(i))
+    lat: List[float] = []
+    c0 = time.process_time()
+    for i in range(n):
+        got, _, total, _ = await asgi_call(app, "/mcp/ping", headers(i))
+        if got != status:
+            raise AssertionError(f"expected HTTP {status}, got {got}")
+        lat.append(total)
+    cpu = time.process_time() - c0
+    return {"status": status, "ops_per_sec": n / sum(lat), "cpu_us_per_op": cpu * 1e6 / n, **summarize(lat)}
+
+
+async def middleware_cases(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    n = args.iterations
+    run = functools.partial(best_of, args.repeat, bench_middleware)
+    bare = Starlette(routes=[Route("/mcp/ping", _ping)])
+    wrapped = Starlette(routes=[Route("/mcp/ping", _ping)])
+    wrapped.add_middleware(BearerAuthMiddleware)
+
+    def auth(tokens: List[str]) -> Callable[[int], List[Tuple[bytes, bytes]]]:
+        return lambda i: [(b"authorization", f"Bearer {tokens[i % len(tokens)]}".encode())]
+
+    unique = _tokens(n + 50)  # measured requests 0..n-1 each miss the token cache
+    bad_sig = _tokens(1, key=OTHER_KEY)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    await set_policy()
+    await ensure_jwks()
+    results["endpoint/no_middleware"] = await run(bare, lambda i: [], n, 200)
+    results["middleware/cache_hit"] = await run(wrapped, auth([mint_token(KEY)]), n, 200)
+    results["middleware/cache_miss"] = await run(wrapped, auth(unique), n, 200)
+    results["middleware/rejected"] = await run(wrapped, auth(bad_sig), n, 401)
+    await set_policy(required=False)
+    results["middleware/auth_off"] = await run(wrapped, lambda i: [], n, 200)
+
+    base = results["endpoint/no_middleware"]["p50_ms"]
+    for name, r in results.items():
+        r["overhead_p50_ms"] = r["p50_ms"] - base
+    return results
+
+
+async def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is kept")
+    ap.add_argument("--cold-iterations", type=int, default=200, help="cold-JWKS case (one key fetch each)")
+    ap.add_argument("--jwks-latency-ms", type=float, default=0.0, help="simulated JWKS fetch latency")
+    ap.add_argument("--json", help="write machine-readable results here (a baseline)")
+    ap.add_argument("--compare", help="baseline JSON to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (µs-scale: noisy)")
+    args = ap.parse_args()
+
+    server, url = start_jwks_server(args.jwks_latency_ms / 1000.0)
+    os.environ["ENTRA_JWKS_URL"] = url
+    try:
+        results = await validation_cases(args)
+        results.update(await middleware_cases(args))
+    finally:
+        await close_jwks()
+        server.shutdown()
+
+    print(f"{'case':<30}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'cpu us':>10}  result")
+    for name, r in results.items():
+        extra = f"  +{r['overhead_p50_ms']:.3f}ms" if "overhead_p50_ms" in r else ""
+        print(f"{name:<30}{r['ops_per_sec']:>10.0f}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['cpu_us_per_op']:>10.0f}  {r.get('outcome', r.get('status'))}{extra}")
+
+    out = {"meta": run_meta(args), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        # p99 of microsecond operations is mostly scheduler noise: reported, not gated
+        metrics = {"ops_per_sec": True, "p50_ms": False, "cpu_us_per_op": False}
+        problems = regressions(baseline, results, metrics, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            return 1
+        print(f"no regressions vs {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
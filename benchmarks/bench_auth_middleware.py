@@ -0,0 +1,115 @@
+# benchmarks/bench_auth_middleware.py
+"""
+Pure-ASGI BearerAuthMiddleware vs the previous BaseHTTPMiddleware version.
+
+Measures, for an authenticated request through each middleware:
+- p50/p99 latency of a trivial JSON endpoint
+- SSE time-to-first-byte and total time of a short event stream
+
+Auth runs against a locally minted RS256 token and a local JWKS file, so
+no network is involved (the verified-token cache is warm after request 1).
+
+Run:  python benchmarks/bench_auth_middleware.py [--requests 2000] [--json out.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+
+from _common import asgi_call, configure_local_auth, make_keypair, mint_token, summarize
+
+KEY = make_keypair()
+configure_local_auth(KEY)
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse, Response, StreamingResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from prynai_mcp.auth.azure_oauth import AuthError, validate_bearer_header  # noqa: E402
+from prynai_mcp.auth.jwks import close_jwks  # noqa: E402
+from prynai_mcp.auth.middleware import BearerAuthMiddleware  # noqa: E402
+from prynai_mcp.config import settings  # noqa: E402
+
+
+class LegacyBearerAuthMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation this benchmark replaces (verbatim logic)."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        if not settings.AUTH_REQUIRED:
+            return await call_next(request)
+        path = request.url.path or "/"
+        if path in ("/healthz", "/livez"):
+            return await call_next(request)
+        if path.startswith("/mcp"):
+            try:
+                claims = await validate_bearer_header(request.headers.get("Authorization"))
+            except AuthError as e:
+                return e.response
+            request.state.user_claims = claims
+        return await call_next(request)
+
+
+async def _json(request: Request) -> Response:
+    return JSONResponse({"ok": True, "sub": request.state.user_claims.get("oid")})
+
+
+async def _sse(request: Request) -> Response:
+    async def events():
+        for i in range(5):
+            yield f"event: message\ndata: {i}\n\n"
+            await asyncio.sleep(0)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _build(middleware_cls) -> Starlette:
+    app = Starlette(routes=[Route("/mcp/json", _json), Route("/mcp/sse", _sse)])
+    app.add_middleware(middleware_cls)
+    return app
+
+
+async def _measure(app, path: str, headers, n: int):
+    lat, ttfb = [], []
+    for _ in range(min(50, n)):  # warm-up (JWKS + token cache)
+        await asgi_call(app, path, headers)
+    for _ in range(n):
+        status, first, total, _ = await asgi_call(app, path, headers)
+        assert status == 200, status
+        lat.append(total)
+        ttfb.append(first)
+    return lat, ttfb
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--json", help="write machine-readable results here")
+    args = ap.parse_args()
+
+    headers = [(b"authorization", f"Bearer {mint_token(KEY)}".encode())]
+    results = {}
+    for label, cls in (("base_http_middleware", LegacyBearerAuthMiddleware), ("pure_asgi", BearerAuthMiddleware)):
+        app = _build(cls)
+        json_lat, _ = await _measure(app, "/mcp/json", headers, args.requests)
+        sse_lat, sse_ttfb = await _measure(app, "/mcp/sse", headers, args.requests)
+        results[label] = {
+            "json": summarize(json_lat),
+            "sse_total": summarize(sse_lat),
+            "sse_ttfb": summarize(sse_ttfb),
+        }
+    await close_jwks()
+
+    for label, r in results.items():
+        print(f"{label:>22}  json p50={r['json']['p50_ms']:.3f}ms p99={r['json']['p99_ms']:.3f}ms  "
+              f"sse ttfb p50={r['sse_ttfb']['p50_ms']:.3f}ms p99={r['sse_ttfb']['p99_ms']:.3f}ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
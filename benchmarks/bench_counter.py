@@ -0,0 +1,137 @@
+# benchmarks/bench_counter.py
+"""
+Counter throughput: single-key INCRBY vs sharded vs write-behind (counter.py).
+
+Runs --workers concurrent bumpers for --seconds per mode/consistency and reports
+ops/sec, bump latency p50/p99 and Redis round trips per bump. The final Redis
+total is checked against the number of bumps (no lost increments).
+
+Defaults to an in-process fakeredis with a simulated round trip (--rtt-ms), so the
+numbers show round-trip savings. Point --redis-url at a real Redis/cluster to also
+see the hot-key effect sharding removes.
+
+Run:  python benchmarks/bench_counter.py [--workers 64] [--seconds 3] [--rtt-ms 0.5]
+                                         [--redis-url redis://...] [--json out.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from _common import summarize
+
+from prynai_mcp.counter import BufferedCounter, Counter, ShardedCounter  # noqa: E402
+
+KEY = "prynai:bench:counter"
+
+
+def _fake_redis(rtt: float) -> Any:
+    import fakeredis
+
+    class SlowFakeRedis(fakeredis.FakeAsyncRedis):
+        """fakeredis that sleeps one simulated RTT per command / pipeline."""
+
+        round_trips = 0
+
+        async def execute_command(self, *args: Any, **kwargs: Any) -> Any:
+            SlowFakeRedis.round_trips += 1
+            if rtt:
+                await asyncio.sleep(rtt)
+            return await super().execute_command(*args, **kwargs)
+
+        def pipeline(self, *args: Any, **kwargs: Any) -> Any:
+            pipe = super().pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def slow_execute(*a: Any, **k: Any) -> Any:
+                SlowFakeRedis.round_trips += 1
+                if rtt:
+                    await asyncio.sleep(rtt)
+                return await execute(*a, **k)
+
+            pipe.execute = slow_execute
+            return pipe
+
+    return SlowFakeRedis(decode_responses=True)
+
+
+async def _run(counter: Counter, workers: int, seconds: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    deadline = time.perf_counter() + seconds
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            await counter.incr(1)
+            latencies.append(time.perf_counter() - t0)
+
+    await counter.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - t0
+    await counter.stop()
+    return {"ops": len(latencies), "ops_per_sec": len(latencies) / elapsed, **summarize(latencies)}
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=64)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--shards", type=int, default=16)
+    ap.add_argument("--flush-ms", type=int, default=20)
+    ap.add_argument("--rtt-ms", type=float, default=0.5, help="simulated Redis round trip (fakeredis only)")
+    ap.add_argument("--redis-url", default=None, help="use a real Redis instead of fakeredis")
+    ap.add_argument("--json", default=None)
+    args = ap.parse_args()
+
+    if args.redis_url:
+        from redis.asyncio import Redis
+
+        client = Redis.from_url(args.redis_url, decode_responses=True)
+    else:
+        client = _fake_redis(args.rtt_ms / 1000.0)
+
+    async def redis() -> Any:
+        return client
+
+    flush = args.flush_ms / 1000.0
+    modes = {
+        "single": lambda: Counter(KEY, redis),
+        "sharded/exact": lambda: ShardedCounter(KEY, args.shards, True, flush, redis),
+        "sharded/eventual": lambda: ShardedCounter(KEY, args.shards, False, flush, redis),
+        "buffered/exact": lambda: BufferedCounter(KEY, flush, True, redis),
+        "buffered/eventual": lambda: BufferedCounter(KEY, flush, False, redis),
+    }
+
+    results: Dict[str, Any] = {}
+    print(f"{'mode':<20}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'rt/op':>8}  total ok")
+    for name, factory in modes.items():
+        await client.delete(KEY, *[f"{KEY}:{i}" for i in range(args.shards)])
+        counter = factory()
+        rt0 = getattr(type(client), "round_trips", 0)
+        res = await _run(counter, args.workers, args.seconds)
+        rts = getattr(type(client), "round_trips", 0) - rt0
+        total = await ShardedCounter(KEY, args.shards, True, 0, redis).get()
+        res.update(redis_total=total, consistent=total == res["ops"], round_trips_per_op=rts / max(1, res["ops"]))
+        results[name] = res
+        print(
+            f"{name:<20}{res['ops_per_sec']:>12.0f}{res['p50_ms']:>10.2f}{res['p99_ms']:>10.2f}"
+            f"{res['round_trips_per_op']:>8.3f}  {res['consistent']}"
+        )
+
+    base = results["single"]["ops_per_sec"]
+    for name, res in results.items():
+        res["speedup_vs_single"] = res["ops_per_sec"] / base
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if hasattr(client, "aclose"):
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
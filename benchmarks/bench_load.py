@@ -0,0 +1,499 @@
+# benchmarks/bench_load.py
+"""
+Load test for the full server (prynai_mcp.app): throughput, tail latency, CPU per request.
+
+Virtual users run a weighted tool/resource mix for --duration seconds, after --warmup:
+- add, echo, bump_counter, long_task (tools), read_status, read_counter,
+  read_hello (resources/read) and list_tools (tools/list, a few KB of schemas); pick
+  the weights with --mix "add=5,echo=3,...".
+- --transport inproc drives the ASGI app in this process (httpx.ASGITransport, app
+  lifespan included); http starts `python -m prynai_mcp.server` (the launcher) on a
+  free local port with --server-workers workers. "inproc,http" runs both.
+- --sessions user: one MCP session per virtual user (typical agent);
+  shared: --shared-sessions sessions multiplexed by all users;
+  fresh: initialize + call + DELETE every time (session setup reported separately).
+- --client raw sends JSON-RPC with httpx (server cost only); sdk goes through the
+  mcp ClientSession + streamable HTTP client, like prynai.mcp_core does.
+- --accept-encoding is sent on every request ("zstd, gzip" like prynai.mcp_core;
+  "identity" turns response compression off), so runs with different values show
+  the egress bytes vs CPU tradeoff.
+- Auth is on, with a locally minted RS256 token and a local JWKS file. Redis is a
+  throwaway fakeredis TCP server unless --redis-url is given. --set NAME=VALUE passes
+  any other Settings override (e.g. --set COUNTER_MODE=sharded) to the server.
+
+Reports req/s, p50/p95/p99 overall and per operation, error/shed counts, CPU per
+request (inproc: this process, client included; http: server processes and client
+separately) and response bytes per request on the wire (as received, before decoding)
+and, for the raw client, decoded. --json writes the results; --compare BASELINE.json flags throughput,
+latency or CPU regressions beyond --tolerance and exits 1 if there are any.
+
+Run:  PYTHONPATH=src python benchmarks/bench_load.py [--transport inproc,http]
+          [--concurrency 32] [--duration 10] [--sessions user] [--client raw]
+          [--accept-encoding "zstd, gzip"]
+          [--json out.json] [--compare baseline.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from _common import (
+    configure_local_auth,
+    free_port,
+    make_keypair,
+    mint_token,
+    proc_tree_cpu,
+    regressions,
+    run_meta,
+    start_fake_redis,
+    summarize,
+    wait_for_port,
+)
+
+import httpx  # noqa: E402
+
+PROTOCOL_VERSION = "2025-06-18"
+DEFAULT_MIX = "add=30,echo=20,bump_counter=10,long_task=5,read_status=15,read_counter=10,read_hello=10"
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+# ---- operations ------------------------------------------------------
+
+
+def _operation(name: str, i: int, args: argparse.Namespace) -> Tuple[str, Dict[str, Any]]:
+    """JSON-RPC method and params for one operation of the mix."""
+    if name == "add":
+        return "tools/call", {"name": "add", "arguments": {"a": i, "b": 1}}
+    if name == "echo":
+        return "tools/call", {"name": "echo", "arguments": {"message": "x" * args.echo_bytes}}
+    if name == "bump_counter":
+        return "tools/call", {"name": "bump_counter", "arguments": {"step": 1}}
+    if name == "long_task":
+        return "tools/call", {"name": "long_task", "arguments": {"steps": args.long_steps}}
+    if name == "read_status":
+        return "resources/read", {"uri": "prynai://status"}
+    if name == "read_counter":
+        return "resources/read", {"uri": "prynai://counter"}
+    if name == "read_hello":
+        return "resources/read", {"uri": f"hello://bench-{i % 100}"}
+    if name == "list_tools":
+        return "tools/list", {}
+    raise ValueError(f"unknown operation {name!r}")
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name:
+            _operation(name, 0, argparse.Namespace(echo_bytes=0, long_steps=0))  # validates the name
+            mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("empty --mix")
+    return mix
+
+
+# ---- clients ---------------------------------------------------------
+
+
+class ByteCounter:
+    def __init__(self) -> None:
+        self.wire = 0     # response bytes as received (compressed, if the server compressed)
+        self.decoded = 0  # after Content-Encoding decoding (raw client only)
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, counter: ByteCounter):
+        self.inner = inner
+        self.counter = counter
+
+    async def __aiter__(self):
+        async for chunk in self.inner:
+            self.counter.wire += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """Counts response bytes below httpx's decoding, i.e. what crossed the wire."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, counter: ByteCounter):
+        self.inner = inner
+        self.counter = counter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        response.stream = _CountedStream(response.stream, self.counter)
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class RawClient:
+    """JSON-RPC over httpx; a session is just its Mcp-Session-Id."""
+
+    def __init__(self, http: httpx.AsyncClient, token: str, accept_encoding: str = "identity", counter: Optional[ByteCounter] = None):
+        self.http = http
+        self.headers = {
+            "authorization": f"Bearer {token}",
+            "accept": "application/json, text/event-stream",
+            "accept-encoding": accept_encoding,
+            "content-type": "application/json",
+        }
+        self.counter = counter
+        self._ids = 0
+
+    def _session_headers(self, session: str) -> Dict[str, str]:
+        return {**self.headers, "mcp-session-id": session, "mcp-protocol-version": PROTOCOL_VERSION}
+
+    async def _rpc(self, method: str, params: Dict[str, Any], session: Optional[str]) -> Tuple[str, httpx.Response]:
+        self._ids += 1
+        body = {"jsonrpc": "2.0", "id": self._ids, "method": method, "params": params}
+        headers = self._session_headers(session) if session else self.headers
+        r = await self.http.post("/mcp", json=body, headers=headers)
+        if self.counter is not None:
+            self.counter.decoded += len(r.content)
+        if r.status_code in (429, 503):
+            return "shed", r
+        if r.status_code != 200:
+            return "error", r
+        msg = _last_message(r)
+        if msg is None or "error" in msg or (msg.get("result") or {}).get("isError"):
+            return "error", r
+        return "ok", r
+
+    async def open(self) -> str:
+        params = {"protocolVersion": PROTOCOL_VERSION, "capabilities": {}, "clientInfo": {"name": "bench", "version": "1"}}
+        outcome, r = await self._rpc("initialize", params, None)
+        session = r.headers.get("mcp-session-id")
+        if outcome != "ok" or not session:
+            raise RuntimeError(f"initialize failed: {r.status_code} {r.text[:200]}")
+        note = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+        await self.http.post("/mcp", json=note, headers=self._session_headers(session))
+        return session
+
+    async def call(self, session: str, method: str, params: Dict[str, Any]) -> str:
+        return (await self._rpc(method, params, session))[0]
+
+    async def close(self, session: str) -> None:
+        await self.http.delete("/mcp", headers=self._session_headers(session))
+
+
+def _last_message(r: httpx.Response) -> Optional[Dict[str, Any]]:
+    if r.headers.get("content-type", "").startswith("application/json"):
+        return r.json()
+    data = [line[5:] for line in r.text.splitlines() if line.startswith("data:")]
+    return json.loads(data[-1]) if data else None
+
+
+class SdkClient:
+    """mcp ClientSession over the SDK's streamable HTTP client."""
+
+    def __init__(self, base_url: str, token: str, transport: Callable[[], httpx.AsyncBaseTransport], accept_encoding: str):
+        self.url = base_url.rstrip("/") + "/mcp"
+        self.headers = {"authorization": f"Bearer {token}", "accept-encoding": accept_encoding}
+        self.transport = transport  # one per SDK client: closing a client closes its transport
+        self._stacks: Dict[int, AsyncExitStack] = {}
+
+    def _http(self, headers: Optional[Dict[str, str]] = None, timeout: Any = None, auth: Any = None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(headers=headers, timeout=timeout, auth=auth, transport=self.transport())
+
+    async def open(self) -> Any:
+        from mcp import ClientSession
+        from mcp.client.streamable_http import streamablehttp_client
+
+        stack = AsyncExitStack()
+        read, write, _ = await stack.enter_async_context(
+            streamablehttp_client(self.url, headers=self.headers, httpx_client_factory=self._http)
+        )
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+        self._stacks[id(session)] = stack
+        return session
+
+    async def call(self, session: Any, method: str, params: Dict[str, Any]) -> str:
+        from mcp.shared.exceptions import McpError
+
+        try:
+            if method == "tools/call":
+                res = await session.call_tool(params["name"], params["arguments"])
+                return "error" if res.isError else "ok"
+            if method == "tools/list":
+                await session.list_tools()
+                return "ok"
+            await session.read_resource(params["uri"])
+            return "ok"
+        except McpError:
+            return "error"
+        except httpx.HTTPStatusError as e:
+            return "shed" if e.response.status_code in (429, 503) else "error"
+
+    async def close(self, session: Any) -> None:
+        stack = self._stacks.pop(id(session), None)
+        if stack is not None:
+            await stack.aclose()
+
+
+# ---- the run ---------------------------------------------------------
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.measuring = False
+        self.latency: Dict[str, List[float]] = {}
+        self.outcomes: Dict[str, Dict[str, int]] = {}
+        self.session_open: List[float] = []
+
+    def add(self, op: str, outcome: str, seconds: float) -> None:
+        if not self.measuring:
+            return
+        counts = self.outcomes.setdefault(op, {"ok": 0, "error": 0, "shed": 0})
+        counts[outcome] += 1
+        if outcome == "ok":
+            self.latency.setdefault(op, []).append(seconds)
+
+
+CpuProbe = Callable[[], Dict[str, Optional[float]]]
+
+
+async def _run_load(
+    client: Any, args: argparse.Namespace, mix: Dict[str, float], rec: Recorder, cpu: CpuProbe, counter: ByteCounter
+) -> Dict[str, Optional[float]]:
+    """Run the users; return CPU seconds (per probe name) and response bytes of the measured window."""
+    names, weights = list(mix), list(mix.values())
+    stop = asyncio.Event()
+    shared: List[Any] = []
+    if args.sessions == "shared":
+        shared = [await client.open() for _ in range(max(1, args.shared_sessions))]
+
+    async def user(uid: int) -> None:
+        rng = random.Random(args.seed * 1000 + uid)
+        own = await client.open() if args.sessions == "user" else None
+        i = 0
+        try:
+            while not stop.is_set():
+                i += 1
+                op = rng.choices(names, weights)[0]
+                method, params = _operation(op, i, args)
+                session = own if own is not None else shared[uid % len(shared)] if shared else None
+                if session is None:
+                    t0 = time.perf_counter()
+                    session = await client.open()
+                    if rec.measuring:
+                        rec.session_open.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                try:
+                    outcome = await client.call(session, method, params)
+                except Exception:
+                    outcome = "error"
+                rec.add(op, outcome, time.perf_counter() - t0)
+                if args.sessions == "fresh":
+                    await client.close(session)
+        finally:
+            if own is not None:
+                await client.close(own)
+
+    tasks = [asyncio.create_task(user(u)) for u in range(args.concurrency)]
+    await asyncio.sleep(args.warmup)
+    cpu0, wire0, decoded0 = cpu(), counter.wire, counter.decoded
+    rec.measuring = True
+    await asyncio.sleep(args.duration)
+    rec.measuring = False
+    cpu1, wire1, decoded1 = cpu(), counter.wire, counter.decoded
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for session in reversed(shared):  # SDK sessions nest cancel scopes: close LIFO
+        await client.close(session)
+    used = {k: None if v is None or cpu0[k] is None else v - cpu0[k] for k, v in cpu1.items()}
+    return {**used, "wire_bytes": wire1 - wire0, "decoded_bytes": (decoded1 - decoded0) if args.client == "raw" else None}
+
+
+def _report(rec: Recorder, elapsed: float, used: Dict[str, Optional[float]]) -> Dict[str, Any]:
+    all_lat = [x for xs in rec.latency.values() for x in xs]
+    ok = sum(c["ok"] for c in rec.outcomes.values())
+    total = sum(sum(c.values()) for c in rec.outcomes.values())
+    result: Dict[str, Any] = {
+        "requests": total,
+        "ok": ok,
+        "errors": sum(c["error"] for c in rec.outcomes.values()),
+        "shed": sum(c["shed"] for c in rec.outcomes.values()),
+        "elapsed_s": elapsed,
+        "rps": ok / elapsed if elapsed else 0.0,
+        "latency": summarize(all_lat),
+        "by_op": {
+            op: {**summarize(rec.latency.get(op, [])), **counts} for op, counts in sorted(rec.outcomes.items())
+        },
+    }
+    for name in ("wire_bytes", "decoded_bytes"):
+        n = used.pop(name)
+        result[f"{name}_per_req"] = n / total if n is not None and total else None
+    for name, seconds in used.items():
+        result[f"{name}_cpu_ms_per_req"] = seconds * 1e3 / total if seconds is not None and total else None
+    if rec.session_open:
+        result["session_open"] = summarize(rec.session_open)
+    return result
+
+
+async def run_inproc(args: argparse.Namespace, mix: Dict[str, float], token: str) -> Dict[str, Any]:
+    from prynai_mcp.app import app
+
+    rec = Recorder()
+    counter = ByteCounter()
+    asgi = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=CountingTransport(asgi, counter), base_url="http://bench", timeout=60) as http:
+            if args.client == "raw":
+                client = RawClient(http, token, args.accept_encoding, counter)
+            else:
+                client = SdkClient("http://bench", token, lambda: CountingTransport(asgi, counter), args.accept_encoding)
+            used = await _run_load(client, args, mix, rec, lambda: {"process": time.process_time()}, counter)
+    return _report(rec, args.duration, used)
+
+
+async def run_http(args: argparse.Namespace, mix: Dict[str, float], token: str) -> Dict[str, Any]:
+    port = free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(p for p in (SRC, os.environ.get("PYTHONPATH")) if p),
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": str(args.server_workers),
+    }
+    server = subprocess.Popen([sys.executable, "-m", "prynai_mcp.server"], env=env)
+    try:
+        wait_for_port(port)
+        base = f"http://127.0.0.1:{port}"
+        limits = httpx.Limits(max_connections=args.concurrency + 8, max_keepalive_connections=args.concurrency + 8)
+        rec = Recorder()
+        counter = ByteCounter()
+        transport = CountingTransport(httpx.AsyncHTTPTransport(limits=limits), counter)
+        async with httpx.AsyncClient(base_url=base, timeout=60, transport=transport) as http:
+            if args.client == "raw":
+                client = RawClient(http, token, args.accept_encoding, counter)
+            else:
+                client = SdkClient(base, token, lambda: CountingTransport(httpx.AsyncHTTPTransport(), counter), args.accept_encoding)
+            used = await _run_load(
+                client, args, mix, rec, lambda: {"server": proc_tree_cpu(server.pid), "client": time.process_time()}, counter
+            )
+        return _report(rec, args.duration, used)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+# ---- baselines -------------------------------------------------------
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions of current vs baseline (same transports only)."""
+
+    def flat(results: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        return {t: {**r, **{k: v for k, v in r["latency"].items() if k.endswith("_ms")}} for t, r in results.items()}
+
+    metrics = {
+        "rps": True,
+        "p50_ms": False,
+        "p95_ms": False,
+        "p99_ms": False,
+        "server_cpu_ms_per_req": False,
+        "process_cpu_ms_per_req": False,
+        "wire_bytes_per_req": False,
+    }
+    return regressions(flat(baseline.get("results", {})), flat(current["results"]), metrics, tolerance)
+
+
+def _print(transport: str, r: Dict[str, Any]) -> None:
+    lat = r["latency"]
+    cpu = "  ".join(
+        f"{k.replace('_cpu_ms_per_req', '')} cpu={v:.2f}ms/req" for k, v in r.items() if k.endswith("_cpu_ms_per_req") and v is not None
+    )
+    size = f"wire={r['wire_bytes_per_req']:.0f}B/req" if r.get("wire_bytes_per_req") is not None else ""
+    if r.get("decoded_bytes_per_req") is not None:
+        size += f" decoded={r['decoded_bytes_per_req']:.0f}B/req"
+    print(f"{transport:>7}  {r['rps']:8.1f} req/s  p50={lat['p50_ms']:.2f}ms p95={lat['p95_ms']:.2f}ms "
+          f"p99={lat['p99_ms']:.2f}ms  errors={r['errors']} shed={r['shed']}  {cpu}  {size}")
+    for op, s in r["by_op"].items():
+        print(f"{'':>9}{op:<14}{s['ok']:>7} ok  p50={s['p50_ms']:.2f}ms p95={s['p95_ms']:.2f}ms p99={s['p99_ms']:.2f}ms")
+
+
+async def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--transport", default="inproc", help="inproc, http or both (comma-separated)")
+    ap.add_argument("--client", choices=["raw", "sdk"], default="raw")
+    ap.add_argument("--concurrency", type=int, default=32, help="virtual users")
+    ap.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--mix", default=DEFAULT_MIX)
+    ap.add_argument("--sessions", choices=["user", "shared", "fresh"], default="user")
+    ap.add_argument("--shared-sessions", type=int, default=4)
+    ap.add_argument("--echo-bytes", type=int, default=64)
+    ap.add_argument("--accept-encoding", default="zstd, gzip", help='response codings to accept ("identity" = none)')
+    ap.add_argument("--long-steps", type=int, default=1, help="long_task steps (0.2s each)")
+    ap.add_argument("--server-workers", type=int, default=1, help="http: launcher workers")
+    ap.add_argument("--redis-url", default=None, help="use this Redis instead of a throwaway fakeredis")
+    ap.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="extra Settings env")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write machine-readable results here (a baseline)")
+    ap.add_argument("--compare", help="baseline JSON to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = ap.parse_args()
+    transports = [t.strip() for t in args.transport.replace("both", "inproc,http").split(",") if t.strip()]
+    mix = parse_mix(args.mix)
+
+    key = make_keypair()
+    configure_local_auth(key)
+    redis_proc = None
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        redis_proc, os.environ["REDIS_URL"] = start_fake_redis()
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    for item in args.set:
+        name, _, value = item.partition("=")
+        os.environ[name] = value
+    token = mint_token(key, lifetime=24 * 3600)
+
+    runners: Dict[str, Callable[..., Awaitable[Dict[str, Any]]]] = {"inproc": run_inproc, "http": run_http}
+    results: Dict[str, Any] = {}
+    try:
+        for transport in transports:
+            results[transport] = await runners[transport](args, mix, token)
+            _print(transport, results[transport])
+    finally:
+        if redis_proc is not None:
+            redis_proc.terminate()
+            redis_proc.wait()
+
+    out = {"meta": run_meta(args), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(json.load(f), out, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            return 1
+        print(f"no regressions vs {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -4,31 +4,83 @@ Minimal, reusable MCP client helpers for LangChain/LangGraph agents.
 
 Stable API you can import:
 - get_cc_token() -> str
+- aget_cc_token() -> str            (async; cached, single-flight, proactively refreshed)
 - list_mcp_tools() -> list[(name, description)]
 - call_mcp_tool(name, args) -> str
-- build_langchain_tools(tool_names: Optional[list[str]]) -> list[BaseTool]
+- stream_mcp_tool(name, args, max_buffered=64) -> async iterator of str chunks (@streaming tools)
+- get_mcp_artifact_info(name) -> dict (size, etag, ...) of an artifact:// resource
+- iter_mcp_artifact(name, etag=None, offset=0, length=None) -> async iterator of bytes
+- call_mcp_tools_batch([(name, args), ...], concurrency=N, timeout=None) -> list[ToolCallResult]
+- iter_mcp_tools_batch([(name, args), ...], ...) -> async iterator of ToolCallResult (as completed)
+- build_langchain_tools(tool_names: Optional[list[str]]) -> list[BaseTool]   (cached catalog)
+- invalidate_tool_catalog(url=None) -> None
+- close_mcp_pool() -> None          (async; graceful shutdown of pooled sessions)
 
 Notes
-- Each LangChain tool opens/closes its OWN MCP session per invocation.
-- Avoids sharing a session (prevents anyio.ClosedResourceError).
+- One MSAL app + in-memory token cache per process; tokens are refreshed on a
+  background task before expiry, so tool calls normally never wait on Entra.
+- Tool calls borrow initialized sessions from a per-event-loop pool instead of
+  paying a connect + initialize() handshake each time. Every session is entered
+  and exited inside its own owner task (spawned by the pool's supervisor), so
+  anyio cancel scopes never cross tasks (the old anyio.ClosedResourceError).
+- stream_mcp_tool() opts the call into streaming (a progressToken plus the
+  "prynai/stream" _meta flag) and yields each progress message as a chunk
+  while the call runs. At most max_buffered chunks wait for the consumer; beyond that
+  the session stops reading, so a slow consumer slows the server's generator down
+  (pooled sessions are borrowed exclusively, so no other call shares that stall).
+- iter_mcp_artifact() reads an artifact in ranges pinned to one etag, so memory stays
+  at one range on both sides; compare get_mcp_artifact_info()["etag"] with the one you
+  stored to skip unchanged artifacts.
+- Responses are compressed when large: requests advertise PRYNAI_MCP_COMPRESSION
+  ("zstd,gzip"; zstd only with prynai-mcp[zstd] installed, "none" to turn it off) and
+  httpx decodes them, SSE included, one flushed message at a time.
+- A 429/503 refusal fails only the refused request (McpError -32029/-32030, retried
+  after its retryAfter); the SDK would otherwise drop the whole session on it. So does
+  a 413 for an oversized request (McpError -32600, not retried).
+- PRYNAI_MCP_POOL_SIZE=0 restores one short-lived session per call.
+- With opentelemetry installed (prynai-mcp[otel]), token acquisition, session setup and
+  tool calls get spans, and the W3C trace context travels with every MCP request
+  (params._meta and the HTTP traceparent header) so server spans join the same trace.
 - Ensures each tool has a docstring and passes description=... to the
   decorator, satisfying LangChain's requirement.
 """
 
 from __future__ import annotations
 
+import asyncio
+import base64
+import contextvars
+import hashlib
+import json
 import os
-from typing import Any, Dict, List, Optional, Tuple
-from contextlib import asynccontextmanager
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass
 
+import anyio
+import httpx
 import msal
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, ConfigDict, create_model
+from pydantic import AnyUrl, BaseModel, Field, ConfigDict, create_model
 
 from langchain_core.tools import tool, BaseTool
 
-from mcp import ClientSession
+from mcp import ClientSession, types
 from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+
+try:
+    from opentelemetry import propagate as _otel_propagate, trace as _otel_trace
+except ImportError:  # optional extra: pip install "prynai-mcp[otel]"
+    _otel_propagate = _otel_trace = None
+
+
+try:
+    import zstandard as _zstandard  # noqa: F401  (lets httpx decode zstd responses)
+except ImportError:  # optional extra: pip install "prynai-mcp[zstd]"
+    _zstandard = None
 
 
 # ---------------------------------------------------------------------------
@@ -44,26 +96,172 @@ CLIENT_ID = os.getenv("ENTRA_CLIENT_ID", "").strip()
 CLIENT_SECRET = os.getenv("ENTRA_CLIENT_SECRET", "").strip()
 SERVER_APP_URI = os.getenv("SERVER_APP_ID_URI", "").strip()
 
+# Session pool: max concurrent sessions, idle eviction, ping-before-reuse threshold
+POOL_SIZE = int(os.getenv("PRYNAI_MCP_POOL_SIZE", "4"))
+POOL_IDLE_SECONDS = float(os.getenv("PRYNAI_MCP_POOL_IDLE_SECONDS", "300"))
+POOL_PING_AFTER_SECONDS = float(os.getenv("PRYNAI_MCP_POOL_PING_AFTER_SECONDS", "30"))
+# HTTP 429 (rate limited) or 503 + Retry-After (shed by admission control) from the server:
+# wait Retry-After (if <= max wait) and retry, at most N times
+RATE_LIMIT_RETRIES = int(os.getenv("PRYNAI_MCP_RATE_LIMIT_RETRIES", "2"))
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("PRYNAI_MCP_RATE_LIMIT_MAX_WAIT_SECONDS", "10"))
+# Tool catalog cache for build_langchain_tools (0 = always call list_tools)
+TOOL_CACHE_TTL_SECONDS = float(os.getenv("PRYNAI_MCP_TOOL_CACHE_TTL_SECONDS", "300"))
+# Response compression to accept, in preference order ("none" = identity); httpx decodes it
+COMPRESSION = os.getenv("PRYNAI_MCP_COMPRESSION", "zstd,gzip")
+
 if not MCP_URL:
     raise RuntimeError("PRYNAI_MCP_URL is required")
 
 
+# ---------------------------------------------------------------------------
+# Tracing (optional)
+# ---------------------------------------------------------------------------
+
+_TRACE_KEYS = ("traceparent", "tracestate", "baggage")
+
+
+def _span(name: str, **attributes: Any):
+    """Client span when opentelemetry is installed, else a no-op."""
+    if _otel_trace is None:
+        return nullcontext()
+    return _otel_trace.get_tracer("prynai.mcp_core").start_as_current_span(
+        name, kind=_otel_trace.SpanKind.CLIENT, attributes=attributes
+    )
+
+
+def _trace_carrier() -> Dict[str, str]:
+    """W3C trace context of the current span (empty without opentelemetry / active span)."""
+    carrier: Dict[str, str] = {}
+    if _otel_propagate is not None:
+        _otel_propagate.inject(carrier)
+    return carrier
+
+
+class _TracingClientSession(ClientSession):
+    """
+    ClientSession that stamps the caller's trace context into params._meta of each request.
+    Pooled sessions send over a transport task owned by the pool, so contextvars (and any
+    header injection based on them) would carry the wrong parent; _meta is per request.
+    """
+
+    async def send_request(self, request: types.ClientRequest, *args: Any, **kwargs: Any) -> Any:
+        params = getattr(request.root, "params", None)
+        carrier = _trace_carrier() if params is not None else {}
+        if carrier:
+            meta = params.meta or types.RequestParams.Meta()
+            for k, v in carrier.items():
+                setattr(meta, k, v)
+            params.meta = meta
+        return await super().send_request(request, *args, **kwargs)
+
+
+_Session = _TracingClientSession if _otel_propagate is not None else ClientSession
+
+
 # ---------------------------------------------------------------------------
 # Auth
 # ---------------------------------------------------------------------------
 
+# Hand out tokens with at least this much life left; otherwise refresh first.
+_TOKEN_MIN_TTL = 60.0
+# Background refresh this long before expiry. MSAL treats tokens with < 5 min left
+# as expired, so this yields a genuinely new token rather than the cached one.
+_TOKEN_REFRESH_AHEAD = 240.0
+
+
+class _TokenProvider:
+    """
+    Process-wide client-credentials token source.
+    - Reuses ONE msal.ConfidentialClientApplication (and its in-memory token cache).
+    - Async callers share a single in-flight acquisition (single-flight); the blocking
+      MSAL call runs in a worker thread, never on the event loop.
+    - After each acquisition, a background task refreshes the token ahead of expiry.
+    """
+
+    def __init__(self) -> None:
+        self._app: Optional[msal.ConfidentialClientApplication] = None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0  # wall clock (time.time())
+        self._lock = threading.Lock()
+        self._inflight: Optional[asyncio.Future] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    def _fresh(self) -> Optional[str]:
+        if self._token and time.time() < self._expires_at - _TOKEN_MIN_TTL:
+            return self._token
+        return None
+
+    def _acquire(self, force: bool = False) -> str:
+        """Blocking MSAL call (thread-safe). Returns the cached token when still fresh."""
+        with self._lock:
+            if not force and (tok := self._fresh()):
+                return tok
+            if self._app is None:
+                self._app = msal.ConfidentialClientApplication(
+                    CLIENT_ID,
+                    authority=f"https://login.microsoftonline.com/{TENANT_ID}",
+                    client_credential=CLIENT_SECRET,
+                )
+            scope = f"{SERVER_APP_URI}/.default"
+            with _span("msal.acquire_token_for_client", forced=force):
+                res = self._app.acquire_token_for_client(scopes=[scope])
+            if "access_token" not in res:
+                raise RuntimeError(f"Token acquisition failed: {res}")
+            self._token = res["access_token"]
+            self._expires_at = time.time() + float(res.get("expires_in") or 0)
+            return self._token
+
+    def get_sync(self) -> str:
+        return self._fresh() or self._acquire()
+
+    async def get(self) -> str:
+        tok = self._fresh()
+        if tok:
+            return tok
+        loop = asyncio.get_running_loop()
+        fut = self._inflight
+        if fut is None or fut.get_loop() is not loop:
+            fut = self._inflight = asyncio.ensure_future(asyncio.to_thread(self._acquire))
+            fut.add_done_callback(self._done)
+        # shield: a cancelled caller must not cancel the shared acquisition
+        tok = await asyncio.shield(fut)
+        self._schedule_refresh(loop)
+        return tok
+
+    def _done(self, fut: asyncio.Future) -> None:
+        if self._inflight is fut:
+            self._inflight = None
+        if not fut.cancelled():
+            fut.exception()  # mark retrieved; waiters already saw it
+
+    def _schedule_refresh(self, loop: asyncio.AbstractEventLoop) -> None:
+        task = self._refresher
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._refresher = loop.create_task(self._refresh_loop(), name="prynai-token-refresh")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            delay = max(1.0, self._expires_at - _TOKEN_REFRESH_AHEAD - time.time())
+            await asyncio.sleep(delay)
+            try:
+                await asyncio.to_thread(self._acquire, True)
+            except Exception:
+                # Keep the current token; callers fall back to an on-demand refresh
+                await asyncio.sleep(5.0)
+
+
+_tokens = _TokenProvider()
+
+
 def get_cc_token() -> str:
     """Acquire an Entra ID client-credentials access token for the MCP server."""
-    app = msal.ConfidentialClientApplication(
-        CLIENT_ID,
-        authority=f"https://login.microsoftonline.com/{TENANT_ID}",
-        client_credential=CLIENT_SECRET,
-    )
-    scope = f"{SERVER_APP_URI}/.default"
-    res = app.acquire_token_for_client(scopes=[scope])
-    if "access_token" not in res:
-        raise RuntimeError(f"Token acquisition failed: {res}")
-    return res["access_token"]
+    return _tokens.get_sync()
+
+
+async def aget_cc_token() -> str:
+    """Async get_cc_token(): cached, single-flight, never blocks the event loop."""
+    return await _tokens.get()
 
 
 # ---------------------------------------------------------------------------
@@ -79,41 +277,621 @@ def _scrub_network_env() -> None:
     ):
         os.environ.pop(k, None)
 
+def _accept_encoding() -> Dict[str, str]:
+    """Accept-Encoding for MCP requests: the configured codings this process can decode."""
+    decodable = {"gzip", "deflate"} | ({"zstd"} if _zstandard is not None else set())
+    codings = [c.strip().lower() for c in COMPRESSION.split(",") if c.strip().lower() in decodable]
+    return {"Accept-Encoding": ", ".join(codings) if codings else "identity"}
+
 @asynccontextmanager
 async def _mcp_session(headers: Optional[Dict[str, str]] = None):
     """Yield an initialized MCP ClientSession (short-lived)."""
     _scrub_network_env()
     if headers is None:
-        token = get_cc_token()
+        token = await aget_cc_token()
         headers = {"Authorization": f"Bearer {token}"}
-    async with streamablehttp_client(MCP_URL, headers=headers, timeout=120.0) as (read, write, _):
-        async with ClientSession(read, write) as s:
-            await s.initialize()
+    # One session per call: the caller's trace context can go on every HTTP request
+    headers = {**_accept_encoding(), **headers, **_trace_carrier()}
+    async with streamablehttp_client(
+        MCP_URL, headers=headers, timeout=120.0, httpx_client_factory=_http_client
+    ) as (read, write, _):
+        async with _Session(read, write, message_handler=_on_server_message) as s:
+            with _span("mcp.session.initialize"):
+                await s.initialize()
             yield s
 
 
+# ---------------------------------------------------------------------------
+# Session pool (long-lived, reused across calls)
+# ---------------------------------------------------------------------------
+
+T = TypeVar("T")
+
+
+class _BearerAuth(httpx.Auth):
+    """Attach the current client-credentials token to every request of a long-lived session."""
+
+    async def async_auth_flow(self, request: httpx.Request):
+        request.headers["Authorization"] = f"Bearer {await aget_cc_token()}"
+        if _otel_propagate is not None and request.method == "POST" and b'"traceparent"' in request.content:
+            # Mirror the per-request _meta trace context into the W3C headers
+            try:
+                meta = (json.loads(request.content).get("params") or {}).get("_meta") or {}
+            except (ValueError, AttributeError):
+                meta = {}
+            for k in _TRACE_KEYS:
+                if isinstance(meta.get(k), str):
+                    request.headers[k] = meta[k]
+        yield request
+
+
+class _RefusalTransport(httpx.AsyncBaseTransport):
+    """
+    Turns a 413/429/503 answer to a POSTed JSON-RPC message into a JSON-RPC error for it.
+    The SDK client raises on any HTTP error status inside its transport task, which tears
+    the whole session down; this way only the refused request fails (McpError, retried
+    by _backoff_if_rate_limited) and the pooled session stays usable. A refused
+    notification is dropped (202).
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._inner.handle_async_request(request)
+        if request.method != "POST" or response.status_code not in (413, 429, 503):
+            return response
+        try:
+            message = json.loads(request.content)
+        except ValueError:
+            return response
+        if not isinstance(message, dict) or "method" not in message:
+            return response
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        if "id" not in message:
+            return httpx.Response(202, request=request)
+        try:
+            error = json.loads(response.content).get("error")
+        except (ValueError, AttributeError):
+            error = None
+        if not isinstance(error, dict) or not {"code", "message"} <= error.keys():
+            codes = {413: -32600, 429: -32029, 503: -32030}
+            error = {"code": codes[response.status_code], "message": f"HTTP {response.status_code}"}
+        retry_after = response.headers.get("retry-after") or ("1" if response.status_code == 429 else None)
+        if retry_after is not None and not (isinstance(error.get("data"), dict) and "retryAfter" in error["data"]):
+            try:
+                error["data"] = {"retryAfter": float(retry_after)}
+            except ValueError:
+                error["data"] = {"retryAfter": 1.0}
+        return httpx.Response(
+            200,
+            headers={"content-type": "application/json"},
+            json={"jsonrpc": "2.0", "id": message["id"], "error": error},
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def _http_client(
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[httpx.Timeout] = None,
+    auth: Optional[httpx.Auth] = None,
+) -> httpx.AsyncClient:
+    """The SDK's create_mcp_http_client, with 429/503 refusals scoped to their request."""
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=timeout if timeout is not None else httpx.Timeout(30.0),
+        headers=headers,
+        auth=auth,
+        transport=_RefusalTransport(httpx.AsyncHTTPTransport()),
+    )
+
+
+def _leaf_errors(e: BaseException) -> List[BaseException]:
+    """Flatten (anyio/asyncio) exception groups."""
+    subs = getattr(e, "exceptions", None)
+    if not subs:
+        return [e]
+    return [leaf for sub in subs for leaf in _leaf_errors(sub)]
+
+
+def _session_rejected(e: Optional[BaseException]) -> bool:
+    """
+    Server no longer knows the session (replica restarted / session expired).
+    The request never ran, so it is safe to reconnect and retry it.
+    """
+    for leaf in _leaf_errors(e) if e is not None else []:
+        if isinstance(leaf, McpError) and "session terminated" in (leaf.error.message or "").lower():
+            return True
+        if isinstance(leaf, httpx.HTTPStatusError) and leaf.response.status_code in (400, 404):
+            return True
+    return False
+
+
+def _retry_after(e: Optional[BaseException]) -> Optional[float]:
+    """Seconds to wait if the server refused the request (429, or 503 with Retry-After), else None."""
+    for leaf in _leaf_errors(e) if e is not None else []:
+        if isinstance(leaf, McpError) and leaf.error.code in (-32029, -32030):
+            # Refusal delivered as a JSON-RPC error by _RefusalTransport (or the server itself)
+            data = leaf.error.data if isinstance(leaf.error.data, dict) else {}
+            try:
+                return max(0.0, float(data["retryAfter"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not isinstance(leaf, httpx.HTTPStatusError):
+            continue
+        status = leaf.response.status_code
+        if status == 429 or (status == 503 and "retry-after" in leaf.response.headers):
+            try:
+                return max(0.0, float(leaf.response.headers.get("retry-after", "1")))
+            except ValueError:
+                return 1.0
+    return None
+
+
+async def _backoff_if_rate_limited(e: BaseException, attempt: int) -> bool:
+    """Sleep out a 429/503's Retry-After and return True if the call should be retried."""
+    wait = _retry_after(getattr(e, "cause", e))
+    if wait is None or attempt >= RATE_LIMIT_RETRIES or wait > RATE_LIMIT_MAX_WAIT_SECONDS:
+        return False
+    await asyncio.sleep(wait)
+    return True
+
+
+def _session_lost(e: BaseException) -> bool:
+    """Errors after which a pooled session must not be reused."""
+    return _session_rejected(e) or isinstance(
+        e, (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, httpx.TransportError)
+    )
+
+
+class SessionLostError(RuntimeError):
+    """The pooled session's transport died while a call was in flight."""
+
+    def __init__(self, cause: Optional[BaseException]):
+        super().__init__(f"MCP session lost: {cause!r}")
+        self.cause = cause
+
+
+class _PooledSession:
+    __slots__ = ("session", "closing", "last_used", "error")
+
+    def __init__(self) -> None:
+        self.session: Optional[ClientSession] = None
+        self.closing = asyncio.Event()  # set → owner task exits its context managers (or it died)
+        self.last_used = time.monotonic()
+        self.error: Optional[BaseException] = None  # why the owner task ended, if it failed
+
+
+class McpSessionPool:
+    """
+    Pool of initialized MCP ClientSessions bound to one event loop.
+    - A supervisor task owns an anyio task group; each session lives in its own owner
+      task there, which enters AND exits the transport/session contexts.
+    - Borrowers get exclusive use of one session; at most max_size exist at once.
+    - Sessions idle longer than ping_after are pinged before reuse; idle ones past
+      idle_timeout are closed; lost sessions are dropped and reopened on demand.
+    """
+
+    def __init__(self, url: str, max_size: int, idle_timeout: float, ping_after: float):
+        self.url = url
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle: List[_PooledSession] = []
+        self._requests: "asyncio.Queue[Optional[asyncio.Future]]" = asyncio.Queue()
+        self._supervisor: Optional[asyncio.Task] = None
+        self._closed = False
+        self.opened = 0
+        self.reused = 0
+
+    # ---- borrowing ---------------------------------------------------
+
+    @asynccontextmanager
+    async def _borrow(self):
+        if self._closed:
+            raise RuntimeError("MCP session pool is closed")
+        if self._supervisor is None:
+            # Fresh context: owner tasks must not inherit the first borrower's trace span
+            self._supervisor = contextvars.Context().run(
+                self.loop.create_task, self._supervise(), name="mcp-pool-supervisor"
+            )
+        async with self._slots:
+            entry = await self._checkout()
+            try:
+                yield entry
+            except Exception as e:
+                if _session_lost(e):
+                    entry.closing.set()
+                raise
+            finally:
+                entry.last_used = time.monotonic()
+                if self._closed:
+                    entry.closing.set()
+                if not entry.closing.is_set():
+                    self._idle.append(entry)
+
+    @asynccontextmanager
+    async def session(self):
+        """Borrow an initialized session for the duration of the block."""
+        async with self._borrow() as entry:
+            yield entry.session
+
+    async def run(self, fn: Callable[[ClientSession], Awaitable[T]]) -> T:
+        """
+        Run fn(session) on a pooled session; reopen and retry once if the server dropped it,
+        and retry after Retry-After when it answered 429/503 (the request never ran).
+        """
+        rejected_retry = True
+        attempt = 0
+        while True:
+            try:
+                async with self._borrow() as entry:
+                    return await self._call(entry, fn)
+            except Exception as e:
+                if rejected_retry and _session_rejected(getattr(e, "cause", e)):
+                    rejected_retry = False
+                elif not await _backoff_if_rate_limited(e, attempt):
+                    raise
+                attempt += 1
+
+    @staticmethod
+    async def _call(entry: _PooledSession, fn: Callable[[ClientSession], Awaitable[T]]) -> T:
+        """
+        Await fn(session) but give up if the owner task dies first: the SDK does not
+        fail requests that are pending when its transport crashes (they would hang).
+        """
+        call = asyncio.ensure_future(fn(entry.session))
+        died = asyncio.ensure_future(entry.closing.wait())
+        try:
+            await asyncio.wait((call, died), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            died.cancel()
+            if not call.done():
+                call.cancel()
+        if call.done():
+            return call.result()
+        raise SessionLostError(entry.error)
+
+    async def _checkout(self) -> _PooledSession:
+        while self._idle:
+            entry = self._idle.pop()  # LIFO: warmest connection first
+            if entry.closing.is_set():
+                continue
+            if time.monotonic() - entry.last_used > self.ping_after:
+                try:
+                    with anyio.fail_after(5.0):
+                        await entry.session.send_ping()
+                except Exception:
+                    entry.closing.set()
+                    continue
+            self.reused += 1
+            return entry
+        fut: asyncio.Future = self.loop.create_future()
+        with _span("mcp.session.connect", pooled=True):
+            await self._requests.put(fut)
+            return await fut
+
+    # ---- ownership ---------------------------------------------------
+
+    async def _supervise(self) -> None:
+        async with anyio.create_task_group() as tg:
+            while True:
+                try:
+                    fut = await asyncio.wait_for(self._requests.get(), timeout=min(30.0, self.idle_timeout))
+                except asyncio.TimeoutError:
+                    self._evict_idle()
+                    continue
+                if fut is None:
+                    break  # aclose(); leaving the group waits for owners to exit
+                tg.start_soon(self._own, fut)
+
+    async def _own(self, fut: asyncio.Future) -> None:
+        entry = _PooledSession()
+        try:
+            _scrub_network_env()
+            async with streamablehttp_client(
+                self.url, headers=_accept_encoding(), timeout=120.0, auth=_BearerAuth(), httpx_client_factory=_http_client
+            ) as (read, write, _):
+                async with _Session(read, write, message_handler=_on_server_message) as s:
+                    await s.initialize()
+                    entry.session = s
+                    self.opened += 1
+                    if fut.done():
+                        # Borrower gave up (cancelled) while we connected; keep it warm
+                        self._idle.append(entry)
+                    else:
+                        fut.set_result(entry)
+                    await entry.closing.wait()
+        except Exception as e:
+            entry.error = e
+            if not fut.done():
+                fut.set_exception(e)
+        finally:
+            entry.closing.set()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        keep: List[_PooledSession] = []
+        for entry in self._idle:
+            if now - entry.last_used > self.idle_timeout:
+                entry.closing.set()
+            elif not entry.closing.is_set():
+                keep.append(entry)
+        self._idle = keep
+
+    async def aclose(self, timeout: float = 10.0) -> None:
+        """Close idle sessions now, borrowed ones when returned, then stop the supervisor."""
+        self._closed = True
+        for entry in self._idle:
+            entry.closing.set()
+        self._idle.clear()
+        if self._supervisor is None:
+            return
+        await self._requests.put(None)
+        try:
+            await asyncio.wait_for(self._supervisor, timeout)
+        except asyncio.TimeoutError:
+            pass  # wait_for cancelled the supervisor and its owners
+
+    def stats(self) -> Dict[str, int]:
+        return {"max_size": self.max_size, "idle": len(self._idle), "opened": self.opened, "reused": self.reused}
+
+
+_pool: Optional[McpSessionPool] = None
+
+
+def _get_pool() -> McpSessionPool:
+    """The pool for the running event loop (a new loop, e.g. another asyncio.run, gets a new pool)."""
+    global _pool
+    if _pool is None or _pool.loop is not asyncio.get_running_loop() or _pool._closed:
+        _pool = McpSessionPool(MCP_URL, POOL_SIZE, POOL_IDLE_SECONDS, POOL_PING_AFTER_SECONDS)
+    return _pool
+
+
+async def _with_session(fn: Callable[[ClientSession], Awaitable[T]]) -> T:
+    """Run fn(session) on a pooled session (or a short-lived one if pooling is off)."""
+    if POOL_SIZE <= 0:
+        attempt = 0
+        while True:
+            try:
+                async with _mcp_session() as s:
+                    return await fn(s)
+            except Exception as e:
+                if not await _backoff_if_rate_limited(e, attempt):
+                    raise
+                attempt += 1
+    return await _get_pool().run(fn)
+
+
+async def close_mcp_pool() -> None:
+    """Gracefully close pooled sessions (optional; call before loop shutdown)."""
+    global _pool
+    if _pool is not None and _pool.loop is asyncio.get_running_loop():
+        await _pool.aclose()
+    _pool = None
+
+
 # ---------------------------------------------------------------------------
 # Simple one-shot helpers
 # ---------------------------------------------------------------------------
 
+def _result_text(res: Any) -> str:
+    """Best-effort text output of a CallToolResult."""
+    parts: List[str] = []
+    for c in getattr(res, "content", []) or []:
+        if getattr(c, "type", "text") == "text":
+            parts.append(c.text)
+    return "\n".join(parts) if parts else str(res.model_dump())
+
 async def list_mcp_tools() -> List[Tuple[str, str]]:
     """Return a list of (name, description) for all server tools."""
-    async with _mcp_session() as s:
-        resp = await s.list_tools()
-        out: List[Tuple[str, str]] = []
-        for t in resp.tools:
-            out.append((getattr(t, "name", ""), getattr(t, "description", "") or ""))
-        return out
+    resp = await _with_session(lambda s: s.list_tools())
+    out: List[Tuple[str, str]] = []
+    for t in resp.tools:
+        out.append((getattr(t, "name", ""), getattr(t, "description", "") or ""))
+    return out
+
+async def _call_tool(name: str, args: Dict[str, Any]) -> types.CallToolResult:
+    with _span(f"mcp.call_tool {name}", **{"mcp.tool.name": name}) as span:
+        res = await _with_session(lambda s: s.call_tool(name, args))
+        if span is not None and getattr(res, "isError", False):
+            span.set_status(_otel_trace.Status(_otel_trace.StatusCode.ERROR, "tool returned isError"))
+        return res
 
 async def call_mcp_tool(name: str, args: Dict[str, Any]) -> str:
     """Call a specific MCP tool and return best-effort text output."""
-    async with _mcp_session() as s:
-        res = await s.call_tool(name, args)
-        parts: List[str] = []
-        for c in getattr(res, "content", []) or []:
-            if getattr(c, "type", "text") == "text":
-                parts.append(c.text)
-        return "\n".join(parts) if parts else str(res.model_dump())
+    res = await _call_tool(name, args)
+    return _result_text(res)
+
+
+_STREAM_DONE = object()
+_STREAM_META_KEY = "prynai/stream"  # same flag as prynai_mcp.streaming.STREAM_META_KEY
+
+async def stream_mcp_tool(
+    name: str,
+    args: Dict[str, Any],
+    max_buffered: int = 64,
+) -> AsyncIterator[str]:
+    """
+    Call a @streaming tool and yield its chunks as they arrive. A tool that does not
+    stream yields its whole text result once. Raises McpError if the tool fails.
+    Leaving the loop early cancels the call on the server.
+    """
+    chunks: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max(1, max_buffered))
+    streamed = False
+    closed = False  # the consumer left; nothing may wait on the queue any more
+
+    async def on_progress(progress: float, total: Optional[float], message: Optional[str]) -> None:
+        nonlocal streamed
+        if message and not closed:
+            streamed = True
+            await chunks.put(message)
+
+    async def call(s: ClientSession) -> types.CallToolResult:
+        request_id = s._request_id  # the id call_tool is about to use (sessions are not shared)
+        try:
+            # call_tool cannot add _meta; the SDK merges the progressToken into it
+            params = types.CallToolRequestParams.model_validate(
+                {"name": name, "arguments": args, "_meta": {_STREAM_META_KEY: True}}
+            )
+            return await s.send_request(
+                types.ClientRequest(types.CallToolRequest(params=params)),
+                types.CallToolResult,
+                progress_callback=on_progress,
+            )
+        except asyncio.CancelledError:
+            # The SDK does not tell the server; without this the generator runs to the end
+            cancel = types.CancelledNotification(
+                params=types.CancelledNotificationParams(requestId=request_id, reason="client stopped reading")
+            )
+            try:
+                await asyncio.shield(s.send_notification(types.ClientNotification(cancel)))
+            except Exception:
+                pass
+            raise
+
+    async def run() -> types.CallToolResult:
+        try:
+            with _span(f"mcp.call_tool {name}", **{"mcp.tool.name": name, "mcp.tool.streaming": True}):
+                return await _with_session(call)
+        finally:
+            if not closed:
+                await chunks.put(_STREAM_DONE)
+
+    task = asyncio.ensure_future(run())
+    try:
+        while True:
+            item = await chunks.get()
+            if item is _STREAM_DONE:
+                break
+            yield item
+        res = task.result()
+        text = _result_text(res)
+        if getattr(res, "isError", False):
+            raise McpError(types.ErrorData(code=types.INTERNAL_ERROR, message=text))
+        if not streamed and text:
+            yield text
+    finally:
+        closed = True
+        # Free the queue first: a full one would keep run() (or on_progress) waiting forever
+        while not chunks.empty():
+            chunks.get_nowait()
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def get_mcp_artifact_info(name: str) -> Dict[str, Any]:
+    """Size, mime_type, chunk_bytes and etag of artifact://{name}."""
+    res = await _with_session(lambda s: s.read_resource(AnyUrl(f"artifact://{name}")))
+    return json.loads(res.contents[0].text)
+
+async def iter_mcp_artifact(
+    name: str,
+    etag: Optional[str] = None,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield an artifact's bytes one range read at a time, all from the version with this
+    etag (default: the current one). Raises McpError if the artifact changes meanwhile.
+    """
+    info = await get_mcp_artifact_info(name)
+    etag = etag or info["etag"]
+    end = info["size"] if length is None else min(info["size"], offset + length)
+    step = max(1, int(info["chunk_bytes"]))
+    for pos in range(offset, end, step):
+        uri = AnyUrl(f"artifact://{name}/{etag}/{pos}/{min(step, end - pos)}")
+        res = await _with_session(lambda s: s.read_resource(uri))
+        yield base64.b64decode(res.contents[0].blob)
+
+
+# ---------------------------------------------------------------------------
+# Batched / parallel tool calls
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ToolCallResult:
+    """Outcome of one call in a batch. ok=False carries the tool or transport error."""
+    index: int                  # position in the input list
+    name: str
+    args: Dict[str, Any]
+    ok: bool
+    text: Optional[str] = None  # best-effort text output (also set for tool-reported errors)
+    error: Optional[str] = None
+    elapsed: float = 0.0        # seconds
+
+async def _batch_call(
+    index: int,
+    name: str,
+    args: Dict[str, Any],
+    gate: asyncio.Semaphore,
+    timeout: Optional[float],
+) -> ToolCallResult:
+    async with gate:
+        t0 = time.perf_counter()
+        try:
+            res = await asyncio.wait_for(_call_tool(name, args), timeout)
+        except asyncio.TimeoutError:
+            return ToolCallResult(index, name, args, False, error=f"timeout after {timeout}s",
+                                  elapsed=time.perf_counter() - t0)
+        except Exception as e:
+            return ToolCallResult(index, name, args, False, error=f"{type(e).__name__}: {e}",
+                                  elapsed=time.perf_counter() - t0)
+        text = _result_text(res)
+        failed = bool(getattr(res, "isError", False))
+        return ToolCallResult(index, name, args, not failed, text=text, error=text if failed else None,
+                              elapsed=time.perf_counter() - t0)
+
+def _batch_tasks(
+    calls: Sequence[Tuple[str, Dict[str, Any]]],
+    concurrency: int,
+    timeout: Optional[float],
+) -> List["asyncio.Task[ToolCallResult]"]:
+    gate = asyncio.Semaphore(max(1, concurrency))
+    return [
+        asyncio.ensure_future(_batch_call(i, name, dict(args or {}), gate, timeout))
+        for i, (name, args) in enumerate(calls)
+    ]
+
+async def call_mcp_tools_batch(
+    calls: Sequence[Tuple[str, Dict[str, Any]]],
+    concurrency: int = 4,
+    timeout: Optional[float] = None,
+) -> List[ToolCallResult]:
+    """
+    Run independent tool calls concurrently (at most `concurrency` in flight,
+    also bounded by the session pool size). Results come back in input order;
+    a failing or timed-out call never fails the batch. `timeout` is per call.
+    """
+    tasks = _batch_tasks(calls, concurrency, timeout)
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for t in tasks:
+            t.cancel()
+
+async def iter_mcp_tools_batch(
+    calls: Sequence[Tuple[str, Dict[str, Any]]],
+    concurrency: int = 4,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[ToolCallResult]:
+    """Like call_mcp_tools_batch(), but yield each result as soon as it completes."""
+    tasks = _batch_tasks(calls, concurrency, timeout)
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
 
 
 # ---------------------------------------------------------------------------
@@ -160,24 +938,96 @@ def _args_model_from_schema(tool_name: str, schema: Optional[Dict[str, Any]]) ->
     return create_model(f"{tool_name}_Args", __base__=_PermissiveModel, **fields)
 
 
+# ---------------------------------------------------------------------------
+# Tool catalog cache (list_tools + generated models/tools, reused across agents)
+# ---------------------------------------------------------------------------
+
+def _schema_hash(schema: Any) -> str:
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class _ToolCatalog:
+    __slots__ = ("tools", "schema_hash", "fetched_at")
+
+    def __init__(self, tools: List[Any]) -> None:
+        self.tools = tools
+        self.schema_hash = _schema_hash([t.model_dump(mode="json") for t in tools])
+        self.fetched_at = time.monotonic()
+
+_catalogs: Dict[str, _ToolCatalog] = {}                      # server URL → last list_tools
+_catalog_inflight: Dict[str, asyncio.Future] = {}
+_args_models: Dict[Tuple[str, str], type[BaseModel]] = {}    # (tool name, schema hash) → model
+_lc_tools: Dict[Tuple[str, str, str, str], BaseTool] = {}    # (url, name, description, schema hash) → tool
+
+def invalidate_tool_catalog(url: Optional[str] = None) -> None:
+    """Forget the cached tool list (all servers, or one URL). Memoized models/tools stay
+    valid: they are keyed by schema hash, so changed tools simply get new entries."""
+    if url is None:
+        _catalogs.clear()
+    else:
+        _catalogs.pop(url, None)
+
+async def _on_server_message(message: Any) -> None:
+    """ClientSession message_handler: drop the catalog on notifications/tools/list_changed."""
+    if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+        invalidate_tool_catalog(MCP_URL)
+
+async def _get_tool_catalog() -> _ToolCatalog:
+    """Cached list_tools for MCP_URL (TTL + list_changed); concurrent misses share one fetch."""
+    cat = _catalogs.get(MCP_URL)
+    if cat is not None and time.monotonic() - cat.fetched_at < TOOL_CACHE_TTL_SECONDS:
+        return cat
+    fut = _catalog_inflight.get(MCP_URL)
+    if fut is None or fut.get_loop() is not asyncio.get_running_loop():
+        async def _fetch() -> _ToolCatalog:
+            try:
+                tlist = await _with_session(lambda s: s.list_tools())
+                fresh = _ToolCatalog(list(tlist.tools))
+                if TOOL_CACHE_TTL_SECONDS > 0:
+                    _catalogs[MCP_URL] = fresh
+                return fresh
+            finally:
+                _catalog_inflight.pop(MCP_URL, None)
+        fut = _catalog_inflight[MCP_URL] = asyncio.ensure_future(_fetch())
+    return await asyncio.shield(fut)
+
+def _cached_args_model(tool_name: str, schema: Optional[Dict[str, Any]], schema_hash: str) -> type[BaseModel]:
+    key = (tool_name, schema_hash)
+    model = _args_models.get(key)
+    if model is None:
+        model = _args_models[key] = _args_model_from_schema(tool_name, schema)
+    return model
+
+
 # ---------------------------------------------------------------------------
 # LangChain tool factory
 # ---------------------------------------------------------------------------
 
+def _make_langchain_tool(name: str, desc: str, args_model: type[BaseModel]) -> BaseTool:
+    """Wrap one MCP tool as a LangChain tool (name bound per tool, no late binding)."""
+
+    async def _wrapped(**kwargs) -> str:
+        """(Docstring set dynamically per tool below)"""
+        res = await _call_tool(name, kwargs)
+        return _result_text(res)
+    _wrapped.__name__ = f"mcp_{name}"
+    _wrapped.__doc__ = desc  # <-- IMPORTANT for LangChain
+
+    # Also pass description into the decorator (works across LC versions)
+    wrapped_tool = tool(args_schema=args_model, description=desc)(_wrapped)
+    wrapped_tool.name = name
+    wrapped_tool.description = desc
+    return wrapped_tool
+
 async def build_langchain_tools(tool_names: Optional[List[str]] = None) -> List[BaseTool]:
     """
     Convert MCP tools into LangChain tools.
     - tool_names=None → all tools
     - Each generated tool has a docstring and passes description=... to @tool.
+    - The tool list, args models and tool objects are cached; after the first call this
+      does no network round trip until the TTL expires or the server sends list_changed.
     """
-    # Discover tools and schemas
-    async with _mcp_session() as s:
-        tlist = await s.list_tools()
-        schema_by_name: Dict[str, Dict[str, Any]] = {}
-        for t in tlist.tools:
-            schema = getattr(t, "input_schema", None) or getattr(t, "inputSchema", None)
-            schema_by_name[getattr(t, "name", "")] = schema
-        selected = [t for t in tlist.tools if not tool_names or getattr(t, "name", "") in tool_names]
+    catalog = await _get_tool_catalog()
+    selected = [t for t in catalog.tools if not tool_names or getattr(t, "name", "") in tool_names]
 
     tools: List[BaseTool] = []
     for t in selected:
@@ -185,29 +1035,13 @@ async def build_langchain_tools(tool_names: Optional[List[str]] = None) -> List[
         if not name:
             continue
         desc = (getattr(t, "description", "") or "").strip() or f"MCP tool '{name}'."
-        args_model = _args_model_from_schema(name, schema_by_name.get(name))
-
-        # Bind 'name' into the function to avoid late-binding issues
-        async def _impl(bound_name: str, **kwargs) -> str:
-            """(Docstring set dynamically per tool below)"""
-            async with _mcp_session() as s2:
-                res = await s2.call_tool(bound_name, kwargs)
-                parts: List[str] = []
-                for c in getattr(res, "content", []) or []:
-                    if getattr(c, "type", "text") == "text":
-                        parts.append(c.text)
-                return "\n".join(parts) if parts else str(res.model_dump())
-
-        # Create a per-tool callable with a proper docstring (LangChain requires one)
-        async def _wrapped(**kwargs) -> str:
-            return await _impl(name, **kwargs)
-        _wrapped.__name__ = f"mcp_{name}"
-        _wrapped.__doc__ = desc  # <-- IMPORTANT for LangChain
-
-        # Also pass description into the decorator (works across LC versions)
-        wrapped_tool = tool(args_schema=args_model, description=desc)(_wrapped)
-        wrapped_tool.name = name
-        wrapped_tool.description = desc
+        schema = getattr(t, "input_schema", None) or getattr(t, "inputSchema", None)
+        shash = _schema_hash(schema)
+        key = (MCP_URL, name, desc, shash)
+        wrapped_tool = _lc_tools.get(key)
+        if wrapped_tool is None:
+            args_model = _cached_args_model(name, schema, shash)
+            wrapped_tool = _lc_tools[key] = _make_langchain_tool(name, desc, args_model)
         tools.append(wrapped_tool)
 
     return tools
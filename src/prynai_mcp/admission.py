@@ -0,0 +1,270 @@
+"""
+Admission control / load shedding for /mcp (per replica, ADMISSION_ENABLED).
+
+- At most ADMISSION_MAX_IN_FLIGHT concurrent /mcp requests (POST/DELETE; a tools/call
+  POST stays in flight until its result is sent). Long tools (ADMISSION_LONG_TOOLS) may
+  hold at most ADMISSION_LONG_MAX_IN_FLIGHT of those slots, so short calls always
+  have headroom.
+- When full, requests wait in a bounded priority queue (ADMISSION_QUEUE_SIZE) for up to
+  ADMISSION_QUEUE_TIMEOUT_MS: control-plane messages (lists, resources, short tools)
+  are admitted before long tools, FIFO within a class.
+- initialize, ping, notifications and responses (http_utils.is_session_control) are
+  admitted at once and never shed: they are cheap, and a 503 on one of them kills the
+  client's session, so its retry would cost a new handshake on top.
+- Standalone GET /mcp SSE streams are capped separately (ADMISSION_MAX_STREAMS), no queue.
+- Over capacity -> immediate 503 + Retry-After, well before the client's own timeout.
+- This runs before authentication, so the POST body it reads is capped: over
+  MCP_MAX_BODY_BYTES (by Content-Length, or once that many bytes arrived) -> 413 at once.
+- /healthz, /livez and /metrics never pass through here.
+- drain() (SIGTERM, see launcher.py): open GET streams are ended so the worker can exit
+  (clients reopen them elsewhere) and new ones get 503; POSTs still run to completion.
+- Metrics (metrics.py): prynai_admission_in_flight{class}, _queue_depth, _streams,
+  _wait_seconds, _rejected_total{class,reason}; /healthz shows the same counts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .http_utils import (
+    BodyTooLarge,
+    buffer_body,
+    is_session_control,
+    payload_too_large,
+    peek_request_id,
+    peek_tool_name,
+    reject,
+)
+from .metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_STREAMS,
+    ADMISSION_WAIT,
+)
+
+# Priority classes (lower is admitted first)
+NORMAL = 0
+LONG = 1
+_CLASS_NAMES = {NORMAL: "normal", LONG: "long"}
+
+class AdmissionController:
+    """Slot accounting plus a priority wait queue (single event loop, no locks needed)."""
+
+    def __init__(self, max_in_flight: int, max_long: int, queue_size: int, queue_timeout: float, max_streams: int):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_long = max(1, min(max_long, self.max_in_flight))
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.max_streams = max(0, max_streams)
+        self.in_flight = {NORMAL: 0, LONG: 0}
+        self.streams = 0
+        self.draining = False
+        self._drained = asyncio.Event()
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._waiting = 0
+        self._seq = itertools.count()
+
+    # ---- requests ------------------------------------------------------
+
+    def _has_room(self, cls: int) -> bool:
+        if sum(self.in_flight.values()) >= self.max_in_flight:
+            return False
+        return cls != LONG or self.in_flight[LONG] < self.max_long
+
+    def _enter(self, cls: int) -> None:
+        self.in_flight[cls] += 1
+        ADMISSION_IN_FLIGHT.labels(_CLASS_NAMES[cls]).inc()
+
+    async def acquire(self, cls: int) -> Optional[str]:
+        """Admit (returns None) or return the rejection reason."""
+        if not self._waiting and self._has_room(cls):
+            self._enter(cls)
+            return None
+        if self._waiting >= self.queue_size:
+            return "queue_full"
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (cls, next(self._seq), fut))
+        self._waiting += 1
+        ADMISSION_QUEUE_DEPTH.inc()
+        self._wake()
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait((fut,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot we may just have been handed
+            if fut.done() and not fut.cancelled():
+                self.release(cls)
+            else:
+                fut.cancel()
+                self._dequeued()
+            raise
+        ADMISSION_WAIT.observe(time.perf_counter() - t0)
+        if fut.done():
+            return None  # _wake() admitted us (and already dequeued)
+        fut.cancel()  # lazily removed from the heap by _wake()
+        self._dequeued()
+        return "timeout"
+
+    def _dequeued(self) -> None:
+        self._waiting -= 1
+        ADMISSION_QUEUE_DEPTH.dec()
+
+    def release(self, cls: int) -> None:
+        self.in_flight[cls] -= 1
+        ADMISSION_IN_FLIGHT.labels(_CLASS_NAMES[cls]).dec()
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._queue:
+            cls, _, fut = self._queue[0]
+            if fut.done():  # timed out / cancelled waiter
+                heapq.heappop(self._queue)
+                continue
+            if not self._has_room(cls):
+                break  # normal work sorts first, so a blocked head means nothing else fits
+            heapq.heappop(self._queue)
+            self._enter(cls)
+            self._dequeued()
+            fut.set_result(None)
+
+    # ---- standalone SSE streams -------------------------------------------
+
+    def open_stream(self) -> bool:
+        if self.draining or self.streams >= self.max_streams:
+            return False
+        self.streams += 1
+        ADMISSION_STREAMS.inc()
+        return True
+
+    def close_stream(self) -> None:
+        self.streams -= 1
+        ADMISSION_STREAMS.dec()
+
+    def drain(self) -> None:
+        """Stop taking standalone streams and end the open ones (call on the event loop)."""
+        self.draining = True
+        self._drained.set()
+
+    def stream_receive(self, receive: Receive) -> Receive:
+        """receive() for a GET stream that reports a disconnect once draining starts."""
+
+        async def receive_or_drain() -> Message:
+            if self._drained.is_set():
+                return {"type": "http.disconnect"}
+            recv = asyncio.ensure_future(receive())
+            drained = asyncio.ensure_future(self._drained.wait())
+            try:
+                await asyncio.wait((recv, drained), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                drained.cancel()
+                if not recv.done():
+                    recv.cancel()
+            if recv.done() and not recv.cancelled():
+                return recv.result()
+            return {"type": "http.disconnect"}
+
+        return receive_or_drain
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "draining": int(self.draining),
+            "in_flight": sum(self.in_flight.values()),
+            "in_flight_long": self.in_flight[LONG],
+            "queued": self._waiting,
+            "streams": self.streams,
+        }
+
+
+def _long_tools(spec: Optional[str]) -> frozenset:
+    return frozenset(t.strip() for t in (spec or "").split(",") if t.strip())
+
+
+# One per process (healthz reads its stats)
+admission = AdmissionController(
+    settings.ADMISSION_MAX_IN_FLIGHT,
+    settings.ADMISSION_LONG_MAX_IN_FLIGHT,
+    settings.ADMISSION_QUEUE_SIZE,
+    settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000.0,
+    settings.ADMISSION_MAX_STREAMS,
+)
+
+
+class AdmissionMiddleware:
+    """Pure ASGI. Place it outside auth so overload is shed before any token crypto."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.long_tools = _long_tools(settings.ADMISSION_LONG_TOOLS)
+        self.controller = admission
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (scope.get("path") or "").startswith("/mcp"):
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method")
+        if method == "GET":
+            # Drain applies even with ADMISSION_ENABLED=false, so SIGTERM never waits on idle streams
+            counted = settings.ADMISSION_ENABLED or self.controller.draining
+            if counted and not self.controller.open_stream():
+                reason = "draining" if self.controller.draining else "streams_full"
+                ADMISSION_REJECTED.labels("stream", reason).inc()
+                message = "Server draining, reconnect" if self.controller.draining else "Server busy: too many open streams"
+                await reject(send, 503, 1.0, -32030, message)
+                return
+            started = finished = False
+
+            async def send_tracking(message: Message) -> None:
+                nonlocal started, finished
+                if message["type"] == "http.response.start":
+                    started = True
+                elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                    finished = True
+                await send(message)
+
+            try:
+                await self.app(scope, self.controller.stream_receive(receive), send_tracking)
+                if started and not finished and self.controller.draining:
+                    # The SSE response stops on the synthetic disconnect; end the body cleanly
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+            finally:
+                if counted:
+                    self.controller.close_stream()
+            return
+
+        if not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        cls = NORMAL
+        body = b""
+        if method == "POST":
+            try:
+                body, receive = await buffer_body(scope, receive)
+            except BodyTooLarge as e:
+                await payload_too_large(send, e)
+                return
+            if is_session_control(body):
+                await self.app(scope, receive, send)
+                return
+            if self.long_tools and peek_tool_name(body) in self.long_tools:
+                cls = LONG
+
+        reason = await self.controller.acquire(cls)
+        if reason is not None:
+            ADMISSION_REJECTED.labels(_CLASS_NAMES[cls], reason).inc()
+            await reject(send, 503, 1.0, -32030, "Server busy, retry later", peek_request_id(body))
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(cls)
@@ -1,20 +1,76 @@
+from contextlib import asynccontextmanager
 from starlette.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
-from .redis_client import ensure_redis, close_redis
+from .redis_client import ensure_redis, close_redis, pool_stats
+from .pubsub import start_invalidation_listener, stop_invalidation_listener
 from .config import settings
-from .server import mcp
+from .server import mcp, counter
+from .auth.jwks import ensure_jwks, close_jwks
+from .auth.policy import get_policy, install_reload_signal, start_policy_watch, stop_policy_watch
 from .auth.middleware import BearerAuthMiddleware
+from .metrics import MetricsMiddleware, instrument_mcp, instrument_redis, metrics_endpoint, register_stats_collector
+from . import tracing
+from .ratelimit import RateLimitMiddleware
+from .admission import AdmissionMiddleware, admission
+from .offload import close_offload
+from .sessions import instrument_session_manager
+from .http_utils import install_fast_sse_encode
+from .compression import CompressionMiddleware
 
 app = mcp.streamable_http_app()
+# Sessions recorded in Redis; any worker/replica can adopt one it did not create
+instrument_session_manager(mcp.session_manager)
+
+# Large responses (artifact:// ranges, streamed chunks) skip sse_starlette's line splitting
+install_fast_sse_encode()
+
+# Per tool/resource/prompt counts + latency, cache/pool/session gauges at scrape time
+instrument_mcp(mcp)
+register_stats_collector(mcp)
+
+# Optional OpenTelemetry spans (OTEL_ENABLED); no-ops otherwise
+tracing.setup_tracing()
+tracing.instrument_mcp(mcp)
 
-@app.on_event("startup")
 async def _startup():
-    await ensure_redis()
+    r = await ensure_redis()
+    instrument_redis(r)
+    tracing.instrument_redis(r)
+    await start_invalidation_listener()
+    await counter.start()
+    policy = get_policy()
+    if policy.auth_required and policy.jwks_url:
+        # Prefetch signing keys so the first /mcp request never waits on Entra
+        await ensure_jwks()
+    # AUTH_POLICY_FILE changes (or `kill -HUP` of a single-process server) swap the
+    # auth policy atomically
+    await start_policy_watch()
+    install_reload_signal()
 
-@app.on_event("shutdown")
 async def _shutdown():
+    # Flush buffered counter increments while Redis is still open
+    await counter.stop()
+    close_offload()
+    await stop_invalidation_listener()
+    await stop_policy_watch()
+    await close_jwks()
     await close_redis()
 
+# FastMCP's app already has a lifespan (session manager), which makes Starlette
+# ignore on_event handlers. Wrap it so our startup/shutdown actually run.
+_mcp_lifespan = app.router.lifespan_context
+
+@asynccontextmanager
+async def _lifespan(a):
+    await _startup()
+    try:
+        async with _mcp_lifespan(a) as state:
+            yield state
+    finally:
+        await _shutdown()
+
+app.router.lifespan_context = _lifespan
+
 @app.route("/healthz")
 async def healthz(request):
     ok = True
@@ -23,14 +79,25 @@ async def healthz(request):
         await r.ping()
     except Exception:
         ok = False
-    return JSONResponse({"status": "ok", "redis": ok})
+    return JSONResponse({"status": "ok", "redis": ok, "redis_pool": pool_stats(), "admission": admission.stats()})
 
 @app.route("/livez")
 async def livez(request):
     return JSONResponse({"status": "ok"})
 
-# --- Order matters: auth first, then CORS ---
+# Prometheus scrape endpoint (open, like the health routes)
+app.add_route("/metrics", metrics_endpoint)
+
+# --- Order matters (last added = outermost): compression is innermost so it sees the
+# app's own response bodies, rate limits see validated claims,
+# auth runs before them, admission sheds overload before auth does any work,
+# tracing + metrics include auth time (and count 503s), CORS wraps everything ---
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(BearerAuthMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,379 @@
+"""
+Large-payload resources (logs, datasets, embeddings) read in ranges, never whole.
+
+- artifact://{name} is a small JSON description: size, mime_type, chunk_bytes and an
+  etag (content hash). Clients that already hold that etag can skip the download.
+- artifact://{name}/{etag}/{offset}/{length} returns those bytes (a blob). Reads are
+  pinned to a version: a stale etag fails instead of mixing two versions ("latest"
+  skips the check). At most ARTIFACT_MAX_RANGE_BYTES per read.
+- The read_artifact tool (@streaming) sends a whole range as chunks in one call.
+- Backends, looked up in this order:
+  - Files directly under ARTIFACTS_DIR. Each read maps only the requested window
+    (mmap), so memory per request stays at the range size whatever the file size.
+    The etag is a SHA-256 of the content, computed once per file version (inode,
+    size, mtime) in a thread. Replace files atomically (write, then rename): a file
+    truncated in place while mapped can crash the reader (SIGBUS).
+  - Redis: publish(name, chunks) stores fixed-size chunks in a Redis Stream
+    (prynai:artifact:{<name>}) whose entry ids are the chunk numbers, so a byte range
+    maps straight to one XRANGE. Publishing writes a new stream under its own staging
+    key (prynai:artifact:{<name>}:next:<version>, same hash slot) and swaps it in
+    atomically, so concurrent publishes never mix chunks; the last swap wins. The
+    etag is computed while writing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from mcp.server.fastmcp.exceptions import ResourceError
+from redis.client import NEVER_DECODE
+
+from .config import settings
+from .redis_client import ensure_redis, pipeline
+
+_REDIS_PREFIX = "prynai:artifact:"
+_NAME_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9._-]{0,254}$")
+_HASH_WINDOW = 16 * 1024 * 1024  # bytes mapped at a time while hashing
+_ETAG_LEN = 32                   # hex chars of the SHA-256 kept as etag
+_STAGING_TTL_SECONDS = 3600      # a publisher that dies mid-write leaves nothing behind for long
+LATEST = "latest"
+
+# Per-process totals (/metrics)
+_stats: Dict[str, int] = {"reads": 0, "bytes": 0, "hashes": 0, "hashed_bytes": 0, "published": 0}
+
+
+def artifact_stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+def stream_key(name: str) -> str:
+    return f"{_REDIS_PREFIX}{{{name}}}"
+
+
+def _meta_key(name: str) -> str:
+    return f"{_REDIS_PREFIX}{{{name}}}:meta"
+
+
+def _next_key(name: str, version: str) -> str:
+    return f"{_REDIS_PREFIX}{{{name}}}:next:{version}"
+
+
+@dataclass
+class ArtifactInfo:
+    name: str
+    size: int
+    etag: str
+    mime_type: str
+    chunk_bytes: int   # preferred read size (the Redis chunk size)
+    modified: float    # epoch seconds
+    backend: str       # "file" | "redis"
+    version: str = field(default="", repr=False)  # backend's own version id (inode/size/mtime, publish id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        del d["version"]
+        d["range_uri"] = f"artifact://{self.name}/{self.etag}/{{offset}}/{{length}}"
+        return d
+
+
+def _check_name(name: str) -> None:
+    if not _NAME_RE.match(name):
+        raise ResourceError(f"Invalid artifact name: {name!r}")
+
+
+def _check_range(info: ArtifactInfo, offset: int, length: int) -> Tuple[int, int]:
+    """Clamp a range to the artifact; length < 0 means "to the end"."""
+    if offset < 0 or offset > info.size:
+        raise ResourceError(f"Offset {offset} outside artifact {info.name} ({info.size} bytes)")
+    end = info.size if length < 0 else min(info.size, offset + length)
+    return offset, end
+
+
+# ---- files (mmap) ------------------------------------------------------
+
+
+def _hash_file(path: str, version: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if _file_version(st) != version:
+            raise ResourceError(f"Artifact {os.path.basename(path)} changed while being hashed")
+        size = st.st_size
+        for pos in range(0, size, _HASH_WINDOW):
+            n = min(_HASH_WINDOW, size - pos)
+            with mmap.mmap(f.fileno(), n, offset=pos, access=mmap.ACCESS_READ) as window:
+                h.update(window)
+    _stats["hashes"] += 1
+    _stats["hashed_bytes"] += size
+    return h.hexdigest()[:_ETAG_LEN]
+
+
+def _file_version(st: os.stat_result) -> str:
+    return f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _read_window(fd: int, start: int, end: int) -> bytes:
+    if end <= start:
+        return b""
+    # mmap offsets must be multiples of the allocation granularity
+    base = start - start % mmap.ALLOCATIONGRANULARITY
+    with mmap.mmap(fd, end - base, offset=base, access=mmap.ACCESS_READ) as window:
+        return window[start - base:end - base]
+
+
+class FileArtifacts:
+    """Files directly under one directory; etags cached per file version."""
+
+    def __init__(self, root: str, max_cached: int = 1024):
+        self.root = os.path.realpath(root)
+        self.max_cached = max_cached
+        self._etags: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()  # path -> (version, etag)
+        self._hashing: Dict[Tuple[str, str], "asyncio.Future[str]"] = {}
+
+    def path(self, name: str) -> Optional[str]:
+        path = os.path.join(self.root, name)
+        if os.path.dirname(os.path.realpath(path)) != self.root or not os.path.isfile(path):
+            return None  # missing, or a symlink pointing out of the directory
+        return path
+
+    async def info(self, name: str) -> Optional[ArtifactInfo]:
+        path = self.path(name)
+        if path is None:
+            return None
+        st = os.stat(path)
+        version = _file_version(st)
+        mime_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        return ArtifactInfo(
+            name, st.st_size, await self._etag(path, version), mime_type,
+            settings.ARTIFACT_CHUNK_BYTES, st.st_mtime, "file", version,
+        )
+
+    async def _etag(self, path: str, version: str) -> str:
+        cached = self._etags.get(path)
+        if cached is not None and cached[0] == version:
+            self._etags.move_to_end(path)
+            return cached[1]
+        # Concurrent first reads of a version share one hash
+        key = (path, version)
+        fut = self._hashing.get(key)
+        if fut is None:
+            fut = self._hashing[key] = asyncio.ensure_future(asyncio.to_thread(_hash_file, path, version))
+            fut.add_done_callback(lambda _: self._hashing.pop(key, None))
+        etag = await asyncio.shield(fut)
+        self._etags[path] = (version, etag)
+        self._etags.move_to_end(path)
+        while len(self._etags) > self.max_cached:
+            self._etags.popitem(last=False)
+        return etag
+
+    @asynccontextmanager
+    async def open(self, info: ArtifactInfo) -> AsyncIterator[Callable[[int, int], Awaitable[bytes]]]:
+        """A reader bound to the described version (a file renamed over it later is not seen)."""
+        path = self.path(info.name)
+        fd = os.open(path, os.O_RDONLY) if path else -1
+        pending: Optional["asyncio.Future[bytes]"] = None
+        try:
+            if fd < 0 or _file_version(os.fstat(fd)) != info.version:
+                raise ResourceError(f"Artifact {info.name} changed during the read")
+
+            async def read(start: int, end: int) -> bytes:
+                nonlocal pending
+                pending = asyncio.ensure_future(asyncio.to_thread(_read_window, fd, start, end))
+                return await pending
+
+            yield read
+        finally:
+            if pending is not None and not pending.done():
+                # A cancelled reader's thread may still be mapping fd; close it only after
+                await asyncio.gather(pending, return_exceptions=True)
+            if fd >= 0:
+                os.close(fd)
+
+
+# ---- Redis streams -----------------------------------------------------
+
+
+async def _rechunk(data: Union[bytes, Iterable[bytes], AsyncIterable[bytes]], size: int) -> AsyncIterator[bytes]:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = [bytes(data)]
+    buf = bytearray()
+    if isinstance(data, AsyncIterable):
+        async for piece in data:
+            buf += piece
+            while len(buf) >= size:
+                yield bytes(buf[:size])
+                del buf[:size]
+    else:
+        for piece in data:
+            buf += piece
+            while len(buf) >= size:
+                yield bytes(buf[:size])
+                del buf[:size]
+    if buf:
+        yield bytes(buf)
+
+
+class RedisArtifacts:
+    """Artifacts stored as fixed-size chunks in a Redis Stream (entry id = chunk number)."""
+
+    async def info(self, name: str) -> Optional[ArtifactInfo]:
+        r = await ensure_redis()
+        meta = await r.hgetall(_meta_key(name))
+        if not meta:
+            return None
+        return ArtifactInfo(
+            name, int(meta["size"]), meta["etag"], meta["mime_type"],
+            int(meta["chunk_bytes"]), float(meta["modified"]), "redis", meta["version"],
+        )
+
+    @asynccontextmanager
+    async def open(self, info: ArtifactInfo) -> AsyncIterator[Callable[[int, int], Awaitable[bytes]]]:
+        r = await ensure_redis()
+        key, version = stream_key(info.name), info.version.encode()
+        size = info.chunk_bytes
+
+        async def read(start: int, end: int) -> bytes:
+            if end <= start:
+                return b""
+            first, last = start // size, (end - 1) // size
+            # Chunk payloads are raw bytes; skip the client's UTF-8 decoding
+            entries = await r.execute_command(
+                "XRANGE", key, f"{first + 1}-0", f"{last + 1}-0", **{NEVER_DECODE: True}
+            )
+            # Every chunk carries its publish id, so a concurrent publish cannot mix versions
+            if len(entries) != last - first + 1 or any(fields[b"v"] != version for _, fields in entries):
+                raise ResourceError(f"Artifact {info.name} changed or expired during the read")
+            data = b"".join(fields[b"d"] for _, fields in entries)
+            return data[start - first * size:end - first * size]
+
+        yield read
+
+    async def publish(
+        self,
+        name: str,
+        data: Union[bytes, Iterable[bytes], AsyncIterable[bytes]],
+        mime_type: str = "application/octet-stream",
+        ttl_seconds: Optional[int] = None,
+    ) -> ArtifactInfo:
+        _check_name(name)
+        size = settings.ARTIFACT_CHUNK_BYTES
+        version = uuid.uuid4().hex
+        nxt = _next_key(name, version)
+        h = hashlib.sha256()
+        total = chunks = 0
+        r = await ensure_redis()
+        batch = []
+        try:
+            async for chunk in _rechunk(data, size):
+                h.update(chunk)
+                total += len(chunk)
+                chunks += 1
+                batch.append((chunks, chunk))
+                if len(batch) >= 16:
+                    await self._append(nxt, version, batch)
+                    batch = []
+            if batch:
+                await self._append(nxt, version, batch)
+        except Exception:
+            await r.delete(nxt)
+            raise
+        info = ArtifactInfo(name, total, h.hexdigest()[:_ETAG_LEN], mime_type, size, time.time(), "redis", version)
+        meta = {k: str(v) for k, v in asdict(info).items() if k not in ("name", "backend")}
+        # Swap the new chunks in with the metadata in one step (same hash slot)
+        async with pipeline(transaction=True) as pipe:
+            if chunks:
+                pipe.rename(nxt, stream_key(name))
+            else:
+                pipe.delete(stream_key(name))
+            pipe.delete(_meta_key(name))
+            pipe.hset(_meta_key(name), mapping=meta)
+            if ttl_seconds:
+                pipe.expire(stream_key(name), ttl_seconds)
+                pipe.expire(_meta_key(name), ttl_seconds)
+            elif chunks:
+                pipe.persist(stream_key(name))  # RENAME kept the staging TTL
+            await pipe.execute()
+        _stats["published"] += 1
+        return info
+
+    @staticmethod
+    async def _append(key: str, version: str, batch: Iterable[Tuple[int, bytes]]) -> None:
+        async with pipeline() as pipe:
+            for n, chunk in batch:
+                pipe.xadd(key, {"v": version, "d": chunk}, id=f"{n}-0")
+            pipe.expire(key, _STAGING_TTL_SECONDS)
+            await pipe.execute()
+
+    async def delete(self, name: str) -> None:
+        r = await ensure_redis()
+        await r.delete(stream_key(name), _meta_key(name))
+
+
+# ---- lookup ------------------------------------------------------------
+
+
+class ArtifactStore:
+    def __init__(self, root: Optional[str]):
+        self.files = FileArtifacts(root) if root else None
+        self.redis = RedisArtifacts()
+
+    async def info(self, name: str) -> ArtifactInfo:
+        _check_name(name)
+        info = await self.files.info(name) if self.files else None
+        if info is None:
+            info = await self.redis.info(name)
+        if info is None:
+            raise ResourceError(f"Unknown artifact: {name}")
+        return info
+
+    async def _pinned(self, name: str, etag: str) -> ArtifactInfo:
+        info = await self.info(name)
+        if etag and etag != LATEST and etag != info.etag:
+            raise ResourceError(f"Artifact {name} changed (etag {info.etag}, not {etag}); read artifact://{name} again")
+        return info
+
+    @asynccontextmanager
+    async def _reader(self, info: ArtifactInfo) -> AsyncIterator[Callable[[int, int], Awaitable[bytes]]]:
+        backend = self.files if info.backend == "file" else self.redis
+        async with backend.open(info) as read:
+
+            async def counted(start: int, end: int) -> bytes:
+                data = await read(start, end)
+                _stats["reads"] += 1
+                _stats["bytes"] += len(data)
+                return data
+
+            yield counted
+
+    async def read_range(self, name: str, offset: int, length: int, etag: str = LATEST) -> bytes:
+        if length < 0 or length > settings.ARTIFACT_MAX_RANGE_BYTES:
+            raise ResourceError(f"Range length must be 0..{settings.ARTIFACT_MAX_RANGE_BYTES} bytes, not {length}")
+        info = await self._pinned(name, etag)
+        start, end = _check_range(info, offset, length)
+        async with self._reader(info) as read:
+            return await read(start, end)
+
+    async def iter_range(
+        self, name: str, offset: int = 0, length: int = -1, etag: str = LATEST
+    ) -> AsyncIterator[Tuple[ArtifactInfo, int, bytes]]:
+        """Yield (info, offset, chunk) over a range, one chunk_bytes read at a time."""
+        info = await self._pinned(name, etag)
+        start, end = _check_range(info, offset, length)
+        step = info.chunk_bytes
+        async with self._reader(info) as read:
+            for pos in range(start, end, step):
+                yield info, pos, await read(pos, min(end, pos + step))
+
+
+artifacts = ArtifactStore(settings.ARTIFACTS_DIR)
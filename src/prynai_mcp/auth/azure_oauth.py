@@ -2,20 +2,24 @@
 Azure Entra ID OAuth2 / JWT validation.
 
 - Validates 'Authorization: Bearer <JWT>' on incoming requests.
-- Verifies signature via tenant JWKS (RS256).
-- Enforces issuer and audience.
+- Verifies signature via tenant JWKS (RS256), keys from the async JwksStore.
+- Enforces issuer and audience from the precompiled AuthPolicy.
 - Optionally enforces scopes ('scp') and/or app roles ('roles').
+- Caches validated claims per token (until 'exp') to skip repeat crypto.
 - On failure, raises AuthError carrying a JSONResponse(401).
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict
 import jwt  # PyJWT
-from jwt import PyJWKClient, InvalidTokenError, InvalidSignatureError, InvalidKeyError
+from jwt import InvalidTokenError
 from starlette.responses import JSONResponse
 
 from ..config import settings
+from .jwks import ensure_jwks, JwksError, KeyNotFoundError
+from .policy import AuthPolicy, get_policy, on_policy_change
+from .token_cache import TokenCache
 
 
 class AuthError(Exception):
@@ -24,8 +28,9 @@ class AuthError(Exception):
     Middleware catches this and returns e.response.
     """
 
-    def __init__(self, response: JSONResponse):
+    def __init__(self, response: JSONResponse, error: str = "unauthorized"):
         self.response = response
+        self.error = error  # OAuth error code, e.g. "invalid_token" (metrics/logging)
         # Store body for logging/debug if desired
         super().__init__(response.body)
 
@@ -33,39 +38,13 @@ class AuthError(Exception):
 # ---- helpers ---------------------------------------------------------
 
 
-def _audiences() -> List[str]:
-    """Allowed token audiences."""
-    if not settings.ENTRA_AUDIENCES:
-        return []
-    return [a.strip() for a in settings.ENTRA_AUDIENCES.split(",") if a.strip()]
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)  # validated claims, per-process
 
 
-def _required_scopes() -> List[str]:
-    """At least one of these scopes ('scp' claim) must be present if configured."""
-    if not settings.ENTRA_REQUIRED_SCOPES:
-        return []
-    return [s.strip() for s in settings.ENTRA_REQUIRED_SCOPES.split(",") if s.strip()]
-
-
-def _required_roles() -> List[str]:
-    """At least one of these app roles ('roles' claim) must be present if configured."""
-    if not settings.ENTRA_REQUIRED_APP_ROLES:
-        return []
-    return [r.strip() for r in settings.ENTRA_REQUIRED_APP_ROLES.split(",") if r.strip()]
-
-
-_jwk_client: Optional[PyJWKClient] = None  # cached per-process
-
-
-def _get_jwk_client() -> PyJWKClient:
-    """Create or reuse a JWKS client for the tenant."""
-    global _jwk_client
-    if _jwk_client is None:
-        if not settings.jwks_url:
-            raise _unauthorized("config_error", "JWKS URL not configured. Set ENTRA_TENANT_ID.")
-        # PyJWKClient caches keys and uses standard HTTPS fetch internally
-        _jwk_client = PyJWKClient(settings.jwks_url)
-    return _jwk_client
+@on_policy_change
+def _drop_cached_tokens(old: AuthPolicy, new: AuthPolicy) -> None:
+    # Claims were validated against the old audiences/issuer/scopes
+    token_cache.clear()
 
 
 def _unauthorized(error: str, desc: str) -> AuthError:
@@ -75,7 +54,8 @@ def _unauthorized(error: str, desc: str) -> AuthError:
             {"error": error, "error_description": desc},
             status_code=401,
             headers={"WWW-Authenticate": f'Bearer error="{error}", error_description="{desc}"'},
-        )
+        ),
+        error,
     )
 
 
@@ -95,50 +75,54 @@ async def validate_bearer_header(authorization: str | None) -> Dict[str, Any]:
     if not token:
         raise _unauthorized("missing_token", "Empty bearer token")
 
+    # Fast path: token already fully validated and not yet expired
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
+    policy = get_policy()
+
     # Resolve signing key from JWKS using token's 'kid'
+    if not policy.jwks_url:
+        raise _unauthorized("config_error", "JWKS URL not configured. Set ENTRA_TENANT_ID.")
     try:
-        jwk_client = _get_jwk_client()
-        signing_key = jwk_client.get_signing_key_from_jwt(token)
-    except (InvalidKeyError, InvalidSignatureError, InvalidTokenError) as e:
+        kid = jwt.get_unverified_header(token).get("kid")
+        store = await ensure_jwks()
+        signing_key = await store.get_signing_key(kid)
+    except InvalidTokenError as e:
+        raise _unauthorized("invalid_token", f"Malformed token: {e}")
+    except KeyNotFoundError as e:
         raise _unauthorized("invalid_signature", f"Signature validation failed: {e}")
-    except AuthError:
-        # rethrow config_error
-        raise
-    except Exception as e:
+    except JwksError as e:
         raise _unauthorized("jwks_error", f"Unable to resolve signing key: {e}")
 
-    issuer = settings.issuer  # None disables issuer check in PyJWT
-    audiences = _audiences()  # [] disables audience check
-
     # Validate signature, issuer, audience, exp
     try:
         claims = jwt.decode(
             token,
-            signing_key.key,            # public key
+            signing_key.key,                        # public key
             algorithms=["RS256"],
-            audience=audiences or None, # PyJWT skips aud if None
-            issuer=issuer,              # PyJWT skips iss if None
-            options={
-                "verify_signature": True,
-                "verify_exp": True,
-                "verify_aud": bool(audiences),
-                "verify_iss": bool(issuer),
-            },
+            audience=policy.audiences or None,      # PyJWT skips aud if None
+            issuer=policy.issuer,                   # PyJWT skips iss if None
+            options=policy.decode_options,
         )
     except InvalidTokenError as e:
         raise _unauthorized("invalid_token", f"Token validation failed: {e}")
 
     # Optional scope/role enforcement
-    need_scopes = set(_required_scopes())
+    need_scopes = policy.required_scopes
     if need_scopes:
-        granted_scopes = set((claims.get("scp") or "").split())  # space-separated string
-        if not need_scopes.intersection(granted_scopes):
+        granted_scopes = (claims.get("scp") or "").split()  # space-separated string
+        if need_scopes.isdisjoint(granted_scopes):
             raise _unauthorized("insufficient_scope", f"Require one of scopes: {sorted(need_scopes)}")
 
-    need_roles = set(_required_roles())
+    need_roles = policy.required_roles
     if need_roles:
-        granted_roles = set(claims.get("roles") or [])
-        if not need_roles.intersection(granted_roles):
+        if need_roles.isdisjoint(claims.get("roles") or ()):
             raise _unauthorized("insufficient_role", f"Require one of app roles: {sorted(need_roles)}")
 
-    return claims
\ No newline at end of file
+    # A reload during the awaits above cleared the cache; claims checked against the old
+    # policy must not land in it afterwards
+    if get_policy() is policy:
+        token_cache.put(token, claims)
+    return claims
@@ -0,0 +1,235 @@
+"""
+Async JWKS key store (replaces PyJWT's blocking PyJWKClient).
+
+- Fetches the tenant JWKS with httpx (never blocks the event loop).
+- Loads keys at app startup and refreshes them in the background before they expire
+  (Cache-Control max-age when present, else JWKS_REFRESH_SECONDS).
+- Concurrent lookups that need a fetch share ONE in-flight request (single-flight).
+- Unknown 'kid's are negatively cached; forced refetches are rate limited by
+  JWKS_UNKNOWN_KID_COOLDOWN_SECONDS so garbage tokens cannot hammer Entra.
+- ENTRA_JWKS_URL may point at a local JWKS file (path or file://) or a stub server,
+  standing in for login.microsoftonline.com in tests and benchmarks.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import httpx
+from jwt import PyJWK
+from jwt.exceptions import PyJWKError
+
+from ..config import settings
+from .policy import AuthPolicy, get_policy, on_policy_change
+
+log = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class JwksError(Exception):
+    """JWKS could not be fetched or parsed."""
+
+
+class KeyNotFoundError(LookupError):
+    """No signing key with the requested 'kid' (after an allowed refetch)."""
+
+
+class JwksStore:
+    def __init__(
+        self,
+        url: str,
+        refresh_seconds: float = 3600.0,
+        unknown_kid_cooldown: float = 30.0,
+        timeout: float = 5.0,
+    ):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.unknown_kid_cooldown = unknown_kid_cooldown
+        self.timeout = timeout
+
+        self._keys: Dict[str, PyJWK] = {}
+        self._expires_at = 0.0          # when the current key set should be refreshed
+        self._last_fetch = 0.0          # monotonic time of the last fetch attempt
+        self._negative: Dict[str, float] = {}  # kid -> monotonic time the miss stays cached
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    # ---- lifecycle ---------------------------------------------------
+
+    async def start(self) -> None:
+        """Load keys now (best effort) and keep them fresh in the background."""
+        try:
+            await self.refresh()
+        except JwksError as e:
+            log.warning("initial JWKS load failed, will retry: %s", e)
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop(), name="jwks-refresh")
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            # Refresh at ~80% of the key set's lifetime; retry quickly after failures
+            if self._keys:
+                delay = max(1.0, (self._expires_at - time.monotonic()) * 0.8)
+            else:
+                delay = min(self.unknown_kid_cooldown, 10.0)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except JwksError as e:
+                log.warning("background JWKS refresh failed: %s", e)
+            except Exception:
+                # Anything else (a bug, an unexpected payload) must not end the refresher
+                log.exception("background JWKS refresh failed unexpectedly")
+
+    # ---- lookups -----------------------------------------------------
+
+    async def get_signing_key(self, kid: Optional[str]) -> PyJWK:
+        """Return the key for 'kid', fetching at most once per cooldown for unknown kids."""
+        if kid is None:
+            # Single-key sets (stub servers, local files) may omit 'kid'
+            if len(self._keys) == 1:
+                return next(iter(self._keys.values()))
+            raise KeyNotFoundError("token header has no 'kid'")
+
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        now = time.monotonic()
+        if self._negative.get(kid, 0.0) > now:
+            raise KeyNotFoundError(f"unknown signing key kid={kid}")
+
+        if self._inflight is None and now - self._last_fetch < self.unknown_kid_cooldown:
+            # Rate limit: a fetch happened recently and this kid was not in it
+            self._remember_miss(kid, now)
+            raise KeyNotFoundError(f"unknown signing key kid={kid}")
+
+        await self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            self._remember_miss(kid, time.monotonic())
+            raise KeyNotFoundError(f"unknown signing key kid={kid}")
+        return key
+
+    def _remember_miss(self, kid: str, now: float) -> None:
+        if len(self._negative) > 1024:
+            self._negative = {k: t for k, t in self._negative.items() if t > now}
+        self._negative[kid] = now + self.unknown_kid_cooldown
+
+    # ---- fetching ----------------------------------------------------
+
+    async def refresh(self) -> None:
+        """Fetch the key set; concurrent callers share the same in-flight fetch."""
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._fetch_and_swap())
+            self._inflight.add_done_callback(self._clear_inflight)
+        # shield: one cancelled waiter must not cancel the fetch for everyone else
+        await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, task: asyncio.Task) -> None:
+        if self._inflight is task:
+            self._inflight = None
+        if not task.cancelled():
+            task.exception()  # mark retrieved; waiters already saw it
+
+    async def _fetch_and_swap(self) -> None:
+        self._last_fetch = time.monotonic()
+        data, max_age = await self._fetch()
+        keys: Dict[str, PyJWK] = {}
+        for jwk in data.get("keys") or []:
+            if jwk.get("use", "sig") != "sig":
+                continue
+            try:
+                key = PyJWK(jwk)
+            except PyJWKError:
+                continue  # unsupported kty/alg; skip like PyJWKClient does
+            keys[jwk.get("kid") or ""] = key
+        if not keys:
+            raise JwksError(f"no usable signing keys at {self.url}")
+        # Atomic swap; new kids are no longer "unknown"
+        self._keys = keys
+        self._expires_at = time.monotonic() + (max_age or self.refresh_seconds)
+        self._negative = {k: t for k, t in self._negative.items() if k not in keys}
+
+    async def _fetch(self) -> tuple[Dict[str, Any], Optional[float]]:
+        parsed = urlparse(self.url)
+        try:
+            if parsed.scheme in ("http", "https"):
+                if self._client is None:
+                    self._client = httpx.AsyncClient(timeout=self.timeout)
+                resp = await self._client.get(self.url)
+                resp.raise_for_status()
+                m = _MAX_AGE.search(resp.headers.get("cache-control", ""))
+                return resp.json(), (float(m.group(1)) if m else None)
+            # Local JWKS file (plain path or file:// URL)
+            path = Path(url2pathname(parsed.path)) if parsed.scheme == "file" else Path(self.url)
+            text = await asyncio.to_thread(path.read_text, encoding="utf-8")
+            return json.loads(text), None
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            raise JwksError(f"JWKS fetch from {self.url} failed: {e}") from e
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._keys),
+            "negative": len(self._negative),
+            "expires_in": max(0.0, self._expires_at - time.monotonic()),
+        }
+
+
+# ---- process-wide store ----------------------------------------------
+
+_store: Optional[JwksStore] = None
+
+
+async def ensure_jwks() -> JwksStore:
+    """Create and start the process-wide JWKS store (idempotent)."""
+    global _store
+    if _store is None:
+        jwks_url = get_policy().jwks_url
+        if not jwks_url:
+            raise JwksError("JWKS URL not configured. Set ENTRA_TENANT_ID or ENTRA_JWKS_URL.")
+        store = JwksStore(
+            jwks_url,
+            refresh_seconds=settings.JWKS_REFRESH_SECONDS,
+            unknown_kid_cooldown=settings.JWKS_UNKNOWN_KID_COOLDOWN_SECONDS,
+            timeout=settings.JWKS_HTTP_TIMEOUT_SECONDS,
+        )
+        _store = store
+        await store.start()
+    return _store
+
+
+async def close_jwks() -> None:
+    global _store
+    if _store:
+        await _store.stop()
+        _store = None
+
+
+@on_policy_change
+async def _reset_on_url_change(old: AuthPolicy, new: AuthPolicy) -> None:
+    # Tenant/JWKS URL changed: drop the old store; the next lookup starts a fresh one
+    if old.jwks_url != new.jwks_url:
+        await close_jwks()
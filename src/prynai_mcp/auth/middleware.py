@@ -4,41 +4,60 @@ BearerAuthMiddleware
 - Uses validate_bearer_header() to verify Microsoft Entra ID JWT.
 - On success, attaches claims at request.state.user_claims.
 - On failure, returns 401 with a proper WWW-Authenticate header.
+- Pure ASGI: reads the header straight from scope["headers"] and passes the
+  response (incl. SSE streams) through untouched — no BaseHTTPMiddleware
+  task/memory-stream hop per request.
 """
 
 from __future__ import annotations
 
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
-from starlette.responses import Response
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from ..config import settings
 from .azure_oauth import validate_bearer_header, AuthError
+from .policy import get_policy
+from ..metrics import observe_auth
+from ..tracing import span
+
+_OPEN_PATHS = ("/healthz", "/livez", "/metrics")
+
+
+def _authorization(scope: Scope) -> str | None:
+    """Return the Authorization header value (latin-1, like Starlette) or None."""
+    for name, value in scope.get("headers") or ():
+        if name == b"authorization":
+            return value.decode("latin-1")
+    return None
 
 
-class BearerAuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        # Short-circuit if auth not required (useful for dev/local)
-        if not settings.AUTH_REQUIRED:
-            return await call_next(request)
+class BearerAuthMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        path = request.url.path or "/"
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Short-circuit if auth not required (useful for dev/local) or not HTTP (lifespan)
+        if scope["type"] != "http" or not get_policy().auth_required:
+            await self.app(scope, receive, send)
+            return
 
-        # Always allow health checks
-        if path in ("/healthz", "/livez"):
-            return await call_next(request)
+        path = scope.get("path") or "/"
 
-        # Protect Streamable HTTP endpoint
-        if path.startswith("/mcp"):
-            auth_header = request.headers.get("Authorization")
+        # Always allow health checks; protect Streamable HTTP endpoint
+        if path not in _OPEN_PATHS and path.startswith("/mcp"):
+            t0 = time.perf_counter()
             try:
-                claims = await validate_bearer_header(auth_header)
+                with span("auth.validate_bearer"):
+                    claims = await validate_bearer_header(_authorization(scope))
             except AuthError as e:
+                observe_auth(e.error, time.perf_counter() - t0)
                 # Return the embedded 401 response without crashing the app
-                return e.response
+                await e.response(scope, receive, send)
+                return
+            observe_auth("ok", time.perf_counter() - t0)
 
-            # Make claims available to downstream handlers/tools if needed
-            request.state.user_claims = claims
+            # Same storage Request.state uses, so request.state.user_claims keeps working
+            scope.setdefault("state", {})["user_claims"] = claims
 
         # Proceed to the next app/middleware (MCP SHTTP app)
-        return await call_next(request)
+        await self.app(scope, receive, send)
@@ -0,0 +1,199 @@
+"""
+Compiled auth policy.
+
+- AuthPolicy is an immutable snapshot of the auth-related Settings:
+  frozensets of audiences/scopes/roles plus precomputed issuer/JWKS URLs
+  and jwt.decode options. Nothing is split or formatted per request.
+- get_policy() returns the current snapshot (one global read, no locking).
+- The environment is fixed for the life of the process, so what can change at runtime
+  is AUTH_POLICY_FILE: a JSON object of AUTH_REQUIRED / ENTRA_* values that override
+  the environment. Each worker re-reads it when its mtime/size changes (checked every
+  AUTH_POLICY_POLL_SECONDS, see start_policy_watch()).
+- reload_policy() re-reads the file, compiles a new snapshot and swaps it in
+  atomically; listeners (token cache, JWKS store) are told when it changes. A file
+  that cannot be read keeps the current policy (at startup it is an error).
+- On POSIX, SIGHUP triggers reload_policy() when the app runs in a single process
+  (install_reload_signal()). Under the multi-worker launcher the supervisor gets the
+  SIGHUP and uvicorn restarts every worker instead, which reads the file anew anyway.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import signal
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple, Union
+
+from ..config import Settings, settings
+
+log = logging.getLogger(__name__)
+
+
+def _csv(value: Optional[str]) -> FrozenSet[str]:
+    if not value:
+        return frozenset()
+    return frozenset(v.strip() for v in value.split(",") if v.strip())
+
+
+@dataclass(frozen=True)
+class AuthPolicy:
+    auth_required: bool
+    issuer: Optional[str]
+    jwks_url: Optional[str]
+    audiences: FrozenSet[str]
+    required_scopes: FrozenSet[str]
+    required_roles: FrozenSet[str]
+    decode_options: Mapping[str, bool] = field(compare=False)
+
+
+def compile_policy(s: Settings) -> AuthPolicy:
+    """Build an AuthPolicy from settings (call once, not per request)."""
+    issuer = s.issuer
+    audiences = _csv(s.ENTRA_AUDIENCES)
+    return AuthPolicy(
+        auth_required=s.AUTH_REQUIRED,
+        issuer=issuer,
+        jwks_url=s.jwks_url,
+        audiences=audiences,
+        required_scopes=_csv(s.ENTRA_REQUIRED_SCOPES),
+        required_roles=_csv(s.ENTRA_REQUIRED_APP_ROLES),
+        decode_options={
+            "verify_signature": True,
+            "verify_exp": True,
+            "verify_aud": bool(audiences),
+            "verify_iss": bool(issuer),
+        },
+    )
+
+
+# Settings AUTH_POLICY_FILE may override
+POLICY_FILE_KEYS = frozenset({
+    "AUTH_REQUIRED",
+    "ENTRA_TENANT_ID",
+    "ENTRA_AUDIENCES",
+    "ENTRA_REQUIRED_SCOPES",
+    "ENTRA_REQUIRED_APP_ROLES",
+    "ENTRA_JWKS_URL",
+})
+
+
+def _read_policy_file(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    unknown = set(data) - POLICY_FILE_KEYS
+    if unknown:
+        log.warning("%s: ignoring unknown keys %s", path, sorted(unknown))
+    return {k: v for k, v in data.items() if k in POLICY_FILE_KEYS}
+
+
+def load_settings() -> Settings:
+    """Settings from the environment, with AUTH_POLICY_FILE's values (if any) on top."""
+    path = settings.AUTH_POLICY_FILE
+    if not path:
+        return Settings()
+    # Init kwargs take precedence over environment variables in pydantic-settings
+    return Settings(**_read_policy_file(path))
+
+
+_policy: AuthPolicy = compile_policy(load_settings())
+
+PolicyListener = Callable[[AuthPolicy, AuthPolicy], Union[None, Awaitable[None]]]
+_listeners: List[PolicyListener] = []
+
+
+def get_policy() -> AuthPolicy:
+    return _policy
+
+
+def on_policy_change(listener: PolicyListener) -> PolicyListener:
+    """Register listener(old, new), called after a reload changed the policy."""
+    _listeners.append(listener)
+    return listener
+
+
+async def reload_policy(new_settings: Optional[Settings] = None) -> AuthPolicy:
+    """Re-read AUTH_POLICY_FILE and atomically swap in the new policy if it changed."""
+    global _policy
+    if new_settings is None:
+        try:
+            new_settings = load_settings()
+        except Exception as e:
+            log.error("auth policy not reloaded, keeping the current one: %s", e)
+            return _policy
+    new = compile_policy(new_settings)
+    old = _policy
+    if new == old:
+        return old
+    _policy = new
+    log.info("auth policy reloaded")
+    for listener in list(_listeners):
+        try:
+            res: Any = listener(old, new)
+            if inspect.isawaitable(res):
+                await res
+        except Exception:
+            log.exception("auth policy listener failed")
+    return new
+
+
+def install_reload_signal() -> None:
+    """Reload the policy on SIGHUP (no-op where unsupported, e.g. Windows)."""
+    sighup = getattr(signal, "SIGHUP", None)
+    if sighup is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(sighup, lambda: loop.create_task(reload_policy()))
+    except (NotImplementedError, RuntimeError, ValueError):
+        pass
+
+
+# ---- AUTH_POLICY_FILE watch -------------------------------------------
+
+_watcher: Optional[asyncio.Task] = None
+
+
+def _file_stamp(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+async def _watch_loop(path: str, interval: float) -> None:
+    stamp = _file_stamp(path)
+    while True:
+        await asyncio.sleep(interval)
+        current = _file_stamp(path)
+        if current != stamp:
+            stamp = current
+            try:
+                await reload_policy()
+            except Exception:
+                log.exception("auth policy reload failed")
+
+
+async def start_policy_watch() -> None:
+    """Reload when AUTH_POLICY_FILE changes (no-op without a file or with polling off)."""
+    global _watcher
+    path, interval = settings.AUTH_POLICY_FILE, settings.AUTH_POLICY_POLL_SECONDS
+    if _watcher is None and path and interval > 0:
+        _watcher = asyncio.create_task(_watch_loop(path, interval), name="prynai-auth-policy-watch")
+
+
+async def stop_policy_watch() -> None:
+    global _watcher
+    if _watcher is not None:
+        _watcher.cancel()
+        try:
+            await _watcher
+        except asyncio.CancelledError:
+            pass
+        _watcher = None
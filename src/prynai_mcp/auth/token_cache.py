@@ -0,0 +1,80 @@
+"""
+Verified-token cache.
+
+- Remembers claims of bearer tokens that already passed full validation.
+- Keyed by SHA-256 of the raw token (the token itself is never stored).
+- Each entry expires at the token's own 'exp' (minus a small leeway).
+- Bounded LRU: least-recently-used entries are evicted past max_entries.
+- Counts hits/misses/evictions for observability.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class TokenCache:
+    """Bounded, TTL-aware LRU of validated JWT claims (max_entries=0 disables it)."""
+
+    def __init__(self, max_entries: int, leeway_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.leeway_seconds = leeway_seconds
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return cached claims for a still-valid token, or None."""
+        if self.max_entries <= 0:
+            return None
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, claims = entry
+        if time.time() >= expires_at:
+            # Expired: drop it and force a full validation (which will reject it)
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """Cache claims until the token's 'exp'. Tokens without 'exp' are not cached."""
+        if self.max_entries <= 0:
+            return
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)):
+            return
+        expires_at = float(exp) - self.leeway_seconds
+        if expires_at <= time.time():
+            return
+        key = self._key(token)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,192 @@
+"""
+Result cache for pure tools and resources.
+
+- @cached(ttl=...) marks a FastMCP tool/resource function as cacheable:
+      @mcp.tool()
+      @cached(ttl=300)
+      def add(a: int, b: int) -> int: ...
+- Two tiers: an in-process LRU (RESULT_CACHE_MAX_ENTRIES) in front of a shared Redis
+  tier (RESULT_CACHE_REDIS, per function via shared=False).
+- Key = function name + canonical JSON of the bound arguments (Context excluded).
+- Only JSON-serializable results go to Redis; Redis errors (and unreadable entries,
+  counted as misses) never fail the call.
+- The Redis tier costs a round trip per local miss: it only pays off for results that are
+  expensive to compute. Cheap ones (add, multiply) use shared=False.
+- Per-name hit/miss counters via result_cache.stats(); invalidate with
+  `await result_cache.invalidate("add")` or `invalidate("add", a=1, b=2)`.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from mcp.server.fastmcp import Context
+
+from .config import settings
+from .redis_client import ensure_redis
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+_REDIS_PREFIX = "prynai:cache:"
+
+
+def _canonical_args(bound: Dict[str, Any]) -> str:
+    return json.dumps(bound, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _cache_key(name: str, bound: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(_canonical_args(bound).encode("utf-8")).hexdigest()[:32]
+    return f"{name}:{digest}"
+
+
+class ResultCache:
+    def __init__(self, max_entries: int, redis_enabled: bool):
+        self.max_entries = max_entries
+        self.redis_enabled = redis_enabled
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # name -> [local_hits, redis_hits, misses, redis_errors]
+        self._counts: Dict[str, list] = defaultdict(lambda: [0, 0, 0, 0])
+
+    # ---- tiers -------------------------------------------------------
+
+    def _get_local(self, key: str) -> Any:
+        entry = self._local.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._local[key]
+            return _MISSING
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: Any, ttl: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._local[key] = (time.monotonic() + ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def get(self, name: str, key: str, ttl: float, shared: bool) -> Any:
+        """Return the cached value or _MISSING; a Redis hit is copied into the local tier."""
+        counts = self._counts[name]
+        value = self._get_local(key)
+        if value is not _MISSING:
+            counts[0] += 1
+            return value
+        if shared and self.redis_enabled:
+            try:
+                r = await ensure_redis()
+                raw = await r.get(_REDIS_PREFIX + key)
+            except Exception as e:
+                counts[3] += 1
+                log.warning("result cache: redis get failed: %s", e)
+                raw = None
+            if raw is not None:
+                try:
+                    value = json.loads(raw)
+                except ValueError:
+                    # Corrupt or foreign entry: a miss, and the fresh result overwrites it
+                    log.warning("result cache: unreadable redis entry for %s ignored", name)
+                else:
+                    # Local copy never outlives the shared entry by more than one TTL
+                    self._set_local(key, value, ttl)
+                    counts[1] += 1
+                    return value
+        counts[2] += 1
+        return _MISSING
+
+    async def set(self, name: str, key: str, value: Any, ttl: float, shared: bool) -> None:
+        self._set_local(key, value, ttl)
+        if not (shared and self.redis_enabled):
+            return
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError):
+            return  # not JSON-serializable: local tier only
+        try:
+            r = await ensure_redis()
+            await r.set(_REDIS_PREFIX + key, payload, px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            self._counts[name][3] += 1
+            log.warning("result cache: redis set failed: %s", e)
+
+    # ---- invalidation / metrics -----------------------------------------
+
+    async def invalidate(self, name: str, **args: Any) -> int:
+        """Drop one entry (name + args) or, with no args, every entry for name. Returns Redis keys removed."""
+        if args:
+            keys = [_cache_key(name, args)]
+            for k in keys:
+                self._local.pop(k, None)
+        else:
+            prefix = f"{name}:"
+            for k in [k for k in self._local if k.startswith(prefix)]:
+                del self._local[k]
+            keys = []
+        if not self.redis_enabled:
+            return 0
+        try:
+            r = await ensure_redis()
+            if not args:
+                keys = [k[len(_REDIS_PREFIX):] async for k in r.scan_iter(match=f"{_REDIS_PREFIX}{name}:*", count=500)]
+            if not keys:
+                return 0
+            return int(await r.delete(*[_REDIS_PREFIX + k for k in keys]))
+        except Exception as e:
+            log.warning("result cache: redis invalidate failed: %s", e)
+            return 0
+
+    def clear_local(self) -> None:
+        self._local.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"local_hits": c[0], "redis_hits": c[1], "misses": c[2], "redis_errors": c[3]}
+            for name, c in self._counts.items()
+        }
+
+
+result_cache = ResultCache(settings.RESULT_CACHE_MAX_ENTRIES, settings.RESULT_CACHE_REDIS)
+
+
+def cached(ttl: float, name: Optional[str] = None, shared: bool = True) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Cache a pure tool/resource function's result for `ttl` seconds.
+    Apply BELOW @mcp.tool()/@mcp.resource() so FastMCP registers the cached wrapper;
+    the original signature (and Context parameter) is preserved via functools.wraps.
+    shared=False keeps results replica-local (e.g. values that differ per replica).
+    """
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        cache_name = name or fn.__name__
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key_args = {k: v for k, v in bound.arguments.items() if not isinstance(v, Context)}
+            key = _cache_key(cache_name, key_args)
+
+            value = await result_cache.get(cache_name, key, ttl, shared)
+            if value is not _MISSING:
+                return value
+            value = fn(*args, **kwargs)
+            if inspect.isawaitable(value):
+                value = await value
+            await result_cache.set(cache_name, key, value, ttl, shared)
+            return value
+
+        return wrapper
+
+    return decorator
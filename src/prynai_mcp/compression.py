@@ -0,0 +1,301 @@
+"""
+Negotiated response compression for /mcp (COMPRESSION_ENABLED).
+
+- The encoding is the first of COMPRESSION_ENCODINGS ("zstd,gzip") that the request's
+  Accept-Encoding allows; zstd needs the optional zstandard package
+  (pip install "prynai-mcp[zstd]") and is skipped without it.
+- Threshold: a JSON response smaller than COMPRESSION_MIN_BYTES goes out as is. An SSE
+  stream has no length up front and its Content-Encoding cannot change once started, so
+  by default its first message decides: compressed if it crosses the threshold, as is
+  otherwise. COMPRESSION_SSE_HOLD_MS > 0 holds small messages (with the response start)
+  for up to that long, until the held bytes cross the threshold (then everything is
+  compressed) or the stream ends; that lets small progress events ahead of big chunks
+  be compressed too, at the cost of delaying them. Off by default: early events (progress,
+  the first @streaming chunk) are sent at once.
+- SSE streams are flushed after every message (gzip sync flush, zstd block flush), so
+  each message reaches the client as soon as it is sent, already decodable.
+- Standalone GET streams are only compressed when resuming (Last-Event-ID), since their
+  first event may be minutes away and the response start waits for it.
+- Every compressible response says Vary: Accept-Encoding, compressed or not (also when
+  the client accepts no coding we offer), so caches keep the variants apart.
+- Messages of COMPRESSION_THREAD_MIN_BYTES or more are compressed in a thread (zlib and
+  zstd release the GIL), so big payloads do not stall the event loop.
+- Metrics: prynai_http_response_bytes_total{encoding,stage="raw"|"sent"},
+  prynai_compression_seconds_total{encoding}, prynai_compression_responses_total{encoding}.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import COMPRESSION_RESPONSES, COMPRESSION_SECONDS, RESPONSE_BYTES
+
+try:
+    import zstandard
+except ImportError:  # optional extra: pip install "prynai-mcp[zstd]"
+    zstandard = None
+
+_COMPRESSIBLE = ("application/json", "text/")
+
+
+class _Gzip:
+    name = "gzip"
+
+    def __init__(self) -> None:
+        self._c = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool, finish: bool) -> bytes:
+        out = self._c.compress(data)
+        if finish:
+            return out + self._c.flush(zlib.Z_FINISH)
+        return out + self._c.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+
+class _Zstd:
+    name = "zstd"
+
+    def __init__(self) -> None:
+        self._c = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes, flush: bool, finish: bool) -> bytes:
+        out = self._c.compress(data)
+        if finish:
+            return out + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        return out + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+
+_ENCODERS: Dict[str, Callable[[], object]] = {"gzip": _Gzip}
+if zstandard is not None:
+    _ENCODERS["zstd"] = _Zstd
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    """Accept-Encoding -> {coding: q}."""
+    out: Dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            out[coding.strip().lower()] = q
+    return out
+
+
+def choose_encoding(accept_encoding: str, preference: List[str]) -> Optional[str]:
+    """The first server-preferred, available coding the client accepts (q > 0)."""
+    accepted = _accepted(accept_encoding)
+    for coding in preference:
+        if coding not in _ENCODERS:
+            continue
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > 0:
+            return coding
+    return None
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> str:
+    for k, v in headers:
+        if k.lower() == name:
+            return v.decode("latin-1")
+    return ""
+
+
+def _compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    return not _header(headers, b"content-encoding") and _header(headers, b"content-type").startswith(_COMPRESSIBLE)
+
+
+def _with_vary(start: Message) -> Message:
+    """The response start with Accept-Encoding added to its Vary header."""
+    original = start.get("headers") or []
+    vary = _header(original, b"vary")
+    if "accept-encoding" in vary.lower():
+        return start
+    headers = [(k, v) for k, v in original if k.lower() != b"vary"]
+    headers.append((b"vary", (f"{vary}, Accept-Encoding" if vary else "Accept-Encoding").encode("latin-1")))
+    return {**start, "headers": headers}
+
+
+def _vary_send(send: Send) -> Send:
+    """send() for a response we could have compressed but will not (no accepted coding)."""
+
+    async def wrapped(message: Message) -> None:
+        if message["type"] == "http.response.start" and _compressible(message.get("headers") or []):
+            message = _with_vary(message)
+        await send(message)
+
+    return wrapped
+
+
+class CompressionMiddleware:
+    """Pure ASGI; innermost, so every /mcp response body the app writes goes through it."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.preference = [c.strip().lower() for c in settings.COMPRESSION_ENCODINGS.split(",") if c.strip()]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            not settings.COMPRESSION_ENABLED
+            or scope["type"] != "http"
+            or not (scope.get("path") or "").startswith("/mcp")
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = scope.get("headers") or []
+        method = scope.get("method")
+        if method not in ("POST", "GET") or (method == "GET" and not _header(headers, b"last-event-id")):
+            await self.app(scope, receive, send)
+            return
+        coding = choose_encoding(_header(headers, b"accept-encoding"), self.preference)
+        if coding is None:
+            await self.app(scope, receive, _vary_send(send))
+            return
+        compressing = _CompressingSend(send, coding)
+        try:
+            await self.app(scope, receive, compressing)
+        finally:
+            # An app that ends without a body (or an outer middleware that writes the last
+            # chunk itself, like admission's drain) still needs the start and held messages
+            await compressing.close()
+
+
+class _CompressingSend:
+    """
+    send() wrapper: holds the start (and small SSE messages) until the threshold decides,
+    then compresses (and flushes) each body chunk.
+    """
+
+    def __init__(self, send: Send, coding: str):
+        self.send = send
+        self.coding = coding
+        self.start: Optional[Message] = None
+        self.encoder = None
+        self.sse = False
+        self.passthrough = False  # not compressible at all (not counted)
+        self.identity = False     # compressible but under the threshold (counted)
+        self.held: List[bytes] = []  # small SSE messages waiting for the decision
+        self.held_bytes = 0
+        self._timer: Optional[asyncio.Task] = None  # gives up holding after COMPRESSION_SSE_HOLD_MS
+        self._lock = asyncio.Lock()  # the app's sends vs. the timer
+
+    async def __call__(self, message: Message) -> None:
+        async with self._lock:
+            await self._send(message)
+
+    async def _send(self, message: Message) -> None:
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message["type"] == "http.response.start":
+            headers = message.get("headers") or []
+            if not _compressible(headers):
+                self.passthrough = True
+                await self.send(message)
+                return
+            self.sse = _header(headers, b"content-type").startswith("text/event-stream")
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.identity:
+            RESPONSE_BYTES.labels("identity", "raw").inc(len(body))
+            RESPONSE_BYTES.labels("identity", "sent").inc(len(body))
+            await self.send(message)
+            return
+        if self.encoder is None:
+            if not body and more:
+                return  # nothing to decide on yet; keep holding the start
+            self.held.append(body)
+            self.held_bytes += len(body)
+            if self.held_bytes < settings.COMPRESSION_MIN_BYTES:
+                if self.sse and more and settings.COMPRESSION_SSE_HOLD_MS > 0:
+                    # A bigger message may follow (e.g. chunks after progress events)
+                    if self._timer is None:
+                        self._timer = asyncio.create_task(self._hold_expired())
+                    return
+                await self._release_held(more)
+                return
+            self._cancel_timer()
+            body, self.held, self.held_bytes = b"".join(self.held), [], 0
+            self.encoder = _ENCODERS[self.coding]()
+            out = await self._compress(body, more)
+            start, self.start = self._compressed_start(None if more else len(out)), None
+            await self.send(start)
+            COMPRESSION_RESPONSES.labels(self.coding).inc()
+        else:
+            out = await self._compress(body, more)
+        await self.send({"type": "http.response.body", "body": out, "more_body": more})
+
+    async def close(self) -> None:
+        """The app is done: send whatever is still held, unchanged."""
+        async with self._lock:
+            self._cancel_timer()
+            if self.held:
+                await self._release_held(more=True)
+            elif self.start is not None and self.encoder is None:
+                start, self.start = self.start, None
+                await self.send(_with_vary(start))
+
+    async def _release_held(self, more: bool) -> None:
+        """Under the threshold: send the start and held messages as they are; the rest follows."""
+        COMPRESSION_RESPONSES.labels("identity").inc()
+        self.identity = True
+        self._cancel_timer()
+        body, self.held, self.held_bytes = b"".join(self.held), [], 0
+        start, self.start = self.start, None
+        if start is not None:
+            await self.send(_with_vary(start))
+        RESPONSE_BYTES.labels("identity", "raw").inc(len(body))
+        RESPONSE_BYTES.labels("identity", "sent").inc(len(body))
+        await self.send({"type": "http.response.body", "body": body, "more_body": more})
+
+    async def _hold_expired(self) -> None:
+        await asyncio.sleep(settings.COMPRESSION_SSE_HOLD_MS / 1000.0)
+        async with self._lock:
+            if self.encoder is None and not self.identity and self.held:
+                try:
+                    await self._release_held(more=True)
+                except Exception:
+                    pass  # client gone; the app's next send fails the same way
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+
+    async def _compress(self, body: bytes, more: bool) -> bytes:
+        t0 = time.perf_counter()
+        # Every SSE message is flushed so it can be decoded on arrival
+        args = (body, self.sse, not more)
+        if len(body) >= settings.COMPRESSION_THREAD_MIN_BYTES:
+            out = await asyncio.to_thread(self.encoder.compress, *args)
+        else:
+            out = self.encoder.compress(*args)
+        COMPRESSION_SECONDS.labels(self.coding).inc(time.perf_counter() - t0)
+        RESPONSE_BYTES.labels(self.coding, "raw").inc(len(body))
+        RESPONSE_BYTES.labels(self.coding, "sent").inc(len(out))
+        return out
+
+    def _compressed_start(self, content_length: Optional[int]) -> Message:
+        start = _with_vary(self.start)
+        headers = [(k, v) for k, v in start["headers"] if k.lower() != b"content-length"]
+        headers.append((b"content-encoding", self.coding.encode("latin-1")))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        return {**start, "headers": headers}
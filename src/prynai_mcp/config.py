@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,6 +6,112 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379/0"
     CORS_ALLOW_ORIGINS: str = "*"
 
+    # --- Redis client (see redis_client.py for cluster/sentinel URL forms) ---
+    REDIS_MAX_CONNECTIONS: int = 64  # per process (per node on Cluster)
+    REDIS_POOL_TIMEOUT_SECONDS: float = 2.0  # max wait for a free pooled connection
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 5.0
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = 30  # PING idle connections before reuse
+    # Retries on connection errors/timeouts, exponential backoff with jitter
+    REDIS_RETRY_ATTEMPTS: int = 3
+    REDIS_RETRY_BACKOFF_BASE_MS: int = 10
+    REDIS_RETRY_BACKOFF_CAP_MS: int = 500
+
+    # --- Result cache (@cached tools/resources) ---
+    RESULT_CACHE_MAX_ENTRIES: int = 10000  # in-process LRU tier (0 disables it)
+    RESULT_CACHE_REDIS: bool = True        # shared Redis tier
+    # Replica-local copy of hot Redis values (counter); pub/sub invalidates, TTL caps staleness
+    HOT_CACHE_TTL_SECONDS: float = 30.0
+
+    # --- Counter (prynai:counter) ---
+    # single = one INCRBY per bump; sharded = spread over COUNTER_SHARDS sub-keys;
+    # buffered = write-behind, one INCRBY per COUNTER_FLUSH_INTERVAL_MS batch
+    COUNTER_MODE: Literal["single", "sharded", "buffered"] = "single"
+    COUNTER_SHARDS: int = 16
+    COUNTER_FLUSH_INTERVAL_MS: int = 50
+    # exact = bumps return the true post-increment value; eventual = local estimate, no wait
+    COUNTER_CONSISTENCY: Literal["exact", "eventual"] = "exact"
+
+    # --- Per-client rate limiting (keyed on token azp/appid/oid) ---
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_RPS: float = 20.0   # sustained POST /mcp per client (0 = no rate limit)
+    RATE_LIMIT_BURST: int = 40
+    RATE_LIMIT_REDIS: bool = True  # shared bucket across replicas (local fallback)
+    RATE_LIMIT_LEASE: int = 5      # tokens a replica takes from Redis at a time
+    # Max concurrent tools/call per client and tool, e.g. "long_task=2,slow_square=4,*=16"
+    TOOL_CONCURRENCY_LIMITS: str | None = None
+
+    # --- Admission control / load shedding (per replica, 503 when over capacity) ---
+    # POST /mcp bodies are read before auth to classify them: larger ones get 413 (0 = no cap)
+    MCP_MAX_BODY_BYTES: int = 4 * 1024 * 1024
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_IN_FLIGHT: int = 256       # concurrent POST/DELETE /mcp
+    ADMISSION_LONG_MAX_IN_FLIGHT: int = 64   # share of those slots long tools may hold
+    ADMISSION_MAX_STREAMS: int = 512         # standalone GET /mcp SSE streams
+    ADMISSION_QUEUE_SIZE: int = 64           # waiters when full; beyond that, 503 at once
+    ADMISSION_QUEUE_TIMEOUT_MS: int = 500
+    # Low-priority tools (admitted after everything else), comma-separated
+    ADMISSION_LONG_TOOLS: str | None = "long_task,slow_square,stream_report,read_artifact,summarize_via_client_llm,count_primes"
+
+    # --- Offloaded tools (@offload("thread"|"process"), see offload.py) ---
+    OFFLOAD_THREAD_WORKERS: int = 8
+    OFFLOAD_PROCESS_WORKERS: int = 0    # 0 = os.cpu_count()
+    OFFLOAD_START_METHOD: Literal["spawn", "forkserver", "fork"] = "spawn"
+    OFFLOAD_MAX_QUEUED: int = 256       # per pool, beyond busy workers; then fail fast
+
+    # --- Streaming tools (@streaming, see streaming.py) ---
+    STREAM_COALESCE_BYTES: int = 8192          # batch small chunks into one notification up to this size
+    STREAM_COALESCE_MS: int = 50               # ...but never hold a chunk longer than this
+    STREAM_BUFFER_MAX_BYTES: int = 8_000_000   # non-streaming callers get the joined output, up to this
+
+    # --- Large-payload resources (artifact://, see artifacts.py) ---
+    ARTIFACTS_DIR: str | None = None                 # files served as artifact://<file name>; None = Redis only
+    ARTIFACT_CHUNK_BYTES: int = 256 * 1024           # Redis chunk size and streamed chunk size
+    ARTIFACT_MAX_RANGE_BYTES: int = 4 * 1024 * 1024  # largest single artifact://.../{offset}/{length} read
+
+    # --- Response compression (/mcp, see compression.py) ---
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: str = "zstd,gzip"        # server preference; zstd needs prynai-mcp[zstd]
+    COMPRESSION_MIN_BYTES: int = 1024                # smaller responses go out as is
+    # >0: small SSE messages wait up to this long for a big one, so the stream can still be
+    # compressed; delays early events (progress, first chunk) by as much, hence off
+    COMPRESSION_SSE_HOLD_MS: int = 0
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_THREAD_MIN_BYTES: int = 64 * 1024    # compress messages this big off the event loop
+
+    # --- Sessions (see sessions.py / event_store.py) ---
+    # redis: any worker/replica can adopt a session and replay its events; memory: worker-local
+    # resumability only; none: plain SDK sessions
+    SESSION_STORE: Literal["redis", "memory", "none"] = "redis"
+    SESSION_TTL_SECONDS: int = 3600     # idle sessions (and their events) are forgotten after this
+    # Store sent messages so clients can resume with Last-Event-ID. Off by default: with
+    # SESSION_STORE=redis it is one XADD per message (add p50 23.8 -> 41.9ms, 219 -> 153 req/s)
+    EVENT_STORE_ENABLED: bool = False
+    EVENT_STORE_MAX_EVENTS: int = 1000  # per session, oldest trimmed first
+
+    # --- Launcher (prynai-mcp script, see launcher.py) ---
+    SERVER_HOST: str = "127.0.0.1"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0             # 0 = os.cpu_count()
+    SERVER_DRAIN_SECONDS: float = 25.0  # SIGTERM: finish in-flight requests for up to this long
+    SSL_CERTFILE: str | None = None
+    SSL_KEYFILE: str | None = None
+
+    # --- Logging (JSON to stdout from a writer thread) ---
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000  # records buffered for the writer thread; overflow is dropped
+    # Per logger prefix, comma-separated: records/sec token bucket, and kept fraction
+    # e.g. LOG_RATE_LIMITS="uvicorn.access=100"  LOG_SAMPLE="mcp.server.lowlevel=0.1"
+    LOG_RATE_LIMITS: str | None = None
+    LOG_SAMPLE: str | None = None
+
+    # --- Tracing (optional extra: pip install "prynai-mcp[otel]") ---
+    OTEL_ENABLED: bool = False
+    OTEL_EXPORTER: Literal["console", "file", "memory", "otlp"] = "console"
+    OTEL_FILE_PATH: str = "traces.jsonl"  # OTEL_EXPORTER=file: one JSON span per line
+    OTEL_SERVICE_NAME: str = "prynai-mcp"
+
     # --- OAuth / Entra ID ---
     AUTH_REQUIRED: bool = False  # set True in docker-compose to enforce
     ENTRA_TENANT_ID: str | None = None  # e.g., "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee"
@@ -16,6 +123,18 @@ class Settings(BaseSettings):
     ENTRA_REQUIRED_SCOPES: str | None = None
     # Optional app roles list, comma-separated. Example: "Mcp.Invoke"
     ENTRA_REQUIRED_APP_ROLES: str | None = None
+    # Optional JWKS override: https URL of a stub server, or a local JWKS file (path or file://)
+    ENTRA_JWKS_URL: str | None = None
+    JWKS_REFRESH_SECONDS: int = 3600  # used when the JWKS response has no Cache-Control max-age
+    JWKS_UNKNOWN_KID_COOLDOWN_SECONDS: int = 30  # min gap between refetches for unknown 'kid's
+    JWKS_HTTP_TIMEOUT_SECONDS: float = 5.0
+    # Optional JSON file of AUTH_REQUIRED / ENTRA_* values that override the above and can
+    # change at runtime: re-read when it changes (polled every AUTH_POLICY_POLL_SECONDS,
+    # 0 = only on SIGHUP / reload_policy()), see auth/policy.py
+    AUTH_POLICY_FILE: str | None = None
+    AUTH_POLICY_POLL_SECONDS: float = 10.0
+    # Max validated tokens kept in the per-process verified-token cache (0 disables)
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 4096
 
     @property
     def issuer(self) -> str | None:
@@ -25,6 +144,8 @@ class Settings(BaseSettings):
     @property
     def jwks_url(self) -> str | None:
         # JWKS endpoint to fetch signing keys
+        if self.ENTRA_JWKS_URL:
+            return self.ENTRA_JWKS_URL
         return f"https://login.microsoftonline.com/{self.ENTRA_TENANT_ID}/discovery/v2.0/keys" if self.ENTRA_TENANT_ID else None
 
 settings = Settings()
@@ -0,0 +1,281 @@
+"""
+Redis-backed counter with opt-in high-throughput modes (COUNTER_MODE).
+
+- single   : one INCRBY on prynai:counter per bump (default, previous behaviour).
+- sharded  : increments spread over COUNTER_SHARDS sub-keys (prynai:counter:<i>);
+             reads sum base + shards with one MGET. Sub-keys hash to different
+             cluster slots, so no single hot key/shard. On Cluster the read is one
+             MGET per slot (mget_nonatomic), so the sum is not a point-in-time
+             snapshot of all shards.
+- buffered : write-behind. Bumps accumulate locally and are flushed as ONE INCRBY
+             every COUNTER_FLUSH_INTERVAL_MS (group commit).
+
+COUNTER_CONSISTENCY:
+- exact    : read-your-writes. sharded returns the summed total in the same round
+             trip as the increment; buffered callers wait for their batch's flush and
+             get the exact post-increment value (batch result linearized per caller).
+- eventual : bumps return immediately with a local estimate; sharded reads use a
+             sum cached for one flush interval; buffered reads add unflushed deltas to
+             the Redis value, re-read once it is a flush interval old.
+             invalidate() (called on the pub/sub invalidation of the key) drops the
+             cached value, so other replicas' flushes and set()s show up right away.
+
+`set()` writes the base key and clears shards atomically (MULTI/EXEC), except on
+Cluster: the keys span slots there, so increments racing a reset may be lost.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from redis.asyncio import Redis
+from redis.asyncio.cluster import RedisCluster
+
+from .config import settings
+from .redis_client import ensure_redis
+
+log = logging.getLogger(__name__)
+
+RedisGetter = Callable[[], Awaitable[Redis]]
+FlushHook = Callable[[], Awaitable[None]]
+
+
+class Counter:
+    """Single-key counter (the original INCRBY path)."""
+
+    write_behind = False  # True when increments reach Redis later, in batches
+
+    def __init__(self, key: str, redis: RedisGetter = ensure_redis):
+        self.key = key
+        self._redis = redis
+
+    async def incr(self, step: int) -> int:
+        r = await self._redis()
+        return int(await r.incrby(self.key, step))
+
+    async def get(self) -> int:
+        r = await self._redis()
+        val = await r.get(self.key)
+        return int(val) if val is not None else 0
+
+    async def set(self, value: int) -> None:
+        r = await self._redis()
+        await r.set(self.key, value)
+
+    def invalidate(self) -> None:
+        """The key changed elsewhere: forget any locally cached value."""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class ShardedCounter(Counter):
+    def __init__(self, key: str, shards: int, exact: bool, cache_seconds: float, redis: RedisGetter = ensure_redis):
+        super().__init__(key, redis)
+        self.shard_keys = [f"{key}:{i}" for i in range(max(1, shards))]
+        self.exact = exact
+        self.cache_seconds = cache_seconds
+        self._sum: Optional[int] = None
+        self._sum_at = 0.0
+
+    async def _read_sum(self) -> int:
+        r = await self._redis()
+        keys = [self.key, *self.shard_keys]
+        # Cluster: MGET must stay in one slot; mget_nonatomic sends one per slot
+        vals = await (r.mget_nonatomic(keys) if isinstance(r, RedisCluster) else r.mget(keys))
+        total = sum(int(v) for v in vals if v is not None)
+        self._sum, self._sum_at = total, time.monotonic()
+        return total
+
+    def _fresh(self) -> bool:
+        return self._sum is not None and time.monotonic() - self._sum_at < self.cache_seconds
+
+    async def incr(self, step: int) -> int:
+        r = await self._redis()
+        shard = random.choice(self.shard_keys)
+        if not self.exact or isinstance(r, RedisCluster):
+            await r.incrby(shard, step)
+            if not self.exact and self._fresh():
+                self._sum += step
+                return self._sum
+            return await self._read_sum()
+        # Increment + read the total in one round trip
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.incrby(shard, step)
+            pipe.mget([self.key, *self.shard_keys])
+            _, vals = await pipe.execute()
+        total = sum(int(v) for v in vals if v is not None)
+        self._sum, self._sum_at = total, time.monotonic()
+        return total
+
+    async def get(self) -> int:
+        if not self.exact and self._fresh():
+            return self._sum
+        return await self._read_sum()
+
+    def invalidate(self) -> None:
+        self._sum = None
+
+    async def set(self, value: int) -> None:
+        r = await self._redis()
+        if isinstance(r, RedisCluster):
+            # No MULTI across slots: clear the shards (one DEL per slot), then write the base
+            await r.delete(*self.shard_keys)
+            await r.set(self.key, value)
+        else:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.set(self.key, value)
+                pipe.delete(*self.shard_keys)
+                await pipe.execute()
+        self._sum, self._sum_at = value, time.monotonic()
+
+
+class BufferedCounter(Counter):
+    write_behind = True
+
+    def __init__(
+        self,
+        key: str,
+        interval: float,
+        exact: bool,
+        redis: RedisGetter = ensure_redis,
+        on_flush: Optional[FlushHook] = None,
+    ):
+        super().__init__(key, redis)
+        self.interval = interval
+        self.exact = exact
+        self.on_flush = on_flush
+        self._pending = 0
+        self._flushing = 0  # taken from _pending, INCRBY in flight
+        self._waiters: List[Tuple[int, asyncio.Future]] = []  # (step, future) in arrival order
+        self._last: Optional[int] = None  # Redis value after our last flush / read
+        self._last_at = 0.0
+        self._generation = 0  # bumped by invalidate(); guards racing reads
+        self._wake = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop(), name="prynai-counter-flush")
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        try:
+            await self.flush()  # do not lose buffered increments on shutdown
+        except Exception as e:
+            log.error("counter: %d buffered increments lost on shutdown: %s", self._pending, e)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.interval)  # collect a batch
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning("counter flush failed, will retry: %s", e)
+                self._wake.set()
+
+    async def flush(self) -> None:
+        """Write all pending increments with one INCRBY and resolve waiting callers."""
+        async with self._lock:
+            if not self._pending:
+                return
+            step, waiters = self._pending, self._waiters
+            self._pending, self._waiters, self._flushing = 0, [], step
+            try:
+                r = await self._redis()
+                total = int(await r.incrby(self.key, step))
+            except Exception:
+                # Put the batch back (ahead of newer bumps) so nothing is lost
+                self._pending += step
+                self._waiters = waiters + self._waiters
+                raise
+            finally:
+                self._flushing = 0
+            self._last, self._last_at = total, time.monotonic()
+            # Linearize: the batch landed at `total`; each caller sees the value right after its own step
+            remaining = step
+            for s, fut in waiters:
+                if not fut.done():
+                    fut.set_result(total - remaining + s)
+                remaining -= s
+        if self.on_flush is not None:
+            await self.on_flush()
+
+    def _fresh(self) -> bool:
+        return self._last is not None and time.monotonic() - self._last_at < self.interval
+
+    async def _base(self) -> int:
+        """Redis value to add unflushed deltas to; re-read once a flush interval old."""
+        if self._fresh():
+            return self._last
+        # Under the lock no batch is in flight, so the read is not counted twice with it
+        async with self._lock:
+            if self._fresh():
+                return self._last
+            generation = self._generation
+            value = await super().get()
+            if generation == self._generation:
+                self._last, self._last_at = value, time.monotonic()
+            return value
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._last = None
+
+    async def incr(self, step: int) -> int:
+        if self._flusher is None:
+            await self.start()
+        if not self.exact:
+            base = await self._base()
+            self._pending += step
+            self._wake.set()
+            return base + self._flushing + self._pending
+        self._pending += step
+        self._wake.set()
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append((step, fut))
+        return await fut
+
+    async def get(self) -> int:
+        if self.exact:
+            await self.flush()
+            return await super().get()
+        base = await self._base()
+        return base + self._flushing + self._pending
+
+    async def set(self, value: int) -> None:
+        async with self._lock:
+            # Increments buffered before the set are superseded by it
+            waiters, self._waiters, self._pending = self._waiters, [], 0
+            await super().set(value)
+            self._last, self._last_at = value, time.monotonic()
+            for _, fut in waiters:
+                if not fut.done():
+                    fut.set_result(value)
+
+
+def make_counter(key: str, on_flush: Optional[FlushHook] = None, redis: RedisGetter = ensure_redis) -> Counter:
+    """Build the counter selected by COUNTER_MODE / COUNTER_CONSISTENCY."""
+    exact = settings.COUNTER_CONSISTENCY == "exact"
+    interval = settings.COUNTER_FLUSH_INTERVAL_MS / 1000.0
+    if settings.COUNTER_MODE == "sharded":
+        return ShardedCounter(key, settings.COUNTER_SHARDS, exact, cache_seconds=interval, redis=redis)
+    if settings.COUNTER_MODE == "buffered":
+        return BufferedCounter(key, interval, exact, redis=redis, on_flush=on_flush)
+    return Counter(key, redis)
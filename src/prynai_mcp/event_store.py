@@ -0,0 +1,187 @@
+"""
+Resumable SSE for streamable HTTP: per-session event stores (Last-Event-ID).
+
+- Every message the server sends on a session (responses, progress, logs, resource
+  updates) is stored with an id before it is written to the SSE stream; a client that
+  reconnects with GET + Last-Event-ID gets everything after that id.
+- RedisEventStore: one Redis Stream per session (prynai:events:{<session id>}, XADD
+  MAXLEN ~EVENT_STORE_MAX_EVENTS, expires with the session). Event ids are the stream
+  entry ids, so any worker/replica can replay. A resumed request stream keeps tailing
+  the Redis Stream (XREAD BLOCK) until the request's final response, so it completes
+  even when the request itself is running on another worker.
+- MemoryEventStore: same contract inside one process (SESSION_STORE=memory); a resumed
+  stream continues from the transport's live messages.
+- Opt-in (EVENT_STORE_ENABLED): storing costs a Redis round trip per message sent.
+- One store object per session (the SDK's stream ids, e.g. "_GET_stream", are only
+  unique within a session).
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import anyio
+from mcp.server.streamable_http import (
+    GET_STREAM_KEY,
+    EventCallback,
+    EventId,
+    EventMessage,
+    EventStore,
+    StreamId,
+)
+from mcp.types import JSONRPCError, JSONRPCMessage, JSONRPCResponse
+from redis.exceptions import ResponseError
+
+from .config import settings
+from .redis_client import ensure_redis, pipeline
+
+log = logging.getLogger(__name__)
+
+_REDIS_PREFIX = "prynai:events:"
+# XREAD BLOCK must return well within the client's socket timeout
+_TAIL_BLOCK_MS = max(100, min(5000, int(settings.REDIS_SOCKET_TIMEOUT_SECONDS * 500)))
+
+# Per-process totals across all session stores (/metrics)
+_stats: Dict[str, int] = {"stored": 0, "replays": 0, "replayed": 0, "errors": 0}
+
+
+def event_store_stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+def events_key(session_id: str) -> str:
+    return f"{_REDIS_PREFIX}{{{session_id}}}"
+
+
+def _is_final(stream_id: StreamId, message: JSONRPCMessage) -> bool:
+    """The response that closes a request stream (request streams are keyed by request id)."""
+    root = message.root
+    return isinstance(root, (JSONRPCResponse, JSONRPCError)) and str(root.id) == stream_id
+
+
+class RedisEventStore(EventStore):
+    def __init__(self, session_id: str, max_events: int, ttl_seconds: int):
+        self.key = events_key(session_id)
+        self.max_events = max(1, max_events)
+        self.ttl_seconds = ttl_seconds
+        self._expire_at = 0.0
+
+    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage) -> EventId:
+        payload = message.model_dump_json(by_alias=True, exclude_none=True)
+        now = time.monotonic()
+        try:
+            async with pipeline() as pipe:
+                pipe.xadd(self.key, {"s": stream_id, "m": payload}, maxlen=self.max_events, approximate=True)
+                if now >= self._expire_at:
+                    # Refresh the TTL now and then, not on every event
+                    pipe.expire(self.key, self.ttl_seconds)
+                    self._expire_at = now + self.ttl_seconds / 4
+                results = await pipe.execute()
+        except Exception as e:
+            # Raising here would stop the transport's message router; send the event without an id
+            _stats["errors"] += 1
+            log.warning("event store: store failed: %s", e)
+            return None  # type: ignore[return-value]
+        _stats["stored"] += 1
+        return results[0]
+
+    async def replay_events_after(self, last_event_id: EventId, send_callback: EventCallback) -> Optional[StreamId]:
+        r = await ensure_redis()
+        try:
+            first = await r.xrange(self.key, min=last_event_id, max=last_event_id, count=1)
+        except ResponseError:
+            first = []  # not a stream entry id
+        if not first:
+            log.info("event store: %s not found (expired or trimmed), nothing to replay", last_event_id)
+            return None
+        stream_id = first[0][1]["s"]
+        _stats["replays"] += 1
+        if _is_final(stream_id, JSONRPCMessage.model_validate_json(first[0][1]["m"])):
+            return None  # the client already has the final response
+
+        cursor = last_event_id
+        while True:
+            entries = await r.xrange(self.key, min=f"({cursor}", count=500)
+            if not entries:
+                break
+            for entry_id, fields in entries:
+                cursor = entry_id
+                if fields["s"] != stream_id:
+                    continue
+                message = JSONRPCMessage.model_validate_json(fields["m"])
+                if not await self._send(send_callback, message, entry_id) or _is_final(stream_id, message):
+                    return None
+        if stream_id == GET_STREAM_KEY:
+            # The standalone stream continues from this worker's (adopted) session
+            return stream_id
+        return await self._tail(r, stream_id, cursor, send_callback)
+
+    async def _tail(self, r, stream_id: StreamId, cursor: str, send_callback: EventCallback) -> Optional[StreamId]:
+        """Follow a request stream through Redis until its final response (or the client leaves)."""
+        while True:
+            batches = await r.xread({self.key: cursor}, block=_TAIL_BLOCK_MS, count=100)
+            for _, entries in batches or ():
+                for entry_id, fields in entries:
+                    cursor = entry_id
+                    if fields["s"] != stream_id:
+                        continue
+                    message = JSONRPCMessage.model_validate_json(fields["m"])
+                    if not await self._send(send_callback, message, entry_id):
+                        return None
+                    if _is_final(stream_id, message):
+                        return None
+            if not batches and not await r.exists(self.key):
+                return None  # session gone
+
+    @staticmethod
+    async def _send(send_callback: EventCallback, message: JSONRPCMessage, event_id: str) -> bool:
+        try:
+            await send_callback(EventMessage(message, event_id))
+            _stats["replayed"] += 1
+            return True
+        except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+            return False  # client disconnected again
+
+
+class MemoryEventStore(EventStore):
+    """Bounded in-process history for one session."""
+
+    def __init__(self, max_events: int):
+        self._events: Deque[Tuple[EventId, StreamId, JSONRPCMessage]] = deque(maxlen=max(1, max_events))
+        self._index: Dict[EventId, StreamId] = {}
+        self._seq = itertools.count(1)
+
+    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage) -> EventId:
+        if len(self._events) == self._events.maxlen:
+            self._index.pop(self._events[0][0], None)
+        event_id = str(next(self._seq))
+        self._events.append((event_id, stream_id, message))
+        self._index[event_id] = stream_id
+        _stats["stored"] += 1
+        return event_id
+
+    async def replay_events_after(self, last_event_id: EventId, send_callback: EventCallback) -> Optional[StreamId]:
+        stream_id = self._index.get(last_event_id)
+        if stream_id is None:
+            return None
+        _stats["replays"] += 1
+        after = int(last_event_id)
+        for event_id, sid, message in list(self._events):
+            if sid == stream_id and int(event_id) > after:
+                await send_callback(EventMessage(message, event_id))
+                _stats["replayed"] += 1
+        return stream_id
+
+
+def make_event_store(session_id: str) -> Optional[EventStore]:
+    if not settings.EVENT_STORE_ENABLED:
+        return None
+    if settings.SESSION_STORE == "redis":
+        return RedisEventStore(session_id, settings.EVENT_STORE_MAX_EVENTS, settings.SESSION_TTL_SECONDS)
+    if settings.SESSION_STORE == "memory":
+        return MemoryEventStore(settings.EVENT_STORE_MAX_EVENTS)
+    return None
@@ -0,0 +1,73 @@
+"""
+One wrapper around FastMCP's tools/call, resources/read and prompts/get handlers.
+
+- Metrics, tracing and logging each register a hook with add_handler_hook(mcp, name,
+  hook); the low-level handlers are wrapped once, on the first registration, whatever
+  the number of hooks.
+- A hook is hook(call) -> context manager entered around the handler. call.result is
+  set once the handler returned (None if it raised), so a hook can look at it on exit.
+- A hook added later runs outside the earlier ones, as if it had wrapped the handler last.
+- Registering the same name again replaces that hook, so instrumenting twice is harmless.
+"""
+
+from __future__ import annotations
+
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Dict, Optional, Tuple
+
+import mcp.types as types
+from mcp.server.fastmcp import FastMCP
+
+# request type -> (kind, JSON-RPC method, name or URI of what is called)
+_TARGETS: Tuple[Tuple[type, str, str, Callable[[Any], str]], ...] = (
+    (types.CallToolRequest, "tool", "tools/call", lambda req: req.params.name),
+    (types.ReadResourceRequest, "resource", "resources/read", lambda req: str(req.params.uri)),
+    (types.GetPromptRequest, "prompt", "prompts/get", lambda req: req.params.name),
+)
+
+
+@dataclass
+class HandlerCall:
+    kind: str    # "tool" | "resource" | "prompt"
+    method: str  # "tools/call" | "resources/read" | "prompts/get"
+    name: str    # tool/prompt name or resource URI, as requested
+    request: Any
+    result: Optional[Any] = None  # the handler's ServerResult once it returned
+
+    @property
+    def is_error(self) -> bool:
+        """Tool exceptions come back as isError results, not raised."""
+        return self.result is not None and bool(getattr(self.result.root, "isError", False))
+
+
+Hook = Callable[[HandlerCall], ContextManager[Any]]
+
+
+def add_handler_hook(mcp: FastMCP, name: str, hook: Hook) -> None:
+    """Run hook(call) around every tools/call, resources/read and prompts/get of mcp."""
+    hooks: Optional[Dict[str, Hook]] = getattr(mcp, "_prynai_handler_hooks", None)
+    if hooks is None:
+        hooks = {}
+        handlers = mcp._mcp_server.request_handlers
+        for req_type, kind, method, target in _TARGETS:
+            handler = handlers.get(req_type)
+            if handler is not None:
+                handlers[req_type] = _hooked_handler(hooks, handler, kind, method, target)
+        mcp._prynai_handler_hooks = hooks  # type: ignore[attr-defined]
+    hooks.pop(name, None)
+    hooks[name] = hook
+
+
+def _hooked_handler(
+    hooks: Dict[str, Hook], handler: Callable[[Any], Any], kind: str, method: str, target: Callable[[Any], str]
+) -> Callable[[Any], Any]:
+    async def hooked(req: Any) -> Any:
+        call = HandlerCall(kind, method, target(req), req)
+        with ExitStack() as stack:
+            for hook in reversed(list(hooks.values())):
+                stack.enter_context(hook(call))
+            call.result = await handler(req)
+            return call.result
+
+    return hooked
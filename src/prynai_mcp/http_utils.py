@@ -0,0 +1,172 @@
+"""
+Small pure-ASGI helpers shared by the /mcp middlewares (rate limits, admission control).
+
+- buffer_body(): read the request body once and hand back a receive() that replays it.
+  Bodies over MCP_MAX_BODY_BYTES raise BodyTooLarge: from Content-Length before reading
+  anything, else as soon as the bytes read pass the limit (answer with
+  payload_too_large()).
+- peek_tool_name() / peek_request_id(): look into a JSON-RPC body without a full parse
+  unless it is a tools/call.
+- is_session_control(): initialize, ping, notifications and responses, which limits
+  and load shedding let through (refusing one breaks the client's session).
+- reject(): HTTP error + Retry-After + JSON-RPC error body, so clients that only look
+  at the JSON-RPC layer still see why the request was refused.
+- install_fast_sse_encode(): skip sse_starlette's per-event line splitting when the data
+  is a single line (always, for JSON-RPC messages). It relies on sse_starlette 3.0
+  internals (pinned in pyproject.toml) and keeps the original encoder if they changed.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+from typing import Any, List, Optional, Tuple
+
+from starlette.types import Message, Receive, Scope, Send
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+
+class BodyTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"request body over {limit} bytes")
+        self.limit = limit
+
+
+def _content_length(scope: Scope) -> Optional[int]:
+    for name, value in scope.get("headers") or ():
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def buffer_body(scope: Scope, receive: Receive) -> Tuple[bytes, Receive]:
+    limit = settings.MCP_MAX_BODY_BYTES
+    if limit > 0 and (_content_length(scope) or 0) > limit:
+        raise BodyTooLarge(limit)
+    chunks: List[bytes] = []
+    messages: List[Message] = []
+    size = 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if limit > 0 and size > limit:
+            raise BodyTooLarge(limit)
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+
+    async def replay() -> Message:
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return b"".join(chunks), replay
+
+
+def peek_tool_name(body: bytes) -> Optional[str]:
+    if b'"tools/call"' not in body:
+        return None
+    try:
+        msg = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(msg, dict) and msg.get("method") == "tools/call":
+        name = (msg.get("params") or {}).get("name")
+        return name if isinstance(name, str) else None
+    return None
+
+
+def is_session_control(body: bytes) -> bool:
+    """
+    initialize, ping, notifications/* and JSON-RPC responses (to sampling/elicitation).
+    They are cheap, and the MCP SDK client tears its whole session down when one of
+    them is refused, so the retry would cost a new handshake on top.
+    """
+    if b'"method"' in body and not (b'"notifications/' in body or b'"initialize"' in body or b'"ping"' in body):
+        return False
+    try:
+        msg = json.loads(body)
+    except ValueError:
+        return False
+    if not isinstance(msg, dict):
+        return False
+    method = msg.get("method")
+    if method is None:
+        return "result" in msg or "error" in msg
+    return method in ("initialize", "ping") or (isinstance(method, str) and method.startswith("notifications/"))
+
+
+def peek_request_id(body: bytes) -> Any:
+    try:
+        msg = json.loads(body)
+    except ValueError:
+        return None
+    return msg.get("id") if isinstance(msg, dict) else None
+
+
+async def reject(
+    send: Send, status: int, retry_after: Optional[float], code: int, message: str, request_id: Any = None
+) -> None:
+    error: dict = {"code": code, "message": message}
+    headers = [(b"content-type", b"application/json")]
+    if retry_after is not None:
+        seconds = max(1, math.ceil(retry_after))
+        error["data"] = {"retryAfter": seconds}
+        headers.append((b"retry-after", str(seconds).encode("latin-1")))
+    body = json.dumps({"jsonrpc": "2.0", "id": request_id, "error": error}).encode("utf-8")
+    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def payload_too_large(send: Send, error: BodyTooLarge) -> None:
+    """413 for a BodyTooLarge; not retryable, so no Retry-After."""
+    await reject(send, 413, None, -32600, f"Request body too large (limit {error.limit} bytes)")
+
+
+def install_fast_sse_encode() -> None:
+    """
+    sse_starlette splits every event's data on line breaks with a regex before writing
+    it (~12ms per MiB, a third of the server's CPU when serving large payloads). The SDK's
+    data is one line of JSON, since JSON escapes newlines inside strings, so events with
+    no line break in the data are written directly; anything else takes the original path.
+    """
+    from sse_starlette.event import ServerSentEvent
+
+    original = ServerSentEvent.encode
+    if getattr(original, "_prynai_fast", False):
+        return
+    probe = ServerSentEvent("{}", id="1", event="message")
+    if not hasattr(probe, "_sep") or not hasattr(ServerSentEvent, "_LINE_SEP_EXPR"):
+        log.warning("sse_starlette internals changed; keeping its own SSE encoder")
+        return
+
+    def encode(self: ServerSentEvent) -> bytes:
+        data = self.data
+        if not isinstance(data, str) or "\n" in data or "\r" in data or self.comment is not None or self.retry is not None:
+            return original(self)
+        sep = self._sep
+        head = ""
+        if self.id is not None:
+            head += "id: " + self._LINE_SEP_EXPR.sub("", self.id) + sep
+        if self.event is not None:
+            head += "event: " + self._LINE_SEP_EXPR.sub("", self.event) + sep
+        return f"{head}data: {data}{sep}{sep}".encode("utf-8")
+
+    if encode(probe) != original(probe):
+        log.warning("sse_starlette encodes events differently; keeping its own SSE encoder")
+        return
+    encode._prynai_fast = True  # type: ignore[attr-defined]
+    ServerSentEvent.encode = encode  # type: ignore[method-assign]
+
@@ -0,0 +1,80 @@
+"""
+Production launcher behind the `prynai-mcp` script (and `python -m prynai_mcp.server`).
+
+- Serves prynai_mcp.app:app (auth, limits, metrics and all) with SERVER_WORKERS uvicorn
+  worker processes (0 = CPU count) sharing one listening socket on SERVER_HOST:SERVER_PORT;
+  TLS when SSL_CERTFILE / SSL_KEYFILE are set.
+- Shared nothing: workers are spawned, each imports the app and runs its own lifespan
+  (Redis pool, JWKS prefetch, pub/sub listener, offload pools). A dead worker is replaced.
+- Sessions: any worker can serve any session via the Redis session store (sessions.py).
+- SIGTERM/SIGINT: the supervisor forwards SIGTERM; each worker stops accepting, ends its
+  standalone SSE streams (admission.drain) and lets in-flight requests finish for up to
+  SERVER_DRAIN_SECONDS before cancelling them and running the app's shutdown.
+- uvicorn's own logging config is skipped (log_config=None); logging_setup owns it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+from types import FrameType
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from .config import settings
+from .logging_setup import configure_logging
+
+APP = "prynai_mcp.app:app"
+
+
+def _begin_drain() -> None:
+    # Imported lazily: the supervisor process never loads the app
+    from .admission import admission
+
+    admission.drain()
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server that starts draining SSE streams as soon as the exit signal arrives."""
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if not self.should_exit:
+            try:
+                # Signal handlers run on the main thread, which is running the event loop
+                asyncio.get_running_loop().call_soon_threadsafe(_begin_drain)
+            except RuntimeError:
+                pass
+        super().handle_exit(sig, frame)
+
+
+def worker_count() -> int:
+    return settings.SERVER_WORKERS or os.cpu_count() or 1
+
+
+def build_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        APP,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=worker_count(),
+        lifespan="on",
+        log_config=None,
+        log_level=settings.LOG_LEVEL.lower(),
+        timeout_graceful_shutdown=math.ceil(settings.SERVER_DRAIN_SECONDS),
+        ssl_certfile=settings.SSL_CERTFILE,
+        ssl_keyfile=settings.SSL_KEYFILE,
+    )
+
+
+def run() -> None:
+    configure_logging()
+    config = build_config()
+    server = DrainingServer(config)
+    if config.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
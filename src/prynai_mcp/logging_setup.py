@@ -0,0 +1,225 @@
+"""
+Non-blocking JSON logging.
+
+- configure_logging(): the root logger gets a QueueHandler; a QueueListener thread does
+  the JSON formatting and the (possibly blocking) stdout write. The event loop only
+  pays for building the record and a put_nowait on a bounded queue (LOG_QUEUE_SIZE);
+  when stdout cannot keep up, records are dropped and counted instead of stalling requests.
+- Request context: session id, MCP tool/resource/prompt and the caller's token oid/azp
+  are kept in a contextvar (bind_log_context / instrument_mcp, a handler hook) and
+  added to every line.
+- Noisy loggers: LOG_RATE_LIMITS="uvicorn.access=100,mcp.server=20" (records/sec, token
+  bucket per logger prefix) and LOG_SAMPLE="uvicorn.access=0.1" (keep 10%). WARNING and
+  above are never sampled or rate limited. Suppressed counts appear as "suppressed" on
+  the next record that gets through.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, ContextManager, Dict, Iterator, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+from .config import settings
+from .handler_hooks import HandlerCall, add_handler_hook
+
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("prynai_log_context", default={})
+
+
+@contextmanager
+def bind_log_context(**fields: Any) -> Iterator[None]:
+    """Add fields (e.g. session_id=..., tool=...) to every log record in this context."""
+    token = _log_context.set({**_log_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+# ---- formatting (listener thread) -------------------------------------------
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {"level": record.levelname.lower(), "msg": record.getMessage(), "logger": record.name}
+        ctx = getattr(record, "ctx", None)
+        if ctx:
+            payload.update(ctx)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            payload["suppressed"] = suppressed
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+# ---- loop side: context capture, sampling, bounded enqueue --------------------
+
+
+class _Rule:
+    __slots__ = ("rate", "sample", "tokens", "stamp", "dropped")
+
+    def __init__(self, rate: Optional[float], sample: Optional[float]):
+        self.rate = rate
+        self.sample = sample
+        self.tokens = rate or 0.0
+        self.stamp = time.monotonic()
+        self.dropped = 0
+
+
+def _parse_pairs(spec: Optional[str]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            out[name.strip()] = float(value)
+    return out
+
+
+class NoiseFilter(logging.Filter):
+    """Per-logger-prefix sampling and token-bucket rate limiting (below WARNING only)."""
+
+    def __init__(self, rates: Dict[str, float], samples: Dict[str, float]):
+        super().__init__()
+        self._rules = {p: _Rule(rates.get(p), samples.get(p)) for p in set(rates) | set(samples)}
+        self._by_logger: Dict[str, Optional[_Rule]] = {}
+
+    def _rule(self, name: str) -> Optional[_Rule]:
+        try:
+            return self._by_logger[name]
+        except KeyError:
+            # Longest matching prefix ("uvicorn.access" beats "uvicorn")
+            matches = [p for p in self._rules if name == p or name.startswith(p + ".")]
+            rule = self._rules[max(matches, key=len)] if matches else None
+            self._by_logger[name] = rule
+            return rule
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._rules:
+            return True
+        rule = self._rule(record.name)
+        if rule is None:
+            return True
+        if rule.sample is not None and random.random() >= rule.sample:
+            rule.dropped += 1
+            return False
+        if rule.rate is not None:
+            now = time.monotonic()
+            rule.tokens = min(rule.rate, rule.tokens + (now - rule.stamp) * rule.rate)
+            rule.stamp = now
+            if rule.tokens < 1.0:
+                rule.dropped += 1
+                return False
+            rule.tokens -= 1.0
+        if rule.dropped:
+            record.suppressed, rule.dropped = rule.dropped, 0
+        return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Captures the request context and defers ALL formatting to the listener thread.
+    Never blocks: a full queue drops the record (counted in `dropped`).
+    """
+
+    def __init__(self, q: "queue.Queue[logging.LogRecord]"):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Resolve %-args now (they may be mutated later); keep exc_info for the formatter thread
+        record.msg = record.getMessage()
+        record.args = None
+        record.ctx = _log_context.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# ---- setup -------------------------------------------------------------------
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[AsyncQueueHandler] = None
+
+
+def configure_logging() -> None:
+    """Install the queue-based JSON pipeline on the root logger (idempotent)."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(JsonFormatter())
+
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(0, settings.LOG_QUEUE_SIZE))
+    _handler = AsyncQueueHandler(q)
+    _handler.addFilter(NoiseFilter(_parse_pairs(settings.LOG_RATE_LIMITS), _parse_pairs(settings.LOG_SAMPLE)))
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    # uvicorn installs its own (blocking) stream handlers; route its loggers through ours
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        lg = logging.getLogger(name)
+        lg.handlers = []
+        lg.propagate = True
+
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_stats() -> Dict[str, int]:
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+
+# ---- MCP request context -------------------------------------------------------
+
+
+def _request_fields(mcp: FastMCP) -> Dict[str, Any]:
+    try:
+        rc = mcp._mcp_server.request_context
+    except LookupError:
+        return {}
+    fields: Dict[str, Any] = {}
+    request = rc.request
+    if request is not None:
+        fields["session_id"] = request.headers.get("mcp-session-id")
+        claims = request.scope.get("state", {}).get("user_claims") or {}
+        fields["oid"] = claims.get("oid")
+        fields["azp"] = claims.get("azp") or claims.get("appid")
+    return fields
+
+
+def instrument_mcp(mcp: FastMCP) -> None:
+    """Bind session id, caller identity and tool/resource/prompt name around each handler."""
+
+    def bound(call: HandlerCall) -> ContextManager[None]:
+        return bind_log_context(**_request_fields(mcp), **{call.kind: call.name})
+
+    add_handler_hook(mcp, "logging", bound)
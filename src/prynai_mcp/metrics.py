@@ -0,0 +1,318 @@
+"""
+Prometheus metrics (served at /metrics, open like the health routes).
+
+- MCP: per tool / resource / prompt call counts, errors and latency histograms
+  (instrument_mcp adds a handler hook, see handler_hooks.py; resource URIs are labelled
+  by their template, unknown names as "unknown", so label cardinality stays bounded).
+- HTTP: in-flight requests and SSE streams, request latency by route (MetricsMiddleware).
+- Auth: bearer validation latency by outcome (observe_auth, from the auth middleware).
+- Redis: per-command latency and errors (instrument_redis wraps the client instance).
+- Overload: 429s by reason; admission in-flight / queue depth / wait / 503s by class.
+- Compression: /mcp response bytes before/after, compression time, responses by encoding.
+- Caches, Redis pool, offload pools and MCP sessions are read from their existing
+  stats() at scrape time by a custom collector, so the hot paths pay nothing for them.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional
+
+from mcp.server.fastmcp import FastMCP
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .handler_hooks import HandlerCall, add_handler_hook
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+MCP_CALLS = Counter("prynai_mcp_calls_total", "MCP tool/resource/prompt calls", ["kind", "name", "status"])
+MCP_LATENCY = Histogram(
+    "prynai_mcp_call_duration_seconds", "MCP tool/resource/prompt latency", ["kind", "name"], buckets=_LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge("prynai_http_requests_in_flight", "HTTP requests being handled")
+SSE_IN_FLIGHT = Gauge("prynai_sse_streams_in_flight", "Open text/event-stream responses")
+HTTP_LATENCY = Histogram(
+    "prynai_http_request_duration_seconds",
+    "HTTP request latency (to the end of the body, so SSE streams count their full length)",
+    ["route", "method", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+AUTH_LATENCY = Histogram(
+    "prynai_auth_validation_duration_seconds", "Bearer token validation latency", ["outcome"], buckets=_FAST_BUCKETS
+)
+REDIS_LATENCY = Histogram(
+    "prynai_redis_command_duration_seconds", "Redis command latency", ["command"], buckets=_FAST_BUCKETS
+)
+RATE_LIMITED = Counter("prynai_rate_limited_total", "Requests rejected with 429", ["reason"])
+ADMISSION_IN_FLIGHT = Gauge("prynai_admission_in_flight", "Admitted /mcp requests in flight", ["class"])
+ADMISSION_QUEUE_DEPTH = Gauge("prynai_admission_queue_depth", "/mcp requests waiting for admission")
+ADMISSION_STREAMS = Gauge("prynai_admission_streams", "Open standalone SSE streams (GET /mcp)")
+ADMISSION_WAIT = Histogram(
+    "prynai_admission_wait_seconds", "Time queued before admission (or before being shed)", buckets=_FAST_BUCKETS
+)
+ADMISSION_REJECTED = Counter("prynai_admission_rejected_total", "/mcp requests shed with 503", ["class", "reason"])
+REDIS_ERRORS = Counter("prynai_redis_command_errors_total", "Redis commands that raised", ["command"])
+RESPONSE_BYTES = Counter(
+    "prynai_http_response_bytes_total", "/mcp response body bytes before (raw) and after (sent) compression",
+    ["encoding", "stage"],
+)
+COMPRESSION_SECONDS = Counter("prynai_compression_seconds_total", "Time spent compressing /mcp responses", ["encoding"])
+COMPRESSION_RESPONSES = Counter(
+    "prynai_compression_responses_total", "/mcp responses by chosen encoding (identity = under the threshold)", ["encoding"]
+)
+
+
+# ---- MCP handlers ------------------------------------------------------
+
+
+def _resource_label(mcp: FastMCP, uri: str) -> str:
+    manager = mcp._resource_manager
+    if uri in manager._resources:
+        return uri
+    for template in manager._templates.values():
+        if template.matches(uri) is not None:
+            return template.uri_template
+    return "unknown"
+
+
+def _tool_label(mcp: FastMCP, name: str) -> str:
+    return name if mcp._tool_manager.get_tool(name) is not None else "unknown"
+
+
+def _prompt_label(mcp: FastMCP, name: str) -> str:
+    return name if mcp._prompt_manager.get_prompt(name) is not None else "unknown"
+
+
+def instrument_mcp(mcp: FastMCP) -> None:
+    """Time tools/call, resources/read and prompts/get on the low-level server."""
+    labels = {"tool": _tool_label, "resource": _resource_label, "prompt": _prompt_label}
+
+    @contextmanager
+    def timed(call: HandlerCall) -> Iterator[None]:
+        name = labels[call.kind](mcp, call.name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            MCP_LATENCY.labels(call.kind, name).observe(time.perf_counter() - t0)
+            MCP_CALLS.labels(call.kind, name, "ok" if call.result is not None and not call.is_error else "error").inc()
+
+    add_handler_hook(mcp, "metrics", timed)
+
+
+# ---- auth / redis -------------------------------------------------------
+
+
+def observe_auth(outcome: str, seconds: float) -> None:
+    AUTH_LATENCY.labels(outcome).observe(seconds)
+
+
+def instrument_redis(client: Any) -> None:
+    """Time every command (and pipeline round trip) issued through this client instance."""
+    if getattr(client, "_prynai_metrics", False):
+        return
+    execute_command = client.execute_command
+    make_pipeline = client.pipeline
+
+    async def timed_command(*args: Any, **options: Any) -> Any:
+        command = str(args[0]).upper() if args else "UNKNOWN"
+        t0 = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        except Exception:
+            REDIS_ERRORS.labels(command).inc()
+            raise
+        finally:
+            REDIS_LATENCY.labels(command).observe(time.perf_counter() - t0)
+
+    def timed_pipeline(*args: Any, **kwargs: Any) -> Any:
+        pipe = make_pipeline(*args, **kwargs)
+        execute = pipe.execute
+        command = "MULTI" if pipe.is_transaction else "PIPELINE"
+
+        async def timed_execute(*a: Any, **k: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return await execute(*a, **k)
+            except Exception:
+                REDIS_ERRORS.labels(command).inc()
+                raise
+            finally:
+                REDIS_LATENCY.labels(command).observe(time.perf_counter() - t0)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_command
+    client.pipeline = timed_pipeline
+    client._prynai_metrics = True
+
+
+# ---- scrape-time collector ------------------------------------------------
+
+
+class StatsCollector(Collector):
+    """Turns the existing stats() of caches, the Redis pool and the session manager into metrics."""
+
+    def __init__(self, mcp: FastMCP):
+        self.mcp = mcp
+
+    def collect(self) -> Iterable[Any]:
+        from .auth.azure_oauth import token_cache
+        from .cache import result_cache
+        from .offload import offload_pools
+        from .pubsub import hot_values, subscriptions
+        from .redis_client import pool_stats
+        from .event_store import event_store_stats
+        from .artifacts import artifact_stats
+        from .sessions import session_store
+
+        t = token_cache.stats()
+        auth = CounterMetricFamily("prynai_auth_token_cache_lookups", "Verified-token cache lookups", labels=["result"])
+        auth.add_metric(["hit"], t["hits"])
+        auth.add_metric(["miss"], t["misses"])
+        yield auth
+        yield GaugeMetricFamily("prynai_auth_token_cache_entries", "Verified-token cache size", value=t["size"])
+
+        results = CounterMetricFamily(
+            "prynai_result_cache_lookups", "@cached lookups by function and outcome", labels=["name", "result"]
+        )
+        for name, c in result_cache.stats().items():
+            results.add_metric([name, "local_hit"], c["local_hits"])
+            results.add_metric([name, "redis_hit"], c["redis_hits"])
+            results.add_metric([name, "miss"], c["misses"])
+            results.add_metric([name, "redis_error"], c["redis_errors"])
+        yield results
+
+        hot = CounterMetricFamily("prynai_hot_cache_lookups", "Replica-local hot value lookups", labels=["result"])
+        hot.add_metric(["hit"], hot_values.hits)
+        hot.add_metric(["miss"], hot_values.misses)
+        yield hot
+
+        yield GaugeMetricFamily(
+            "prynai_mcp_sessions_active", "Stateful MCP sessions on this replica", value=self._session_count()
+        )
+        store = CounterMetricFamily(
+            "prynai_session_store_events", "Sessions recorded in / adopted from the session store", labels=["event"]
+        )
+        for event, n in session_store.stats().items():
+            store.add_metric([event], n)
+        yield store
+        events = CounterMetricFamily(
+            "prynai_event_store_events", "SSE events stored / replayed for Last-Event-ID resumption", labels=["event"]
+        )
+        for event, n in event_store_stats().items():
+            events.add_metric([event], n)
+        yield events
+        a = artifact_stats()
+        yield CounterMetricFamily("prynai_artifact_reads", "artifact:// range reads (also streamed chunks)", value=a["reads"])
+        artifact_bytes = CounterMetricFamily("prynai_artifact_bytes", "artifact:// bytes by activity", labels=["activity"])
+        artifact_bytes.add_metric(["read"], a["bytes"])
+        artifact_bytes.add_metric(["hashed"], a["hashed_bytes"])
+        yield artifact_bytes
+        yield CounterMetricFamily("prynai_artifact_hashes", "File artifact etags computed", value=a["hashes"])
+        yield CounterMetricFamily("prynai_artifact_published", "Artifacts published to Redis", value=a["published"])
+        yield GaugeMetricFamily(
+            "prynai_resource_subscriptions", "Resource subscriptions on this replica", value=subscriptions.count()
+        )
+
+        offload = offload_pools.stats()
+        pending = GaugeMetricFamily("prynai_offload_pending", "Offloaded jobs queued or running", labels=["executor"])
+        jobs = CounterMetricFamily("prynai_offload_jobs", "Offloaded jobs by outcome", labels=["executor", "outcome"])
+        for kind, c in offload.items():
+            pending.add_metric([kind], c["pending"])
+            for outcome in ("completed", "failed", "cancelled", "rejected"):
+                jobs.add_metric([kind, outcome], c[outcome])
+        yield pending
+        yield jobs
+
+        p = pool_stats()
+        if p.get("connected") and "in_use" in p:
+            pool = GaugeMetricFamily("prynai_redis_pool_connections", "Redis pool connections", labels=["state"])
+            pool.add_metric(["in_use"], p["in_use"])
+            pool.add_metric(["idle"], p["idle"])
+            pool.add_metric(["max"], p["max_connections"])
+            pool.add_metric(["waiting"], p.get("waiting", 0))
+            yield pool
+            if "waits" in p:
+                yield CounterMetricFamily(
+                    "prynai_redis_pool_waits", "Callers that waited for a free Redis connection", value=p["waits"]
+                )
+                yield CounterMetricFamily(
+                    "prynai_redis_pool_wait_timeouts", "Redis pool waits that timed out", value=p["wait_timeouts"]
+                )
+
+    def _session_count(self) -> int:
+        manager = self.mcp._session_manager
+        return len(manager._server_instances) if manager is not None else 0
+
+
+_collector: Optional[StatsCollector] = None
+
+
+def register_stats_collector(mcp: FastMCP) -> None:
+    global _collector
+    if _collector is None:
+        _collector = StatsCollector(mcp)
+        REGISTRY.register(_collector)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+# ---- ASGI middleware ------------------------------------------------------
+
+
+def _route(path: str) -> str:
+    # Bounded label set: everything not known collapses to "other"
+    if path.startswith("/mcp"):
+        return "/mcp"
+    if path in ("/healthz", "/livez", "/metrics"):
+        return path
+    return "other"
+
+
+class MetricsMiddleware:
+    """Pure ASGI: in-flight requests, open SSE streams and per-route latency."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 0
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers") or ():
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+                        SSE_IN_FLIGHT.inc()
+                        break
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            if streaming:
+                SSE_IN_FLIGHT.dec()
+            HTTP_LATENCY.labels(_route(scope.get("path") or "/"), scope.get("method", ""), str(status)).observe(
+                time.perf_counter() - t0
+            )
@@ -0,0 +1,209 @@
+"""
+Run blocking / CPU-bound tool bodies off the event loop.
+
+- @offload("thread") or @offload("process") marks a SYNC tool/resource function:
+      @mcp.tool()
+      @offload("process")
+      def count_primes(limit: int) -> int: ...
+  Apply BELOW @mcp.tool() (and below @cached, so cache hits never touch a pool); the
+  signature is preserved so FastMCP builds the same schema.
+- Pools are per process, created on first use: OFFLOAD_THREAD_WORKERS threads, and
+  OFFLOAD_PROCESS_WORKERS processes (0 = CPU count) started with OFFLOAD_START_METHOD
+  ("spawn" by default: no forking of a process that runs an event loop and threads).
+- Process jobs are sent by reference ("module:qualname" looked up in the worker, which
+  imports the module), so only the arguments and the result are pickled. Offloaded
+  functions cannot take a Context; report progress from an async tool around them.
+- At most workers + OFFLOAD_MAX_QUEUED jobs per pool; beyond that the call fails fast.
+- Cancellation (MCP notifications/cancelled, client disconnect, shutdown): queued jobs
+  are dropped before they start; running thread jobs see cancelled() turn True and can
+  stop early; running process jobs finish but their result is discarded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import importlib
+import inspect
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Literal, Optional
+
+from mcp.server.fastmcp.exceptions import ToolError
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+Executor = Literal["thread", "process"]
+
+# "module:qualname" -> undecorated function (filled in by @offload in every process)
+_TARGETS: Dict[str, Callable[..., Any]] = {}
+_job = threading.local()
+
+
+def cancelled() -> bool:
+    """Inside a thread-offloaded body: True once the MCP request was cancelled."""
+    event = getattr(_job, "cancel", None)
+    return event is not None and event.is_set()
+
+
+def _run_in_thread(fn: Callable[..., Any], cancel: threading.Event, args: tuple, kwargs: dict) -> Any:
+    if cancel.is_set():
+        raise concurrent.futures.CancelledError()
+    _job.cancel = cancel
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _job.cancel = None
+
+
+def _run_in_process(target: str, args: tuple, kwargs: dict) -> Any:
+    fn = _TARGETS.get(target)
+    if fn is None:
+        module, _, qualname = target.partition(":")
+        if module == "__main__":
+            # spawn re-imports the parent's main module as __mp_main__
+            fn = _TARGETS.get(f"__mp_main__:{qualname}")
+        if fn is None:
+            importlib.import_module(module)  # runs @offload, which registers the body
+            fn = _TARGETS[target]
+    return fn(*args, **kwargs)
+
+
+def _process_workers() -> int:
+    return settings.OFFLOAD_PROCESS_WORKERS or os.cpu_count() or 1
+
+
+class OffloadPools:
+    def __init__(self) -> None:
+        self._threads: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._processes: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._counts: Dict[str, Dict[str, int]] = {
+            kind: {"pending": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+            for kind in ("thread", "process")
+        }
+
+    def _workers(self, kind: Executor) -> int:
+        return settings.OFFLOAD_THREAD_WORKERS if kind == "thread" else _process_workers()
+
+    def _executor(self, kind: Executor) -> concurrent.futures.Executor:
+        if kind == "thread":
+            if self._threads is None:
+                self._threads = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(1, settings.OFFLOAD_THREAD_WORKERS), thread_name_prefix="prynai-offload"
+                )
+            return self._threads
+        if self._processes is None:
+            self._processes = concurrent.futures.ProcessPoolExecutor(
+                max_workers=_process_workers(),
+                mp_context=multiprocessing.get_context(settings.OFFLOAD_START_METHOD),
+            )
+        return self._processes
+
+    async def run(self, kind: Executor, fn: Callable[..., Any], target: str, args: tuple, kwargs: dict) -> Any:
+        counts = self._counts[kind]
+        if counts["pending"] >= self._workers(kind) + settings.OFFLOAD_MAX_QUEUED:
+            counts["rejected"] += 1
+            raise ToolError(f"Server busy: too many queued {kind} jobs, retry later")
+
+        cancel = threading.Event()
+        executor = self._executor(kind)
+        if kind == "thread":
+            # Copy contextvars so log/trace context follows the job into the worker thread
+            ctx = contextvars.copy_context()
+            fut = executor.submit(ctx.run, _run_in_thread, fn, cancel, args, kwargs)
+        else:
+            try:
+                fut = executor.submit(_run_in_process, target, args, kwargs)
+            except BrokenProcessPool:
+                # Broke before any of its jobs noticed; this job has not run, so use a fresh pool
+                self._reset_processes(executor)
+                executor = self._executor(kind)
+                fut = executor.submit(_run_in_process, target, args, kwargs)
+
+        counts["pending"] += 1
+        try:
+            # Cancelling this await cancels fut too, so a job that has not started never runs
+            result = await asyncio.wrap_future(fut)
+        except asyncio.CancelledError:
+            cancel.set()
+            counts["cancelled"] += 1
+            raise
+        except BrokenProcessPool:
+            # A worker died (OOM kill, segfault); start a fresh pool for the next call.
+            # Every job of the broken pool lands here: only the first one replaces it
+            counts["failed"] += 1
+            if self._reset_processes(executor):
+                log.error("offload: process pool broken, restarting it")
+            raise ToolError("Worker process died, retry later")
+        except BaseException:
+            counts["failed"] += 1
+            raise
+        finally:
+            counts["pending"] -= 1
+        counts["completed"] += 1
+        return result
+
+    def _reset_processes(self, broken: Optional[concurrent.futures.Executor] = None) -> bool:
+        """Shut the process pool down (only if it is still `broken`, when given); True if it was."""
+        pool = self._processes
+        if pool is None or (broken is not None and pool is not broken):
+            return False
+        self._processes = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        return True
+
+    def close(self) -> None:
+        """Drop queued jobs and release the pools (running jobs finish in the background)."""
+        threads, self._threads = self._threads, None
+        if threads is not None:
+            threads.shutdown(wait=False, cancel_futures=True)
+        self._reset_processes()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            kind: {
+                "workers": self._workers(kind),
+                "started": int((self._threads if kind == "thread" else self._processes) is not None),
+                **counts,
+            }
+            for kind, counts in self._counts.items()
+        }
+
+
+offload_pools = OffloadPools()
+
+
+def close_offload() -> None:
+    offload_pools.close()
+
+
+def offload(executor: Executor = "thread") -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Run a sync tool/resource body in the thread or process pool instead of on the event loop."""
+    if executor not in ("thread", "process"):
+        raise ValueError(f"offload executor must be 'thread' or 'process', not {executor!r}")
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if inspect.iscoroutinefunction(fn):
+            raise TypeError(f"@offload needs a sync function; {fn.__qualname__} is async")
+        for param in inspect.signature(fn).parameters.values():
+            if "Context" in str(param.annotation):
+                raise TypeError(f"@offload function {fn.__qualname__} cannot take a Context parameter")
+        target = f"{fn.__module__}:{fn.__qualname__}"
+        if executor == "process" and "<locals>" in target:
+            raise TypeError(f"@offload('process') needs a module-level function, not {fn.__qualname__}")
+        _TARGETS[target] = fn
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await offload_pools.run(executor, fn, target, args, kwargs)
+
+        return wrapper
+
+    return decorator
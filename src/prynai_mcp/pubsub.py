@@ -0,0 +1,222 @@
+"""
+Cross-replica invalidation and resource-update fan-out over Redis pub/sub.
+
+- hot_values: replica-local read-through copy of hot Redis-backed values
+  (e.g. prynai:counter). Reads hit memory; a HOT_CACHE_TTL_SECONDS bound caps
+  staleness if an invalidation is ever missed. It only serves from memory while
+  the invalidation listener is subscribed; otherwise every read goes to Redis.
+- subscriptions: which MCP sessions on THIS replica subscribed to which resource URI
+  (fed by resources/subscribe / resources/unsubscribe in server.py).
+- publish_invalidation(keys, uris, sessions): drop the keys, notify local subscribers
+  and end the sessions' local copies now, then PUBLISH on INVALIDATION_CHANNEL so every
+  other replica does the same. on_session_ended() registers who ends session copies;
+  on_invalidated(key, handler) who else drops a local copy of a key (e.g. the counter).
+- A listener task (started in app startup) applies messages from other replicas.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from mcp.server.session import ServerSession
+from pydantic import AnyUrl
+
+from .config import settings
+from .redis_client import ensure_pubsub_redis, ensure_redis
+
+log = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "prynai:invalidate"
+REPLICA_ID = uuid.uuid4().hex  # identifies our own messages on the channel
+
+
+class HotValueCache:
+    """Replica-local read-through cache for Redis-backed values."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._values: Dict[str, Tuple[float, Any]] = {}
+        self._generation = 0  # bumped by every invalidation; guards racing loads
+        self.enabled = False  # True only while invalidations can reach us
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await loader()
+        entry = self._values.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        generation = self._generation
+        value = await loader()
+        if generation == self._generation:
+            # Only cache if no invalidation arrived while we were loading
+            self.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.ttl_seconds > 0:
+            self._values[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, key: str) -> None:
+        self._generation += 1
+        self._values.pop(key, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._values.clear()
+
+
+class SubscriptionRegistry:
+    """resource URI -> sessions on this replica subscribed to it (weak; dead sessions vanish)."""
+
+    def __init__(self) -> None:
+        self._by_uri: Dict[str, "weakref.WeakSet[ServerSession]"] = {}
+
+    def add(self, uri: str, session: ServerSession) -> None:
+        self._by_uri.setdefault(uri, weakref.WeakSet()).add(session)
+
+    def remove(self, uri: str, session: ServerSession) -> None:
+        sessions = self._by_uri.get(uri)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self._by_uri[uri]
+
+    async def notify(self, uri: str, also: Optional[ServerSession] = None) -> int:
+        """Send resources/updated to every local subscriber of uri (plus `also`, deduplicated)."""
+        targets = set(self._by_uri.get(uri, ()))
+        if also is not None:
+            targets.add(also)
+        sent = 0
+        for session in targets:
+            try:
+                await session.send_resource_updated(AnyUrl(uri))
+                sent += 1
+            except Exception:
+                # Session's streams are gone (client left); forget it
+                self.remove(uri, session)
+        return sent
+
+    def count(self) -> int:
+        return sum(len(s) for s in self._by_uri.values())
+
+
+hot_values = HotValueCache(settings.HOT_CACHE_TTL_SECONDS)
+subscriptions = SubscriptionRegistry()
+_session_ended: List[Callable[[str], Awaitable[None]]] = []
+_invalidated: Dict[str, List[Callable[[], None]]] = {}
+
+
+def on_session_ended(handler: Callable[[str], Awaitable[None]]) -> None:
+    """Call handler(session_id) whenever a session is ended anywhere (sessions.py)."""
+    _session_ended.append(handler)
+
+
+def on_invalidated(key: str, handler: Callable[[], None]) -> None:
+    """Call handler() whenever key is invalidated, here or on another replica."""
+    _invalidated.setdefault(key, []).append(handler)
+
+
+async def _apply(
+    keys: Iterable[str], uris: Iterable[str], sessions: Iterable[str] = (), also: Optional[ServerSession] = None
+) -> None:
+    for key in keys:
+        hot_values.invalidate(key)
+        for handler in _invalidated.get(key, ()):
+            handler()
+    for uri in uris:
+        await subscriptions.notify(uri, also=also)
+    for session_id in sessions:
+        for handler in _session_ended:
+            try:
+                await handler(session_id)
+            except Exception as e:
+                log.warning("ending session %s failed: %s", session_id, e)
+
+
+async def publish_invalidation(
+    keys: Iterable[str] = (),
+    uris: Iterable[str] = (),
+    also: Optional[ServerSession] = None,
+    sessions: Iterable[str] = (),
+) -> None:
+    """Invalidate keys / notify URI subscribers / end sessions on this replica, then on all others."""
+    keys, uris, sessions = list(keys), list(uris), list(sessions)
+    await _apply(keys, uris, sessions, also=also)
+    try:
+        r = await ensure_redis()
+        message = {"origin": REPLICA_ID, "keys": keys, "uris": uris}
+        if sessions:
+            message["sessions"] = sessions
+        await r.publish(INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        log.warning("invalidation publish failed: %s", e)
+
+
+# ---- listener --------------------------------------------------------
+
+_listener: Optional[asyncio.Task] = None
+
+
+async def _listen() -> None:
+    while True:
+        pubsub = None
+        try:
+            r = await ensure_pubsub_redis()
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while we were not listening is lost: start clean
+            hot_values.clear()
+            hot_values.enabled = True
+            # No socket timeout on this connection; waking up every health-check interval
+            # lets redis-py PING it, so a dead connection still surfaces as an error
+            idle = float(settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS) or None
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=idle)
+                if message is None or message.get("type") != "message":
+                    continue
+                try:
+                    data = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                if data.get("origin") == REPLICA_ID:
+                    continue
+                await _apply(data.get("keys") or (), data.get("uris") or (), data.get("sessions") or ())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("invalidation listener error, reconnecting: %s", e)
+            await asyncio.sleep(1.0)
+        finally:
+            hot_values.enabled = False
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+async def start_invalidation_listener() -> None:
+    global _listener
+    if _listener is None:
+        _listener = asyncio.create_task(_listen(), name="prynai-invalidation-listener")
+
+
+async def stop_invalidation_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+        _listener = None
@@ -0,0 +1,255 @@
+"""
+Per-client rate limiting and per-tool concurrency caps for /mcp.
+
+- Client identity: token `azp` / `appid` / `oid` from the validated claims (falls back
+  to the peer address when auth is off).
+- Token bucket per client (RATE_LIMIT_ENABLED): RATE_LIMIT_RPS refill (0 = no rate
+  limit), RATE_LIMIT_BURST capacity, one token per JSON-RPC request POSTed to /mcp. initialize, ping,
+  notifications and responses are free (http_utils.is_session_control): a 429 on one
+  of those kills the client's session and its retry costs a new handshake.
+- Shared across replicas: the bucket lives in Redis (atomic Lua, Redis clock). Replicas
+  lease up to RATE_LIMIT_LEASE tokens at a time and spend them locally, so most requests
+  never touch Redis. Leases expire after a second; the cluster-wide overshoot is bounded
+  by replicas x lease. If Redis is unavailable, a replica-local bucket takes over.
+- Per-client state on a replica is an LRU of _MAX_CLIENTS entries; the least recently
+  seen client is dropped first (and starts again with a full bucket / no lease).
+- TOOL_CONCURRENCY_LIMITS="long_task=2,slow_square=4,*=16": max concurrent tools/call
+  per client and tool on this replica (applies whether or not RATE_LIMIT_ENABLED).
+- Rejections are HTTP 429 with Retry-After and a JSON-RPC error body.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+from .http_utils import (
+    BodyTooLarge,
+    buffer_body,
+    is_session_control,
+    payload_too_large,
+    peek_request_id,
+    peek_tool_name,
+    reject,
+)
+from .metrics import RATE_LIMITED
+from .redis_client import ensure_redis
+
+log = logging.getLogger(__name__)
+
+_REDIS_PREFIX = "prynai:ratelimit:"
+_LEASE_SECONDS = 1.0
+_MAX_CLIENTS = 10000  # per-client buckets / leases kept on a replica (LRU)
+
+# KEYS[1] bucket; ARGV rate/sec, burst, tokens wanted. Returns {granted, retry_after_ms}.
+_LEASE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(b[1])
+local ts = tonumber(b[2])
+if tokens == nil then
+  tokens = burst
+  ts = now
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local granted = math.min(want, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+local wait = 0
+if granted == 0 then
+  wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+return {granted, wait}
+"""
+
+
+class _LocalBucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self, rate: float, burst: float) -> float:
+        """Take one token; return 0.0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.stamp) * rate)
+        self.stamp = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / rate
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires_at", "blocked_until")
+
+    def __init__(self) -> None:
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.blocked_until = 0.0  # Redis said "empty": no need to ask again before this
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int, lease: int, redis_enabled: bool):
+        self.rate = rate
+        self.burst = float(max(1, burst))
+        self.lease = max(1, min(lease, int(self.burst)))
+        self.redis_enabled = redis_enabled
+        self._local: "OrderedDict[str, _LocalBucket]" = OrderedDict()
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        self._script: Any = None
+        self._script_owner: Any = None
+
+    async def acquire(self, client: str) -> float:
+        """Spend one token for client. Returns 0.0 if allowed, else Retry-After seconds."""
+        if self.rate <= 0:
+            return 0.0
+        if not self.redis_enabled:
+            return self._take_local(client)
+        now = time.monotonic()
+        lease = _lru_get(self._leases, client, _Lease)
+        if lease.tokens > 0 and now < lease.expires_at:
+            lease.tokens -= 1
+            return 0.0
+        if now < lease.blocked_until:
+            return lease.blocked_until - now
+        try:
+            granted, wait_ms = await self._lease_from_redis(client)
+        except Exception as e:
+            log.warning("rate limit: redis unavailable, using local bucket: %s", e)
+            return self._take_local(client)
+        if granted <= 0:
+            lease.tokens = 0
+            lease.blocked_until = now + wait_ms / 1000.0
+            return wait_ms / 1000.0
+        lease.tokens = granted - 1
+        lease.expires_at = now + _LEASE_SECONDS
+        return 0.0
+
+    async def _lease_from_redis(self, client: str) -> Tuple[int, int]:
+        r = await ensure_redis()
+        if self._script is None or self._script_owner is not r:
+            self._script, self._script_owner = r.register_script(_LEASE_SCRIPT), r
+        granted, wait_ms = await self._script(keys=[_REDIS_PREFIX + client], args=[self.rate, self.burst, self.lease])
+        return int(granted), int(wait_ms)
+
+    def _take_local(self, client: str) -> float:
+        bucket = _lru_get(self._local, client, lambda: _LocalBucket(self.burst))
+        return bucket.take(self.rate, self.burst)
+
+
+def _lru_get(entries: "OrderedDict[str, Any]", key: str, factory: Any) -> Any:
+    """entries[key] (created by factory() if missing), marked most recently used."""
+    entry = entries.get(key)
+    if entry is None:
+        entry = entries[key] = factory()
+        if len(entries) > _MAX_CLIENTS:
+            entries.popitem(last=False)
+    else:
+        entries.move_to_end(key)
+    return entry
+
+
+class ConcurrencyCaps:
+    """In-flight tools/call per (client, tool) on this replica."""
+
+    def __init__(self, spec: Optional[str]):
+        self.limits: Dict[str, int] = {}
+        for part in (spec or "").split(","):
+            name, _, value = part.partition("=")
+            if name.strip() and value.strip():
+                self.limits[name.strip()] = int(value)
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+
+    def limit_for(self, tool: str) -> Optional[int]:
+        return self.limits.get(tool, self.limits.get("*"))
+
+    def try_enter(self, client: str, tool: str) -> bool:
+        limit = self.limit_for(tool)
+        if limit is None:
+            return True
+        key = (client, tool)
+        n = self._in_flight.get(key, 0)
+        if n >= limit:
+            return False
+        self._in_flight[key] = n + 1
+        return True
+
+    def exit(self, client: str, tool: str) -> None:
+        key = (client, tool)
+        n = self._in_flight.get(key, 0) - 1
+        if n > 0:
+            self._in_flight[key] = n
+        else:
+            self._in_flight.pop(key, None)
+
+
+def client_key(scope: Scope) -> str:
+    claims = (scope.get("state") or {}).get("user_claims") or {}
+    for claim in ("azp", "appid", "oid"):
+        if claims.get(claim):
+            return f"{claim}:{claims[claim]}"
+    peer = scope.get("client")
+    return f"ip:{peer[0]}" if peer else "anonymous"
+
+
+async def too_many_requests(send: Send, retry_after: float, message: str, request_id: Any = None) -> None:
+    await reject(send, 429, retry_after, -32029, message, request_id)
+
+
+class RateLimitMiddleware:
+    """Pure ASGI; place INSIDE BearerAuthMiddleware so claims are available."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.limiter = RateLimiter(
+            settings.RATE_LIMIT_RPS, settings.RATE_LIMIT_BURST, settings.RATE_LIMIT_LEASE, settings.RATE_LIMIT_REDIS
+        )
+        self.caps = ConcurrencyCaps(settings.TOOL_CONCURRENCY_LIMITS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            not ((settings.RATE_LIMIT_ENABLED and settings.RATE_LIMIT_RPS > 0) or self.caps.limits)
+            or scope["type"] != "http"
+            or scope.get("method") != "POST"
+            or not (scope.get("path") or "").startswith("/mcp")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        client = client_key(scope)
+        try:
+            body, receive = await buffer_body(scope, receive)
+        except BodyTooLarge as e:
+            await payload_too_large(send, e)
+            return
+
+        limited = settings.RATE_LIMIT_ENABLED and settings.RATE_LIMIT_RPS > 0 and not is_session_control(body)
+        retry_after = await self.limiter.acquire(client) if limited else 0.0
+        if retry_after > 0:
+            RATE_LIMITED.labels("rate").inc()
+            await too_many_requests(send, retry_after, "Rate limit exceeded", peek_request_id(body))
+            return
+
+        tool = peek_tool_name(body) if self.caps.limits else None
+        if tool is not None and not self.caps.try_enter(client, tool):
+            RATE_LIMITED.labels("concurrency").inc()
+            await too_many_requests(send, 1.0, f"Too many concurrent calls to {tool}", peek_request_id(body))
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if tool is not None:
+                self.caps.exit(client, tool)
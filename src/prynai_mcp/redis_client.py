@@ -1,23 +1,242 @@
+"""
+Process-wide Redis client.
+
+- REDIS_URL picks the topology:
+    redis://, rediss://, unix://                      standalone
+    redis+cluster://host:port[,host:port]             Redis Cluster (rediss+cluster:// for TLS)
+    redis+sentinel://[:pw@]h1:26379,h2:26379/<service>[/<db>]   Sentinel-managed master
+- Pool size, socket/connect timeouts, health checks and retry/backoff come from
+  Settings (REDIS_*). Standalone uses a blocking pool: when all REDIS_MAX_CONNECTIONS
+  are busy, callers wait up to REDIS_POOL_TIMEOUT_SECONDS instead of opening more.
+- `async with pipeline() as p: ...; await p.execute()` batches commands in one
+  round trip (transaction=True wraps them in MULTI/EXEC).
+- pool_stats() reports in-use/idle connections and how often callers had to wait.
+- Pub/sub listeners use ensure_pubsub_redis(): a separate small pool without the
+  socket timeout (a quiet channel is not an error), health-checked with PINGs instead.
+"""
+
 from __future__ import annotations
-from typing import Optional
-from redis.asyncio import Redis
-from .config import settings
+
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
 import anyio
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.retry import Retry
+from redis.asyncio.sentinel import Sentinel
+from redis.backoff import ExponentialWithJitterBackoff, NoBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from .config import settings
 
 _redis: Optional[Redis] = None
+_pubsub_redis: Optional[Redis] = None
 _lock = anyio.Lock()
 
+
+class _MeteredPool(BlockingConnectionPool):
+    """BlockingConnectionPool that counts saturation (callers waiting for a free connection)."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+        self.wait_seconds = 0.0
+        self.peak_in_use = 0
+
+    async def get_connection(self, *args: Any, **kwargs: Any):
+        if self.can_get_connection():
+            conn = await super().get_connection()
+        else:
+            self.waits += 1
+            self.waiting += 1
+            t0 = time.perf_counter()
+            try:
+                conn = await super().get_connection()
+            except RedisConnectionError:
+                self.wait_timeouts += 1
+                raise
+            finally:
+                self.waiting -= 1
+                self.wait_seconds += time.perf_counter() - t0
+        self.peak_in_use = max(self.peak_in_use, len(self._in_use_connections))
+        return conn
+
+
+# ---- construction ----------------------------------------------------
+
+
+def _retry() -> Retry:
+    if settings.REDIS_RETRY_ATTEMPTS <= 0:
+        return Retry(NoBackoff(), 0)
+    backoff = ExponentialWithJitterBackoff(
+        cap=settings.REDIS_RETRY_BACKOFF_CAP_MS / 1000.0,
+        base=settings.REDIS_RETRY_BACKOFF_BASE_MS / 1000.0,
+    )
+    return Retry(backoff, settings.REDIS_RETRY_ATTEMPTS)
+
+
+def _connection_kwargs(socket_timeout: Optional[float], retry: Retry) -> Dict[str, Any]:
+    return {
+        "decode_responses": True,
+        "socket_timeout": socket_timeout,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+        "socket_keepalive": True,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+        "retry": retry,
+    }
+
+
+def _parse_sentinel(url: str) -> Tuple[List[Tuple[str, int]], str, Dict[str, Any]]:
+    parsed = urlparse(url)
+    netloc = parsed.netloc.rsplit("@", 1)[-1]
+    hosts = []
+    for hp in netloc.split(","):
+        host, _, port = hp.partition(":")
+        hosts.append((host, int(port or 26379)))
+    parts = [p for p in parsed.path.split("/") if p]
+    if not parts:
+        raise ValueError("redis+sentinel:// URL needs a service name: redis+sentinel://h1:26379,h2:26379/<service>[/<db>]")
+    kwargs: Dict[str, Any] = {"db": int(parts[1]) if len(parts) > 1 else 0}
+    if parsed.password:
+        kwargs["password"] = unquote(parsed.password)
+    if parsed.username:
+        kwargs["username"] = unquote(parsed.username)
+    return hosts, parts[0], kwargs
+
+
+def _build_client(url: str, socket_timeout: Optional[float], max_connections: int, retry: Retry) -> Redis:
+    kwargs = _connection_kwargs(socket_timeout, retry)
+    scheme = urlparse(url).scheme
+    if scheme.endswith("+cluster"):
+        # max_connections is per cluster node
+        real_url = scheme.split("+", 1)[0] + url[len(scheme):]
+        return RedisCluster.from_url(real_url, max_connections=max_connections, **kwargs)
+    if scheme.endswith("+sentinel"):
+        hosts, service, auth = _parse_sentinel(url)
+        sentinel_kwargs = {
+            "socket_timeout": settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+        }
+        sentinel = Sentinel(hosts, sentinel_kwargs=sentinel_kwargs, **kwargs, **auth)
+        return sentinel.master_for(service, max_connections=max_connections)
+    pool = _MeteredPool.from_url(
+        url,
+        max_connections=max_connections,
+        timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+        **kwargs,
+    )
+    client = Redis(connection_pool=pool)
+    client.auto_close_connection_pool = True  # close_redis() tears the pool down too
+    return client
+
+
+# ---- process-wide client ---------------------------------------------
+
+
 async def ensure_redis() -> Redis:
     global _redis
     if _redis is None:
         async with _lock:
             if _redis is None:
-                _redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
-                await _redis.ping()
+                client = _build_client(
+                    settings.REDIS_URL, settings.REDIS_SOCKET_TIMEOUT_SECONDS, settings.REDIS_MAX_CONNECTIONS, _retry()
+                )
+                try:
+                    await client.ping()
+                except Exception:
+                    await client.aclose()
+                    raise
+                # Published only once reachable, so a failed startup is retried next call
+                _redis = client
     return _redis
 
+
+async def ensure_pubsub_redis() -> Redis:
+    """
+    Client for long-lived SUBSCRIBE connections. The main client's socket timeout would
+    drop a subscription every time the channel is quiet for that long, and messages
+    published while it reconnects are lost. No silent retries either: a lost connection
+    reaches the listener, which starts clean. Cluster has no async pub/sub, so it gets
+    the main client (and its listeners fail over to reading Redis).
+    """
+    global _pubsub_redis
+    if urlparse(settings.REDIS_URL).scheme.endswith("+cluster"):
+        return await ensure_redis()
+    if _pubsub_redis is None:
+        async with _lock:
+            if _pubsub_redis is None:
+                client = _build_client(settings.REDIS_URL, None, 4, Retry(NoBackoff(), 0))
+                try:
+                    await client.ping()
+                except Exception:
+                    await client.aclose()
+                    raise
+                _pubsub_redis = client
+    return _pubsub_redis
+
+
 async def close_redis():
-    global _redis
+    global _redis, _pubsub_redis
+    if _pubsub_redis:
+        await _pubsub_redis.aclose()
+        _pubsub_redis = None
     if _redis:
-        await _redis.close()
+        await _redis.aclose()
         _redis = None
+
+
+@asynccontextmanager
+async def pipeline(transaction: bool = False) -> AsyncIterator[Pipeline]:
+    """
+    Batch several commands into one round trip:
+        async with pipeline() as p:
+            p.get("a"); p.incrby("b", 2)
+            a, b = await p.execute()
+    transaction=True wraps them in MULTI/EXEC (keys must share a hash slot on Cluster).
+    """
+    r = await ensure_redis()
+    async with r.pipeline(transaction=transaction) as pipe:
+        yield pipe
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool usage; `waits`/`waiting` > 0 means REDIS_MAX_CONNECTIONS is saturated."""
+    r = _redis
+    if r is None:
+        return {"connected": False}
+    if isinstance(r, RedisCluster):
+        nodes = r.get_nodes()
+        return {
+            "connected": True,
+            "topology": "cluster",
+            "max_connections_per_node": settings.REDIS_MAX_CONNECTIONS,
+            "nodes": {
+                n.name: {"connections": len(n._connections), "idle": len(n._free)}
+                for n in nodes
+            },
+        }
+    pool = r.connection_pool
+    in_use = len(pool._in_use_connections)
+    stats: Dict[str, Any] = {
+        "connected": True,
+        "topology": "sentinel" if settings.REDIS_URL.split(":", 1)[0].endswith("+sentinel") else "standalone",
+        "max_connections": pool.max_connections,
+        "in_use": in_use,
+        "idle": len(pool._available_connections),
+        "utilization": in_use / pool.max_connections if pool.max_connections else 0.0,
+    }
+    if isinstance(pool, _MeteredPool):
+        stats.update(
+            peak_in_use=pool.peak_in_use,
+            waiting=pool.waiting,
+            waits=pool.waits,
+            wait_timeouts=pool.wait_timeouts,
+            wait_seconds=pool.wait_seconds,
+        )
+    return stats
@@ -1,16 +1,23 @@
 from __future__ import annotations
 import asyncio
-from typing import Literal
+import base64
+from typing import AsyncIterator, Literal
 from typing import Optional
 from pydantic import AnyUrl
 from mcp.server.fastmcp import Context, FastMCP
 from mcp.server.session import ServerSession
 from mcp.types import SamplingMessage, TextContent
 from mcp.server.fastmcp.prompts import base
-import logging, json, sys
-from .redis_client import ensure_redis
+from .cache import cached
+from .offload import offload
+from .streaming import streaming
+from .artifacts import LATEST, artifacts
+from .counter import make_counter
+from .pubsub import hot_values, on_invalidated, publish_invalidation, subscriptions
+from .sessions import current_session_id, session_store
 import os, json
-from .config import settings
+from .auth.policy import get_policy
+from .logging_setup import configure_logging, instrument_mcp as instrument_logging
 
 DEPLOY = os.getenv("PRYNAI_ENV", "local")
 BUILD  = os.getenv("PRYNAI_BUILD", "dev")
@@ -27,25 +34,61 @@ mcp = FastMCP(name="PrynAI MCP")
 
 # COUNTER: int = 0
 
+COUNTER_KEY = "prynai:counter"
+COUNTER_URI = "prynai://counter"
+
+async def _counter_flushed() -> None:
+    # Write-behind mode: one invalidation/notification per flushed batch, not per bump
+    await publish_invalidation(keys=[COUNTER_KEY], uris=[COUNTER_URI])
+
+# Single key, sharded or write-behind depending on COUNTER_MODE (see counter.py)
+counter = make_counter(COUNTER_KEY, on_flush=_counter_flushed)
+# A flush or set on another replica: drop the value the counter itself caches
+on_invalidated(COUNTER_KEY, counter.invalidate)
+
 async def _get_counter() -> int:
-    r = await ensure_redis()
-    val = await r.get("prynai:counter")
-    return int(val) if val is not None else 0
+    # Served from the replica-local copy; writes on any replica invalidate it via pub/sub
+    return await hot_values.get(COUNTER_KEY, counter.get)
 
 async def _incr_counter(step: int) -> int:
-    r = await ensure_redis()
-    return int(await r.incrby("prynai:counter", step))
+    return await counter.incr(step)
+
+async def _counter_changed(ctx: Context[ServerSession, None] | None) -> None:
+    """Drop cached copies everywhere and notify every subscribed session on every replica."""
+    if counter.write_behind:
+        # Everyone else hears about it when the batch is flushed (_counter_flushed)
+        if ctx:
+            await ctx.session.send_resource_updated(AnyUrl(COUNTER_URI))
+        return
+    # The caller's own session is notified too (previous behaviour), even if not subscribed
+    await publish_invalidation(keys=[COUNTER_KEY], uris=[COUNTER_URI], also=ctx.session if ctx else None)
 
 @mcp.tool()
+@cached(ttl=300, shared=False)
 def add(a: int, b: int) -> int:
     """Add two integers."""
     return a + b
 
 @mcp.tool()
+@cached(ttl=300, shared=False)
 def multiply(a: int, b: int) -> int:
     """Multiply two integers."""
     return a * b
 
+@mcp.tool()
+@offload("process")
+def count_primes(limit: int) -> int:
+    """Count primes below limit (CPU-bound; runs in the process pool, off the event loop)."""
+    limit = max(0, min(limit, 50_000_000))
+    if limit < 3:
+        return 0
+    sieve = bytearray([1]) * limit
+    sieve[0] = sieve[1] = 0
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return sum(sieve)
+
 @mcp.tool()
 async def divide(a: float, b: float, ctx: Context[ServerSession, None]) -> float:
     """Divide a by b. Emits a warning on b=0."""
@@ -83,6 +126,32 @@ async def long_task(steps: int = 3, ctx: Context[ServerSession, None] = None) ->
     return "done"
 
 
+@mcp.tool()
+@streaming()
+async def stream_report(lines: int = 20, delay_ms: int = 50) -> AsyncIterator[str]:
+    """Stream a line-per-step report as it is produced (chunks arrive as progress notifications)."""
+    lines = max(1, min(10_000, lines))
+    for i in range(lines):
+        await asyncio.sleep(max(0, delay_ms) / 1000)
+        yield json.dumps({"line": i + 1, "of": lines}) + "\n"
+
+
+@mcp.tool()
+@streaming()
+async def read_artifact(
+    name: str, offset: int = 0, length: int = -1, etag: str = LATEST, if_none_match: str = ""
+) -> AsyncIterator[str]:
+    """Stream an artifact range as NDJSON: a header line, then {"offset", "data" (base64)} per chunk."""
+    info = await artifacts.info(name)
+    header = info.to_dict()
+    if if_none_match and if_none_match == info.etag:
+        yield json.dumps({**header, "not_modified": True}) + "\n"
+        return
+    yield json.dumps(header) + "\n"
+    async for _, pos, chunk in artifacts.iter_range(name, offset, length, etag if etag != LATEST else info.etag):
+        yield json.dumps({"offset": pos, "data": base64.b64encode(chunk).decode("ascii")}) + "\n"
+
+
 @mcp.tool()
 async def summarize_via_client_llm(text: str, ctx: Context[ServerSession, None]) -> str:
     """Ask the client LLM to summarize; fall back if unsupported."""
@@ -102,9 +171,9 @@ async def summarize_via_client_llm(text: str, ctx: Context[ServerSession, None])
 @mcp.tool()
 async def set_counter(value: int, ctx: Context[ServerSession, None]) -> int:
     """Set the server counter to an exact integer value and notify subscribers."""
-    r = await ensure_redis()
-    await r.set("prynai:counter", value)
-    await ctx.session.send_resource_updated("prynai://counter")
+    await counter.set(value)
+    # A set is rare and must be seen everywhere now, even in write-behind mode
+    await publish_invalidation(keys=[COUNTER_KEY], uris=[COUNTER_URI], also=ctx.session)
     await ctx.info(f"counter set -> {value}")
     return value
 
@@ -112,8 +181,8 @@ async def set_counter(value: int, ctx: Context[ServerSession, None]) -> int:
 @mcp.tool()
 async def bump_counter(step: int = 1, ctx: Context[ServerSession, None] = None) -> int:
     new_val = await _incr_counter(step)
+    await _counter_changed(ctx)
     if ctx:
-        await ctx.session.send_resource_updated("prynai://counter")
         await ctx.info(f"counter updated -> {new_val}")
     return new_val
 
@@ -121,32 +190,65 @@ async def bump_counter(step: int = 1, ctx: Context[ServerSession, None] = None)
 
 
 @mcp.resource("prynai://status")
+@cached(ttl=5, shared=False)
 def status() -> str:
     """Simple status resource."""
     return "ok"
 
 
 @mcp.resource("hello://{name}")
+@cached(ttl=300, shared=False)
 def hello_res(name: str) -> str:
     """Dynamic resource."""
     return f"Hello, {name}"
 
 
 # update resource to be async and read from Redis
-@mcp.resource("prynai://counter")
+@mcp.resource(COUNTER_URI)
 async def counter_value() -> str:
     return str(await _get_counter())
 
+# Replica-specific (build/deployment), so never shared through Redis
 @mcp.resource("prynai://server-info")
+@cached(ttl=30, shared=False)
 def server_info() -> str:
+    policy = get_policy()
     return json.dumps({
         "deployment": os.getenv("PRYNAI_ENV", "local"),
         "build": os.getenv("PRYNAI_BUILD", "dev"),
-        "auth_required": settings.AUTH_REQUIRED,
-        "issuer": settings.issuer,
-        "audiences": (settings.ENTRA_AUDIENCES or "").split(",") if settings.ENTRA_AUDIENCES else [],
+        "auth_required": policy.auth_required,
+        "issuer": policy.issuer,
+        "audiences": sorted(policy.audiences),
     })
 
+# Large payloads: describe first (size + etag), then read pinned ranges; see artifacts.py
+@mcp.resource("artifact://{name}", mime_type="application/json")
+async def artifact_info(name: str) -> str:
+    """Size, mime type and etag of an artifact; skip the download when the etag is unchanged."""
+    return json.dumps((await artifacts.info(name)).to_dict())
+
+@mcp.resource("artifact://{name}/{etag}/{offset}/{length}", mime_type="application/octet-stream")
+async def artifact_range(name: str, etag: str, offset: int, length: int) -> bytes:
+    """Bytes [offset, offset+length) of the artifact version with this etag ("latest" = any)."""
+    return await artifacts.read_range(name, offset, length, etag)
+
+# Track resources/subscribe per session so updates fan out to every subscriber
+# (on every replica, via pubsub.publish_invalidation), not just the writer's session.
+# Also kept in the session's Redis record, so a worker that adopts it keeps them.
+@mcp._mcp_server.subscribe_resource()
+async def _subscribe(uri: AnyUrl) -> None:
+    subscriptions.add(str(uri), mcp.get_context().session)
+    session_id = current_session_id(mcp)
+    if session_id:
+        await session_store.add_subscription(session_id, str(uri))
+
+@mcp._mcp_server.unsubscribe_resource()
+async def _unsubscribe(uri: AnyUrl) -> None:
+    subscriptions.remove(str(uri), mcp.get_context().session)
+    session_id = current_session_id(mcp)
+    if session_id:
+        await session_store.remove_subscription(session_id, str(uri))
+
 # ----------------------- Prompts ------------------------------------
 
 
@@ -161,25 +263,20 @@ def quick_summary(title: str = "Untitled", tone: str = "formal") -> list[base.Me
 
 # ----------------------- Structured logging ------------------------------------
 
-
-class JsonFormatter(logging.Formatter):
-    def format(self, record):
-        payload = {"level": record.levelname.lower(), "msg": record.getMessage(), "logger": record.name}
-        return json.dumps(payload)
-
-handler = logging.StreamHandler(sys.stdout)
-handler.setFormatter(JsonFormatter())
-root = logging.getLogger()
-root.handlers = [handler]
-root.setLevel(logging.INFO)
+# JSON lines written by a background thread (QueueHandler/QueueListener), with
+# session/tool/oid context per record; see logging_setup.py
+configure_logging()
+instrument_logging(mcp)
 
 
 # ----------------------- Entrypoint ---------------------------------
 
 
 def main() -> None:
-    # Streamable HTTP server at /mcp on 127.0.0.1:8000
-    mcp.run(transport="streamable-http")
+    # Full app (auth, limits, metrics) at /mcp on SERVER_HOST:SERVER_PORT, SERVER_WORKERS processes
+    from .launcher import run
+
+    run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,503 @@
+"""
+MCP session store: any worker (or replica) can serve any session, and resume its streams.
+
+- Streamable-HTTP sessions live in the memory of the worker that answered `initialize`.
+  With several uvicorn workers on one socket (launcher.py), a client's next request may
+  land on another worker, which would answer 400 "No valid session ID".
+- On initialize, the session id, the client's InitializeRequestParams and the owning
+  worker are stored in Redis (prynai:session:{<id>}, SESSION_TTL_SECONDS, refreshed on use);
+  resources/subscribe adds the URI to the record.
+- A worker that gets a request for a session it does not hold, but Redis knows, adopts
+  it: a local transport with the same id, an already-initialized ServerSession with the
+  stored client params, and the stored subscriptions.
+- DELETE removes the record and ends every worker's copy (a "sessions" message on the
+  pub/sub invalidation channel). A copy whose record is gone (ended while the message
+  was missed, or expired) is ended before it serves anything. Ended copies answer 404.
+- Copies (local or adopted) with no request for SESSION_TTL_SECONDS are reaped; the
+  SDK itself never drops a session.
+- notifications/initialized may reach a different worker than initialize did, so
+  sessions here count as initialized once initialize has been answered.
+- Keep-alive connections keep most traffic on one worker; adoption covers the rest.
+  Not carried over: in-flight server->client requests (sampling/elicitation) and the
+  standalone GET stream, which the client reopens against the new worker.
+- SESSION_STORE picks the backend: "redis" (above), "memory" (sessions stay on their
+  worker; only Last-Event-ID resumption) or "none" (the SDK's own session handling).
+- With EVENT_STORE_ENABLED, each session also gets its own event store (event_store.py),
+  so a client that lost an SSE stream reconnects with Last-Event-ID, on any worker, and
+  misses nothing.
+- Redis errors never fail a request; the session then just stays worker-local.
+- Built on private mcp internals (session manager, transport, ServerSession, Server.run),
+  so pyproject pins mcp to the 1.14 series and startup checks they are still there.
+"""
+
+from __future__ import annotations
+
+import inspect
+import json
+import logging
+import os
+import socket
+import time
+from contextlib import AsyncExitStack
+from importlib.metadata import version
+from typing import Any, Dict, Optional
+
+import anyio
+import mcp.types as types
+from anyio.abc import TaskStatus
+from mcp.server.fastmcp import FastMCP
+from mcp.server.lowlevel.server import Server
+from mcp.server.models import InitializationOptions
+from mcp.server.session import InitializationState, ServerSession
+from mcp.server.streamable_http import MCP_SESSION_ID_HEADER, StreamableHTTPServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.types import Message, Receive, Scope, Send
+
+from .config import settings
+from .event_store import events_key, make_event_store
+from .http_utils import BodyTooLarge, buffer_body, payload_too_large
+from .pubsub import on_session_ended, publish_invalidation, subscriptions
+from .redis_client import ensure_redis, pipeline
+
+log = logging.getLogger(__name__)
+
+_REDIS_PREFIX = "prynai:session:"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _key(session_id: str) -> str:
+    # Hash tag keeps the record and its subscription set in one Cluster slot (MULTI-safe)
+    return f"{_REDIS_PREFIX}{{{session_id}}}"
+
+
+def _subs_key(session_id: str) -> str:
+    return _key(session_id) + ":subs"
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or ():
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _initialize_params(body: bytes) -> Optional[Dict[str, Any]]:
+    if b'"initialize"' not in body:
+        return None
+    try:
+        msg = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(msg, dict) and msg.get("method") == "initialize" and isinstance(msg.get("params"), dict):
+        return msg["params"]
+    return None
+
+
+class SessionStore:
+    """Worker-local sessions (SESSION_STORE=memory): nothing is shared, nothing to adopt."""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = max(60, ttl_seconds)
+        self.saved = 0
+        self.adopted = 0
+        self.ended = 0
+        self.reaped = 0
+        self.errors = 0
+
+    async def save(self, session_id: str, client_params: Optional[Dict[str, Any]]) -> bool:
+        self.saved += 1
+        return True
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    async def touch(self, session_id: str) -> bool:
+        return True
+
+    async def delete(self, session_id: str) -> None:
+        pass
+
+    async def add_subscription(self, session_id: str, uri: str) -> None:
+        pass
+
+    async def remove_subscription(self, session_id: str, uri: str) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "saved": self.saved,
+            "adopted": self.adopted,
+            "ended": self.ended,
+            "reaped": self.reaped,
+            "errors": self.errors,
+        }
+
+
+class RedisSessionStore(SessionStore):
+    def __init__(self, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        self._touched: Dict[str, float] = {}
+
+    async def save(self, session_id: str, client_params: Optional[Dict[str, Any]]) -> bool:
+        """Record a new session; False if it could not be (it then stays worker-local)."""
+        try:
+            key = _key(session_id)
+            async with pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={"client_params": json.dumps(client_params or {}), "worker": WORKER_ID})
+                pipe.expire(key, self.ttl_seconds)
+                await pipe.execute()
+            self.saved += 1
+            self._touched[session_id] = time.monotonic()
+            return True
+        except Exception as e:
+            self.errors += 1
+            log.warning("session store: save failed: %s", e)
+            return False
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with pipeline() as pipe:
+                pipe.hgetall(_key(session_id))
+                pipe.smembers(_subs_key(session_id))
+                record, subs = await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            log.warning("session store: load failed: %s", e)
+            return None
+        if not record:
+            return None
+        return {
+            "client_params": json.loads(record.get("client_params") or "{}"),
+            "worker": record.get("worker"),
+            "subscriptions": sorted(subs or ()),
+        }
+
+    async def touch(self, session_id: str) -> bool:
+        """
+        Whether the record still exists (True if Redis cannot tell). Slides the TTL at most
+        every ttl/4 per session on this worker; otherwise it is a single EXISTS.
+        """
+        now = time.monotonic()
+        try:
+            if now - self._touched.get(session_id, 0.0) < self.ttl_seconds / 4:
+                r = await ensure_redis()
+                return bool(await r.exists(_key(session_id)))
+            self._touched[session_id] = now
+            if len(self._touched) > 10000:
+                cutoff = now - self.ttl_seconds
+                self._touched = {k: v for k, v in self._touched.items() if v > cutoff}
+            async with pipeline(transaction=True) as pipe:
+                pipe.expire(_key(session_id), self.ttl_seconds)
+                pipe.expire(_subs_key(session_id), self.ttl_seconds)
+                pipe.expire(events_key(session_id), self.ttl_seconds)
+                alive, _, _ = await pipe.execute()
+            return bool(alive)
+        except Exception as e:
+            self.errors += 1
+            log.warning("session store: touch failed: %s", e)
+            return True
+
+    async def delete(self, session_id: str) -> None:
+        self._touched.pop(session_id, None)
+        try:
+            r = await ensure_redis()
+            await r.delete(_key(session_id), _subs_key(session_id), events_key(session_id))
+        except Exception as e:
+            self.errors += 1
+            log.warning("session store: delete failed: %s", e)
+
+    async def add_subscription(self, session_id: str, uri: str) -> None:
+        await self._update_subscription(session_id, uri, add=True)
+
+    async def remove_subscription(self, session_id: str, uri: str) -> None:
+        await self._update_subscription(session_id, uri, add=False)
+
+    async def _update_subscription(self, session_id: str, uri: str, add: bool) -> None:
+        key = _subs_key(session_id)
+        try:
+            if add:
+                async with pipeline(transaction=True) as pipe:
+                    pipe.sadd(key, uri)
+                    pipe.expire(key, self.ttl_seconds)
+                    await pipe.execute()
+            else:
+                r = await ensure_redis()
+                await r.srem(key, uri)
+        except Exception as e:
+            self.errors += 1
+            log.warning("session store: subscription update failed: %s", e)
+
+
+def _make_store() -> SessionStore:
+    if settings.SESSION_STORE == "redis":
+        return RedisSessionStore(settings.SESSION_TTL_SECONDS)
+    return SessionStore(settings.SESSION_TTL_SECONDS)
+
+
+session_store = _make_store()
+
+
+def current_session_id(mcp: FastMCP) -> Optional[str]:
+    """Mcp-Session-Id of the request being handled, if any."""
+    try:
+        request = mcp._mcp_server.request_context.request
+    except LookupError:
+        return None
+    return request.headers.get(MCP_SESSION_ID_HEADER) if request is not None else None
+
+
+# ---- sessions that move between workers ------------------------------------
+
+# Private mcp attributes used below, by the function that sets them
+_SDK_ATTRIBUTES = (
+    (StreamableHTTPSessionManager.__init__, ("_server_instances", "_session_creation_lock", "_task_group")),
+    (StreamableHTTPServerTransport.__init__, ("_event_store",)),
+    (ServerSession.__init__, ("_initialization_state",)),
+    (ServerSession._received_request, ("_client_params",)),
+)
+_SDK_METHODS = (
+    (StreamableHTTPSessionManager, "_handle_stateful_request"),
+    (Server, "_handle_message"),
+    (ServerSession, "_received_request"),
+    (ServerSession, "_received_notification"),
+)
+_SERVER_RUN_PARAMS = ["self", "read_stream", "write_stream", "initialization_options", "raise_exceptions", "stateless"]
+
+
+def check_sdk_internals() -> None:
+    """Fail at startup, not on some later request, if an mcp upgrade moved what this module patches."""
+    missing = [
+        f"{fn.__qualname__} no longer sets {name}"
+        for fn, names in _SDK_ATTRIBUTES
+        for name in names
+        if name not in fn.__code__.co_names
+    ]
+    missing += [f"{owner.__name__}.{name} is gone" for owner, name in _SDK_METHODS if not callable(getattr(owner, name, None))]
+    if list(inspect.signature(Server.run).parameters) != _SERVER_RUN_PARAMS:
+        missing.append("Server.run() has a new signature")
+    if missing:
+        raise RuntimeError(
+            f"session store: unsupported mcp {version('mcp')} ({'; '.join(missing)}). "
+            "Install mcp>=1.14,<1.15 or set SESSION_STORE=none."
+        )
+
+
+
+class SharedServerSession(ServerSession):
+    """
+    ServerSession that does not insist on seeing notifications/initialized itself: the
+    client may have sent it to another worker, so an answered initialize is enough.
+    """
+
+    async def _received_request(self, responder: Any) -> None:
+        if self._initialization_state == InitializationState.Initializing and not isinstance(
+            responder.request.root, types.InitializeRequest
+        ):
+            self._initialization_state = InitializationState.Initialized
+        await super()._received_request(responder)
+
+    async def _received_notification(self, notification: types.ClientNotification) -> None:
+        if self._initialization_state == InitializationState.Initializing:
+            self._initialization_state = InitializationState.Initialized
+        await super()._received_notification(notification)
+
+
+async def _serve_session(
+    server: Server,
+    read_stream: Any,
+    write_stream: Any,
+    initialization_options: InitializationOptions,
+    raise_exceptions: bool = False,
+    record: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Server.run() with SharedServerSession; `record` restores a session adopted from Redis."""
+    async with AsyncExitStack() as stack:
+        lifespan_context = await stack.enter_async_context(server.lifespan(server))
+        # stateless=True only marks an adopted session as initialized; it is stateful otherwise
+        session = await stack.enter_async_context(
+            SharedServerSession(read_stream, write_stream, initialization_options, stateless=record is not None)
+        )
+        if record is not None:
+            if record.get("client_params"):
+                try:
+                    session._client_params = types.InitializeRequestParams.model_validate(record["client_params"])
+                except Exception as e:
+                    log.warning("session store: stored client params unusable: %s", e)
+            for uri in record.get("subscriptions") or ():
+                subscriptions.add(uri, session)
+
+        async with anyio.create_task_group() as tg:
+            async for message in session.incoming_messages:
+                tg.start_soon(server._handle_message, message, session, lifespan_context, raise_exceptions)
+
+
+async def _end_local_copy(manager: StreamableHTTPSessionManager, session_id: str) -> bool:
+    """Terminate this worker's copy (its server task exits); it answers 404 until reaped."""
+    transport = manager._server_instances.get(session_id)
+    if transport is None or transport.is_terminated:
+        return False
+    await transport.terminate()
+    session_store.ended += 1
+    return True
+
+
+async def _adopt(manager: StreamableHTTPSessionManager, session_id: str, record: Dict[str, Any]) -> None:
+    async with manager._session_creation_lock:
+        if session_id in manager._server_instances:
+            return
+        transport = StreamableHTTPServerTransport(
+            mcp_session_id=session_id,
+            is_json_response_enabled=manager.json_response,
+            event_store=make_event_store(session_id) or manager.event_store,
+            security_settings=manager.security_settings,
+        )
+        manager._server_instances[session_id] = transport
+
+        async def run_server(*, task_status: TaskStatus[None] = anyio.TASK_STATUS_IGNORED) -> None:
+            async with transport.connect() as (read_stream, write_stream):
+                task_status.started()
+                try:
+                    await _serve_session(
+                        manager.app, read_stream, write_stream, manager.app.create_initialization_options(), record=record
+                    )
+                except Exception as e:
+                    log.error("adopted session %s crashed: %s", session_id, e, exc_info=True)
+                finally:
+                    if manager._server_instances.get(session_id) is transport and not transport.is_terminated:
+                        del manager._server_instances[session_id]
+
+        assert manager._task_group is not None
+        await manager._task_group.start(run_server)
+    session_store.adopted += 1
+    log.info("adopted session %s from %s", session_id, record.get("worker"))
+
+
+def instrument_session_manager(manager: StreamableHTTPSessionManager) -> None:
+    """Record new sessions, adopt sessions created by other workers/replicas, attach event stores."""
+    if settings.SESSION_STORE == "none" or manager.stateless or getattr(manager, "_prynai_sessions", False):
+        return
+    check_sdk_internals()
+    handle = manager._handle_stateful_request
+    server = manager.app
+
+    async def run(
+        read_stream: Any,
+        write_stream: Any,
+        initialization_options: InitializationOptions,
+        raise_exceptions: bool = False,
+        stateless: bool = False,
+    ) -> None:
+        await _serve_session(server, read_stream, write_stream, initialization_options, raise_exceptions)
+
+    # New sessions on this worker use SharedServerSession too (see its docstring)
+    server.run = run  # type: ignore[method-assign]
+
+    last_seen: Dict[str, float] = {}  # session id -> end of its last request here
+    active: Dict[str, int] = {}       # session id -> requests in flight (e.g. an open GET stream)
+    unrecorded: set = set()           # created here while Redis was down: worker-local
+    reaper_started = False
+
+    async def ended_elsewhere(session_id: str) -> None:
+        if await _end_local_copy(manager, session_id):
+            last_seen[session_id] = time.monotonic()  # keep the 404 tombstone for a TTL
+            log.info("ended session %s (terminated on another worker)", session_id)
+
+    on_session_ended(ended_elsewhere)
+
+    async def reap() -> None:
+        """Drop copies with no request for a TTL: adopted ones nobody DELETEs here, and tombstones."""
+        ttl = session_store.ttl_seconds
+        while True:
+            await anyio.sleep(min(60.0, ttl / 4))
+            now = time.monotonic()
+            for session_id, transport in list(manager._server_instances.items()):
+                if active.get(session_id) or now - last_seen.setdefault(session_id, now) < ttl:
+                    continue
+                if not transport.is_terminated:
+                    await transport.terminate()
+                if manager._server_instances.get(session_id) is transport:
+                    del manager._server_instances[session_id]
+                last_seen.pop(session_id, None)
+                unrecorded.discard(session_id)
+                session_store.reaped += 1
+
+    async def serve(session_id: str, scope: Scope, receive: Receive, send: Send) -> None:
+        active[session_id] = active.get(session_id, 0) + 1
+        try:
+            await handle(scope, receive, send)
+        finally:
+            last_seen[session_id] = time.monotonic()
+            active[session_id] -= 1
+            if not active[session_id]:
+                del active[session_id]
+
+    async def handle_stateful_request(scope: Scope, receive: Receive, send: Send) -> None:
+        nonlocal reaper_started
+        if not reaper_started and manager._task_group is not None:
+            reaper_started = True
+            manager._task_group.start_soon(reap)
+        session_id = _header(scope, MCP_SESSION_ID_HEADER.encode("latin-1"))
+        method = scope.get("method")
+
+        if session_id is None:
+            if method != "POST":
+                await handle(scope, receive, send)
+                return
+            try:
+                body, receive = await buffer_body(scope, receive)
+            except BodyTooLarge as e:
+                await payload_too_large(send, e)
+                return
+            params = _initialize_params(body)
+
+            async def send_recording(message: Message) -> None:
+                if message["type"] == "http.response.start" and message["status"] == 200:
+                    for name, value in message.get("headers") or ():
+                        if name.decode("latin-1").lower() == MCP_SESSION_ID_HEADER:
+                            new_id = value.decode("latin-1")
+                            transport = manager._server_instances.get(new_id)
+                            event_store = make_event_store(new_id)
+                            if transport is not None and event_store is not None:
+                                # Everything after the initialize response is resumable
+                                transport._event_store = event_store
+                            # Before the client sees the id, so its next request can land anywhere
+                            if not await session_store.save(new_id, params):
+                                unrecorded.add(new_id)
+                            last_seen[new_id] = time.monotonic()
+                            break
+                await send(message)
+
+            await handle(scope, receive, send_recording)
+            return
+
+        transport = manager._server_instances.get(session_id)
+        if transport is None:
+            record = await session_store.load(session_id)
+            if record is not None:
+                await _adopt(manager, session_id, record)
+        elif not transport.is_terminated and session_id not in unrecorded:
+            if not await session_store.touch(session_id):
+                # Ended (or expired) elsewhere and we missed the message: do not serve it
+                await ended_elsewhere(session_id)
+
+        if method != "DELETE":
+            await serve(session_id, scope, receive, send)
+            return
+
+        status = 0
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        await serve(session_id, scope, receive, send_status)
+        if status == 200:
+            await session_store.delete(session_id)
+            if settings.SESSION_STORE == "redis":
+                # Other workers/replicas may hold adopted copies
+                await publish_invalidation(sessions=[session_id])
+
+    manager._handle_stateful_request = handle_stateful_request  # type: ignore[method-assign]
+    manager._prynai_sessions = True  # type: ignore[attr-defined]
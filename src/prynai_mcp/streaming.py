@@ -0,0 +1,207 @@
+"""
+Streaming tools: an async-generator tool body whose chunks reach the client while it runs.
+
+- @streaming() marks an async generator that yields text chunks (other values are sent
+  as JSON):
+      @mcp.tool()
+      @streaming()
+      async def scan_log(pattern: str) -> AsyncIterator[str]:
+          async for line in ...:
+              yield line + "\\n"
+  Apply BELOW @mcp.tool(); the tool's input schema is the generator's parameters.
+- Streaming is opt-in per call: a client that sends a progressToken AND
+  `_meta: {"prynai/stream": true}` (e.g. prynai.mcp_core.stream_mcp_tool) gets the
+  chunks as standard notifications/progress on the call's own SSE stream, with
+  progress = chunk number and message = the chunk text, and then an empty result.
+- Every other client gets the joined chunks as the result, up to
+  STREAM_BUFFER_MAX_BYTES; one that sent just a progressToken (a progress bar) still
+  gets a progress notification per batch, without the text.
+- Small chunks are coalesced into one notification up to STREAM_COALESCE_BYTES, but
+  never held longer than STREAM_COALESCE_MS, so a slow producer still streams promptly.
+  Coalesced chunks are concatenated: yield self-delimiting text (lines, NDJSON).
+- The generator runs start to finish in one task of its own, so cancel scopes, task
+  groups and timeouts held across a `yield` work as in any other coroutine.
+- Backpressure: each send waits for the session's SSE stream, which waits for the
+  socket; the generator runs at most one chunk ahead of the sender, so a slow client
+  pauses it instead of piling chunks up in memory.
+- Cancellation (notifications/cancelled, disconnect) closes the generator (its
+  finally blocks run).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import json
+import time
+import typing
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from mcp.server.fastmcp import Context
+from mcp.server.fastmcp.exceptions import ToolError
+
+from .config import settings
+
+_CTX_PARAM = "stream_ctx"  # FastMCP rejects parameter names starting with "_"
+STREAM_META_KEY = "prynai/stream"  # request _meta flag that opts a call into streaming
+_END = object()
+
+
+def _text(chunk: Any) -> str:
+    if isinstance(chunk, str):
+        return chunk
+    if isinstance(chunk, (bytes, bytearray)):
+        raise TypeError("@streaming tools yield text; encode binary chunks (e.g. base64) first")
+    return json.dumps(chunk, separators=(",", ":"))
+
+
+def _too_big(limit: int) -> ToolError:
+    return ToolError(
+        f"Output exceeds {limit} bytes; call this tool with a progressToken and "
+        f'_meta {{"{STREAM_META_KEY}": true}} to stream it'
+    )
+
+
+class _ChunkSender:
+    """
+    Coalesces chunks and sends them as progress notifications for one tool call. With
+    keep_limit set, the text is kept for the result and the notifications carry none.
+    """
+
+    def __init__(self, ctx: Context, token: Any, coalesce_bytes: int, keep_limit: Optional[int] = None):
+        self.ctx = ctx
+        self.token = token
+        self.coalesce_bytes = coalesce_bytes
+        self.keep_limit = keep_limit
+        self.kept: List[str] = []
+        self.pending: List[str] = []
+        self.pending_bytes = 0
+        self.sent = 0
+        self.sent_bytes = 0
+
+    def add(self, text: str) -> None:
+        self.pending.append(text)
+        self.pending_bytes += len(text)
+
+    @property
+    def full(self) -> bool:
+        return self.pending_bytes >= self.coalesce_bytes
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        message = "".join(self.pending)
+        self.pending.clear()
+        self.pending_bytes = 0
+        self.sent += 1
+        self.sent_bytes += len(message)
+        if self.keep_limit is not None:
+            if self.sent_bytes > self.keep_limit:
+                raise _too_big(self.keep_limit)
+            self.kept.append(message)
+            message = None
+        # related_request_id keeps chunks on this call's POST stream (not the GET stream)
+        await self.ctx.request_context.session.send_progress_notification(
+            self.token, float(self.sent), None, message, related_request_id=self.ctx.request_id
+        )
+
+
+async def _produce(agen: AsyncIterator[Any], queue: "asyncio.Queue[Any]") -> None:
+    """Iterate agen to the end in this task; the end (or its exception) is queued last."""
+    try:
+        async for chunk in agen:
+            await queue.put(_text(chunk))
+        await queue.put(_END)
+    except Exception as e:
+        await queue.put(e)
+    finally:
+        # Closed here too: its cancel scopes must exit in the task that entered them
+        await agen.aclose()
+
+
+async def _pump(agen: AsyncIterator[Any], sender: _ChunkSender, coalesce_seconds: float) -> None:
+    """Send every chunk of agen; a partly filled batch waits at most coalesce_seconds."""
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=1)
+    producer = asyncio.create_task(_produce(agen, queue))
+    deadline = 0.0
+    try:
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if sender.pending else None
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await sender.flush()
+                continue
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if not sender.pending:
+                deadline = time.monotonic() + coalesce_seconds
+            sender.add(item)
+            if sender.full:
+                await sender.flush()
+        await sender.flush()
+    finally:
+        if not producer.done():
+            producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+async def _collect(agen: AsyncIterator[Any], limit: int) -> str:
+    parts: List[str] = []
+    size = 0
+    try:
+        async for chunk in agen:
+            text = _text(chunk)
+            size += len(text)
+            if size > limit:
+                raise _too_big(limit)
+            parts.append(text)
+    finally:
+        await agen.aclose()
+    return "".join(parts)
+
+
+def streaming(
+    coalesce_bytes: Optional[int] = None, coalesce_ms: Optional[int] = None
+) -> Callable[[Callable[..., AsyncIterator[Any]]], Callable[..., Any]]:
+    """Turn an async-generator tool body into a tool whose chunks are streamed to the client."""
+
+    def decorator(fn: Callable[..., AsyncIterator[Any]]) -> Callable[..., Any]:
+        if not inspect.isasyncgenfunction(fn):
+            raise TypeError(f"@streaming needs an async generator function; {fn.__qualname__} is not one")
+        # Resolve string annotations in fn's module now: FastMCP would use this module's globals
+        hints = typing.get_type_hints(fn, include_extras=True)
+        params = [p.replace(annotation=hints.get(p.name, p.annotation)) for p in inspect.signature(fn).parameters.values()]
+        own_ctx = next((p.name for p in params if "Context" in str(p.annotation)), None)
+        if own_ctx is None:
+            # FastMCP injects the Context into the parameter annotated with it
+            params.append(inspect.Parameter(_CTX_PARAM, inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Context))
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> str:
+            ctx: Context = kwargs[own_ctx] if own_ctx else kwargs.pop(_CTX_PARAM)
+            agen = fn(*args, **kwargs)
+            meta = ctx.request_context.meta
+            token = meta.progressToken if meta else None
+            if token is None:
+                return await _collect(agen, settings.STREAM_BUFFER_MAX_BYTES)
+            # A progressToken alone only asks for progress; the text stays in the result
+            stream = bool((meta.model_extra or {}).get(STREAM_META_KEY))
+            sender = _ChunkSender(
+                ctx,
+                token,
+                settings.STREAM_COALESCE_BYTES if coalesce_bytes is None else coalesce_bytes,
+                None if stream else settings.STREAM_BUFFER_MAX_BYTES,
+            )
+            ms = settings.STREAM_COALESCE_MS if coalesce_ms is None else coalesce_ms
+            await _pump(agen, sender, ms / 1000.0)
+            return "" if stream else "".join(sender.kept)
+
+        wrapper.__signature__ = inspect.Signature(params, return_annotation=str)  # type: ignore[attr-defined]
+        wrapper.__annotations__ = {**{p.name: p.annotation for p in params}, "return": str}
+        return wrapper
+
+    return decorator
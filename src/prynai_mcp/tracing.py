@@ -0,0 +1,248 @@
+"""
+Optional OpenTelemetry tracing (pip install "prynai-mcp[otel]", OTEL_ENABLED=true).
+
+- Trace context comes from the client: `params._meta.traceparent` of each MCP request
+  (set by prynai.mcp_core; survives pooled sessions), else the HTTP `traceparent` header.
+- Spans: HTTP request + bearer validation (TracingMiddleware), tools/call,
+  resources/read, prompts/get (instrument_mcp, a handler hook), Redis commands (instrument_redis,
+  only inside an active trace). ctx.report_progress() adds a "progress" event
+  to the current tool span.
+- OTEL_EXPORTER: console | file (one JSON span per line in OTEL_FILE_PATH) |
+  memory (in-process, see memory_exporter()) | otlp (needs opentelemetry-exporter-otlp).
+  If the host app already installed a TracerProvider, that one is used as is.
+- Everything here is a no-op when OTEL_ENABLED is false or opentelemetry is missing.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterable, Iterator, Optional, Tuple
+
+from mcp.server.fastmcp import Context, FastMCP
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+from .handler_hooks import HandlerCall, add_handler_hook
+
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # optional extra
+    trace = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+_tracer: Any = None
+_memory_exporter: Any = None
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def setup_tracing() -> bool:
+    """Configure the tracer from OTEL_* settings (idempotent). Returns True when tracing is on."""
+    global _tracer, _memory_exporter
+    if _tracer is not None:
+        return True
+    if not settings.OTEL_ENABLED:
+        return False
+    if trace is None:
+        log.warning("OTEL_ENABLED=true but opentelemetry is not installed; tracing disabled")
+        return False
+
+    if isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+        exporter = settings.OTEL_EXPORTER
+        if exporter == "memory":
+            from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+            _memory_exporter = InMemorySpanExporter()
+            provider.add_span_processor(SimpleSpanProcessor(_memory_exporter))
+        elif exporter == "file":
+            from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+            out = open(settings.OTEL_FILE_PATH, "a", encoding="utf-8", buffering=1)
+            fmt = lambda span: json.dumps(json.loads(span.to_json())) + "\n"  # noqa: E731 (one line per span)
+            provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(out=out, formatter=fmt)))
+        elif exporter == "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        else:
+            from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+            provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+        trace.set_tracer_provider(provider)
+
+    _tracer = trace.get_tracer("prynai_mcp")
+    return True
+
+
+def memory_exporter() -> Any:
+    """The InMemorySpanExporter when OTEL_EXPORTER=memory (for tests/benchmarks), else None."""
+    return _memory_exporter
+
+
+def span(name: str, **attributes: Any) -> ContextManager[Any]:
+    """Child span of the current context, or a no-op when tracing is off."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+# ---- context propagation --------------------------------------------------
+
+
+def _header_carrier(headers: Iterable[Tuple[bytes, bytes]]) -> Dict[str, str]:
+    return {
+        k.decode("latin-1"): v.decode("latin-1")
+        for k, v in headers
+        if k in (b"traceparent", b"tracestate", b"baggage")
+    }
+
+
+def _request_parent(mcp: FastMCP) -> Any:
+    """Parent context for an MCP request: _meta first (pooled sessions), then HTTP headers."""
+    try:
+        rc = mcp._mcp_server.request_context
+    except LookupError:
+        return None
+    carrier: Dict[str, str] = {}
+    extra = getattr(rc.meta, "model_extra", None) or {}
+    for key in ("traceparent", "tracestate", "baggage"):
+        if isinstance(extra.get(key), str):
+            carrier[key] = extra[key]
+    if not carrier and rc.request is not None:
+        carrier = _header_carrier(rc.request.scope.get("headers") or ())
+    return propagate.extract(carrier) if carrier else None
+
+
+@contextmanager
+def _server_span(name: str, parent: Any, attributes: Dict[str, Any]) -> Iterator[Any]:
+    with _tracer.start_as_current_span(name, context=parent, kind=SpanKind.SERVER, attributes=attributes) as s:
+        yield s
+
+
+# ---- MCP handlers ---------------------------------------------------------
+
+
+def instrument_mcp(mcp: FastMCP) -> None:
+    """Span per tools/call, resources/read and prompts/get; progress as span events."""
+    if _tracer is None:
+        return
+    attrs = {"tool": "mcp.tool.name", "resource": "mcp.resource.uri", "prompt": "mcp.prompt.name"}
+
+    @contextmanager
+    def traced(call: HandlerCall) -> Iterator[None]:
+        attributes = {"mcp.method": call.method, attrs[call.kind]: call.name}
+        with _server_span(f"{call.method} {call.name}", _request_parent(mcp), attributes) as s:
+            yield
+            if call.is_error:
+                s.set_status(Status(StatusCode.ERROR, "tool returned isError"))
+
+    add_handler_hook(mcp, "tracing", traced)
+    _trace_progress()
+
+
+def _trace_progress() -> None:
+    if getattr(Context.report_progress, "_prynai_tracing", False):
+        return
+    report_progress = Context.report_progress
+
+    async def traced_report_progress(self: Context, progress: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        current = trace.get_current_span()
+        if current.is_recording():
+            event: Dict[str, Any] = {"mcp.progress": progress}
+            if total is not None:
+                event["mcp.progress.total"] = total
+            if message:
+                event["mcp.progress.message"] = message
+            current.add_event("progress", event)
+        await report_progress(self, progress, total=total, message=message)
+
+    traced_report_progress._prynai_tracing = True  # type: ignore[attr-defined]
+    Context.report_progress = traced_report_progress  # type: ignore[method-assign]
+
+
+# ---- Redis ----------------------------------------------------------------
+
+
+def instrument_redis(client: Any) -> None:
+    """Client span per Redis command / pipeline, only while a trace is active."""
+    if _tracer is None or getattr(client, "_prynai_tracing", False):
+        return
+    execute_command = client.execute_command
+    make_pipeline = client.pipeline
+
+    async def traced_command(*args: Any, **options: Any) -> Any:
+        if not trace.get_current_span().is_recording():
+            return await execute_command(*args, **options)
+        command = str(args[0]).upper() if args else "UNKNOWN"
+        with _tracer.start_as_current_span(
+            f"redis {command}", kind=SpanKind.CLIENT, attributes={"db.system": "redis", "db.operation": command}
+        ):
+            return await execute_command(*args, **options)
+
+    def traced_pipeline(*args: Any, **kwargs: Any) -> Any:
+        pipe = make_pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def traced_execute(*a: Any, **k: Any) -> Any:
+            if not trace.get_current_span().is_recording():
+                return await execute(*a, **k)
+            command = "MULTI" if pipe.is_transaction else "PIPELINE"
+            attributes = {"db.system": "redis", "db.operation": command, "db.redis.commands": len(pipe.command_stack)}
+            with _tracer.start_as_current_span(f"redis {command}", kind=SpanKind.CLIENT, attributes=attributes):
+                return await execute(*a, **k)
+
+        pipe.execute = traced_execute
+        return pipe
+
+    client.execute_command = traced_command
+    client.pipeline = traced_pipeline
+    client._prynai_tracing = True
+
+
+# ---- HTTP / auth ------------------------------------------------------------
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI: continues the caller's trace (traceparent header) for the HTTP request,
+    so bearer validation shows up as a child span. Place it outside BearerAuthMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if _tracer is None or scope["type"] != "http" or not (scope.get("path") or "").startswith("/mcp"):
+            await self.app(scope, receive, send)
+            return
+        parent = propagate.extract(_header_carrier(scope.get("headers") or ()))
+        method = scope.get("method", "")
+        status = 0
+
+        async def send_wrapper(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with _tracer.start_as_current_span(
+            f"HTTP {method} /mcp",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": method, "url.path": scope.get("path")},
+        ) as s:
+            await self.app(scope, receive, send_wrapper)
+            s.set_attribute("http.response.status_code", status)
+            if status >= 500:
+                s.set_status(Status(StatusCode.ERROR))